@@ -1,27 +1,13 @@
 """Convert Ben Sira XML to HTML for proof-reading.
+
+The rendering lives in the tei_transformer package, and is installed as the tei-to-html command:
+
+    tei-to-html --input ../tei_files --output htmls --jobs 4
+
+Run from this folder, the script renders ../tei_files into htmls by default, as it always did.
 """
-from pathlib import Path
-from xml.etree import ElementTree
+from tei_transformer.cli import render_files
 
 
 if __name__ == "__main__":
-    for file_path in Path("../tei_files").glob("*.xml"):
-        print(f"Converting {file_path} to HTML...")
-        parsed_manuscript = ElementTree.parse(file_path).getroot()
-        
-        # Create a new HTML file
-        with open(f"htmls/{Path(file_path).stem}.html", "w") as html_file:
-            # Iterate over the XML elements
-            for element in parsed_manuscript.iter():
-                if element.tag == "ms":
-                    html_file.write(f"<!DOCTYPE html>\n<html>\n<head>\n<title>{element.attrib['name']}</title>\n</head>\n<body><h1>{element.attrib['name']}</h1>\n")
-
-                if element.tag == "div":
-                    if element.attrib["type"] == "chap":
-                        html_file.write(f"<h2>Chapter {element.attrib['n']}</h2>\n")
-                    elif element.attrib["type"] == "verse":
-                        html_file.write(f"<h3>Verse {element.attrib['n']}</h3>\n")
-                elif element.tag == "w" and element.text:
-                    html_file.write(f"{element.text} ")
-                elif element.tag == "w" and element.tail:
-                    html_file.write(f"{element.tail} ")
\ No newline at end of file
+    render_files(default_map={"input_files": "../tei_files", "output_files": "htmls"})
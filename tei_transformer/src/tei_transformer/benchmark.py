@@ -0,0 +1,206 @@
+"""Benchmarks of the transformer and the HTML renderer, on the raw files and on synthetic corpora.
+"""
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Tuple
+from tei_transformer import TEITransformer
+from tei_transformer.html_renderer import HTMLRenderer
+from tei_transformer.sinks import SINKS, open_sinks
+
+
+HEBREW_WORD = re.compile(r"[א-ת]+")
+# The number of perturbed copies of the source file the synthetic corpora cycle through
+VARIANTS = 4
+
+
+def generate_corpus(source: Path, scale: int, output_file: Path, seed: int = 0) -> Path:
+    """Generate a synthetic raw file by replicating the articles of a raw file scale times.
+
+    Each copy is perturbed, replacing about one Hebrew word out of twenty by another word of the
+    file, so that the copies are not identical. The file is written copy by copy.
+
+    Args:
+        source (Path): The raw file to replicate, such as ms_b.xml.
+        scale (int): The number of copies of its articles.
+        output_file (Path): The path to the generated raw file.
+        seed (int): The seed of the perturbations.
+
+    Returns:
+        Path: The path to the generated raw file.
+    """
+    data = Path(source).read_text(encoding="utf-8")
+    start = data.index(">", data.index("<Root")) + 1
+    stop = data.rindex("</Root>")
+    body = data[start:stop]
+    vocabulary = sorted(set(HEBREW_WORD.findall(body)))
+    variants = []
+    for variant in range(min(scale, VARIANTS)):
+        rng = random.Random(seed * VARIANTS + variant)
+        variants.append(HEBREW_WORD.sub(
+            lambda match: rng.choice(vocabulary) if rng.random() < 0.05 else match.group(0), body
+        ))
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(data[:start])
+        for copy in range(scale):
+            f.write(variants[copy % len(variants)])
+        f.write(data[stop:])
+    return Path(output_file)
+
+
+def bench_create_body(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Clean up a raw file in memory."""
+    start = time.perf_counter()
+    transformer = TEITransformer(input_file)
+    transformer.create_body()
+    return transformer.word_count, time.perf_counter() - start
+
+
+def bench_dump(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Clean up a raw file into a TEI file."""
+    start = time.perf_counter()
+    transformer = TEITransformer(input_file)
+    transformer.dump(workdir / input_file.name)
+    return transformer.word_count, time.perf_counter() - start
+
+
+def bench_dump_stream(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Clean up a raw file into a TEI file in streaming mode."""
+    start = time.perf_counter()
+    transformer = TEITransformer(input_file)
+    transformer.dump(workdir / input_file.name, stream=True)
+    return transformer.word_count, time.perf_counter() - start
+
+
+def bench_tokenize(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Tokenize the texts and tails of a raw file, once parsed."""
+    transformer = TEITransformer(input_file)
+    texts = [
+        text
+        for elem in transformer.parsed_manuscript.iter()
+        for text in (elem.text, elem.tail)
+        if text
+    ]
+    start = time.perf_counter()
+    tokens = sum(len(transformer.tokenize(text)) for text in texts)
+    return tokens, time.perf_counter() - start
+
+
+def bench_html(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Render the TEI file of a raw file as HTML, the TEI file being generated beforehand."""
+    tei_file = workdir / "tei" / input_file.name
+    if not tei_file.exists():
+        tei_file.parent.mkdir(exist_ok=True)
+        TEITransformer(input_file).dump(tei_file, stream=True)
+    start = time.perf_counter()
+    words = HTMLRenderer(tei_file).render(workdir / "html")["words"]
+    return words, time.perf_counter() - start
+
+
+def bench_export(input_file: Path, workdir: Path) -> Tuple[int, float]:
+    """Clean up a raw file into all the outputs at once: TEI file, HTML pages, words and verses."""
+    start = time.perf_counter()
+    transformer = TEITransformer(input_file)
+    with ExitStack() as stack:
+        transformer.export(open_sinks(list(SINKS), input_file.name, workdir, workdir / "html", stack))
+    return transformer.word_count, time.perf_counter() - start
+
+
+# The operations benchmarked: they return the number of words (or tokens) processed and the time
+# it took, leaving out the preparation of their input
+OPERATIONS = {
+    "create_body": bench_create_body,
+    "dump": bench_dump,
+    "dump_stream": bench_dump_stream,
+    "tokenize": bench_tokenize,
+    "html": bench_html,
+    "export": bench_export,
+}
+# The absolute differences below which a case is not flagged, whatever its relative slowdown
+NOISE_FLOOR = {"seconds": 0.01, "peak_mb": 2.0}
+# The operations with bounded memory, which are run on the largest synthetic corpora as well
+STREAMING_OPERATIONS = ["dump_stream", "html"]
+
+
+def peak_memory_mb() -> float:
+    """Return the peak resident memory of the process in MB, or 0 where it is not available, the
+    resource module being Unix-only."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def run_case(operation: str, input_file: Path, repeat: int) -> dict:
+    """Run a benchmark case several times, and return its best time, its number of words and the
+    peak resident memory of the process.
+
+    Cases are meant to run in a process of their own, so that the peak memory is theirs.
+    """
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(repeat):
+            words, elapsed = OPERATIONS[operation](Path(input_file), Path(workdir))
+            timings.append(elapsed)
+    best = min(timings)
+    peak_mb = peak_memory_mb()
+    return {
+        "seconds": best,
+        "words": words,
+        "words_per_second": words / best if best else 0.0,
+        "peak_mb": peak_mb,
+    }
+
+
+def run_isolated(operation: str, input_file: Path, repeat: int) -> dict:
+    """Run a benchmark case in a new process."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_case, operation, input_file, repeat).result()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List the cases slower, or using more memory, than in the baseline beyond some tolerance,
+    and beyond the noise of the measures.
+
+    Args:
+        results (dict): The results of the cases, by name.
+        baseline (dict): The results of a previous run, by name.
+        tolerance (float): The relative slowdown, or memory increase, tolerated.
+
+    Returns:
+        list[str]: A description of each regression.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, unit in [("seconds", "s"), ("peak_mb", "MB")]:
+            increase = result[metric] - reference[metric]
+            if increase > reference[metric] * tolerance and increase > NOISE_FLOOR[metric]:
+                regressions.append(
+                    f"{name}: {metric} {result[metric]:.3f}{unit} "
+                    f"against {reference[metric]:.3f}{unit} in the baseline"
+                )
+    return regressions
+
+
+def load_baseline(baseline_path: Path) -> dict:
+    """Load the results stored as baseline, raising OSError or ValueError if the file cannot be
+    read as such."""
+    return json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+
+
+def save_baseline(results: dict, baseline_path: Path) -> None:
+    """Store the results as baseline for the next runs."""
+    Path(baseline_path).write_text(json.dumps(results, indent=2, sort_keys=True), encoding="utf-8")
@@ -0,0 +1,92 @@
+"""Manifest of the files already transformed, so that unchanged raw files are not transformed again.
+"""
+import hashlib
+import json
+from pathlib import Path
+from tei_transformer import tei_transformer
+
+
+class BuildCache:
+    """Record, for each raw file, the hash of its content, of the transformer which cleaned it up
+    and of the output it produced."""
+
+    MANIFEST_NAME = ".tei-transform-manifest.json"
+
+    def __init__(self, output_dir: str) -> None:
+        """Load the manifest stored in the output directory, if any.
+
+        The manifest is discarded altogether when the transformer has changed since it was written.
+
+        Args:
+            output_dir (str): The path to the generated output files.
+        """
+        self.manifest_path = Path(output_dir) / self.MANIFEST_NAME
+        self.transformer_hash = self.hash_transformer()
+        self.files = {}
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if manifest.get("transformer") == self.transformer_hash:
+            self.files = manifest.get("files", {})
+
+    @staticmethod
+    def hash_file(file_path: Path) -> str:
+        """Compute the SHA-256 hash of the content of a file."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def hash_transformer(cls) -> str:
+        """Compute the hash of the transformer version and normalization rules, i.e. its source."""
+        return cls.hash_file(Path(tei_transformer.__file__))
+
+    def _matches(self, file_path: Path, entry: dict, prefix: str) -> bool:
+        """Check whether a file is the one recorded in the manifest, only hashing its content if
+        its size or modification time changed."""
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry.get(f"{prefix}_size"):
+            return False
+        if stat.st_mtime_ns == entry.get(f"{prefix}_mtime_ns"):
+            return True
+        return self.hash_file(file_path) == entry.get(f"{prefix}_hash")
+
+    def is_up_to_date(self, input_file: Path, output_file: Path) -> bool:
+        """Check whether an input file is unchanged since its output was generated, and the output
+        has been left untouched."""
+        entry = self.files.get(Path(input_file).name)
+        if entry is None or entry["output"] != Path(output_file).name:
+            return False
+        return (
+            self._matches(Path(input_file), entry, "input")
+            and self._matches(Path(output_file), entry, "output")
+        )
+
+    def words(self, input_file: Path) -> int:
+        """Return the number of words emitted when the input file was last transformed."""
+        return self.files[Path(input_file).name]["words"]
+
+    def record(self, input_file: Path, output_file: Path, words: int) -> None:
+        """Record that an input file has been transformed into an output file."""
+        entry = {"output": Path(output_file).name, "words": words}
+        for prefix, file_path in [("input", Path(input_file)), ("output", Path(output_file))]:
+            stat = file_path.stat()
+            entry[f"{prefix}_hash"] = self.hash_file(file_path)
+            entry[f"{prefix}_size"] = stat.st_size
+            entry[f"{prefix}_mtime_ns"] = stat.st_mtime_ns
+        self.files[Path(input_file).name] = entry
+
+    def forget(self, input_file: Path) -> None:
+        """Remove an input file from the manifest, e.g. because its transformation failed."""
+        self.files.pop(Path(input_file).name, None)
+
+    def save(self) -> None:
+        """Write the manifest to the output directory."""
+        manifest = {"transformer": self.transformer_hash, "files": self.files}
+        self.manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
@@ -2,8 +2,536 @@
 """
 
 import click
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
 from pathlib import Path
+from typing import Optional, Tuple
+from xml.etree import ElementTree
+from xml.parsers import expat
 from tei_transformer import TEITransformer
+from tei_transformer.build_cache import BuildCache
+from tei_transformer.corpus import Corpus
+from tei_transformer.html_renderer import HTMLRenderer
+from tei_transformer.instrumentation import Profiler
+from tei_transformer.preservation import LEVELS, REPORT_FORMATS, preservation_statistics
+from tei_transformer.sinks import SINKS, HTMLSink, open_sink, open_sinks
+from tei_transformer.tei_transformer import Diagnostic, open_atomic
+
+# The choices of the commands whose modules are only imported once they run, as they are slow to
+# import (asyncio, difflib...) or not available everywhere: benchmark.OPERATIONS and DIFF_FORMATS
+BENCHMARK_OPERATIONS = ["create_body", "dump", "dump_stream", "tokenize", "html", "export"]
+DIFF_FORMAT_NAMES = ["text", "json"]
+
+
+def transform_file(
+    input_file: Path,
+    output_file: Path,
+    stream: bool = False,
+    profile: bool = False,
+    stats_file: Path = None,
+    sinks: list = ("tei",),
+    html_dir: Path = None,
+) -> Tuple[float, int, Optional[dict], Optional[dict]]:
+    """Transform a single file, and return the time it took, the number of words emitted, the
+    report of its stages when profiled and the summary of its HTML pages when rendered. A cProfile
+    profile is dumped to the stats file, if any.
+
+    When some other sink than the TEI file is selected, all of them are written in a single pass
+    next to the output file (see tei_transformer.sinks), the HTML pages within the HTML folder."""
+    transformer = TEITransformer(input_file)
+    profiler = Profiler(stats_file)
+    if profile:
+        profiler.attach(transformer)
+    manuscript = None
+    if list(sinks) == ["tei"]:
+        with profiler.measure():
+            transformer.dump(output_file, stream=stream)
+    else:
+        with profiler.measure(), ExitStack() as stack:
+            output_dir = Path(output_file).parent
+            outputs = open_sinks(sinks, Path(output_file).name, output_dir, html_dir, stack)
+            transformer.export(outputs)
+        for sink in outputs:
+            if isinstance(sink, HTMLSink):
+                manuscript = sink.manuscript
+    return (
+        profiler.seconds,
+        transformer.word_count,
+        profiler.report() if profile else None,
+        manuscript,
+    )
+
+
+def transform_segment(
+    source: bytes, position: Optional[dict], profile: bool = False, stats_file: Path = None
+) -> Tuple[str, float, int, Optional[dict]]:
+    """Transform a segment of a file, given as its raw content (see TEITransformer.segment_source)
+    and the position it starts at, and return the clean XML, the time it took, the number of words
+    emitted and, when profiled, the report of its stages."""
+    transformer = TEITransformer(source)
+    profiler = Profiler(stats_file)
+    if profile:
+        profiler.attach(transformer)
+    with profiler.measure():
+        body = transformer.create_segment(0, None, position)
+    return body, profiler.seconds, transformer.word_count, profiler.report() if profile else None
+
+
+def transform_stream(input_file: str, sink: str, stream: bool = False) -> int:
+    """Transform a single file, or the standard input, into a single sink written to the standard
+    output, and return the number of words emitted."""
+    if input_file == "-":
+        source, manuscript = click.get_binary_stream("stdin"), "stdin"
+    else:
+        source, manuscript = input_file, Path(input_file).stem
+    output = click.get_binary_stream("stdout")
+    transformer = TEITransformer(source)
+    if sink == "tei":
+        transformer.dump(output, stream=stream)
+    else:
+        with ExitStack() as stack:
+            transformer.export([open_sink(sink, output, manuscript, stack)])
+    output.flush()
+    return transformer.word_count
+
+
+def check_file(input_file: str) -> list[Diagnostic]:
+    """Clean up a single file, or the standard input, without writing it, and return the issues
+    found, a file which is not well-formed having a single parse-error."""
+    source = click.get_binary_stream("stdin") if input_file == "-" else input_file
+    try:
+        return TEITransformer(source, strict=False).check()
+    except ElementTree.ParseError as error:
+        line, column = error.position
+        # The column of a parse error starts at 0, the one of an element at 1
+        return [Diagnostic("error", "parse-error", expat.ErrorString(error.code), line, column + 1)]
+
+
+def check_files(input_files: str, jobs: int) -> None:
+    """Check the input files over a pool of processes, then print their issues as
+    file:line:column: severity: message [code], followed by their totals, and fail on errors."""
+    if input_files == "-":
+        names, paths = ["stdin"], ["-"]
+    else:
+        if Path(input_files).is_dir():
+            paths = sorted(Path(input_files).glob("*.xml"))
+        else:
+            paths = [Path(input_files)]
+        names = [path.name for path in paths]
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(check_file, paths))
+    else:
+        results = list(map(check_file, paths))
+    totals = {"error": 0, "warning": 0}
+    for name, diagnostics in zip(names, results):
+        for diagnostic in diagnostics:
+            totals[diagnostic.severity] += 1
+            location = f"{diagnostic.line}:{diagnostic.column}:" if diagnostic.line is not None else ""
+            click.echo(
+                f"{name}:{location} {diagnostic.severity}: {diagnostic.message} [{diagnostic.code}]"
+            )
+    click.echo(f"{totals['error']} error(s), {totals['warning']} warning(s) in {len(paths)} file(s)")
+    if totals["error"]:
+        raise click.ClickException(f"{totals['error']} error(s) found")
+
+
+def render_file(input_file: Path, output_dir: Path) -> Tuple[dict, float]:
+    """Render a single TEI file as HTML, and return its chapters and the time it took."""
+    start = time.perf_counter()
+    manuscript = HTMLRenderer(input_file).render(output_dir)
+    return manuscript, time.perf_counter() - start
+
+
+def print_summary(results: dict) -> None:
+    """Print the time, the number of words emitted and the failure of each transformed file."""
+    click.echo(f"{'File':<20} {'Time (s)':>10} {'Words':>8}  Status")
+    for name in sorted(results):
+        result = results[name]
+        if result["error"]:
+            status = f"failed: {result['error']}"
+        elif result.get("skipped"):
+            status = "unchanged, skipped"
+        else:
+            status = "ok"
+        click.echo(f"{name:<20} {result['time']:>10.3f} {result['words']:>8}  {status}")
+
+
+def run_in_pool(
+    files: list,
+    output_files: Path,
+    jobs: int,
+    stream: bool,
+    profile: bool = False,
+    stats_dir: Path = None,
+    sinks: list = ("tei",),
+    html_dir: Path = None,
+) -> dict:
+    """Transform the files over a pool of processes, splitting the largest ones at chapter
+    boundaries so that the work is spread evenly, unless other sinks than the TEI file are written.
+
+    When profiled, the reports of the segments of a file are added up, and each process dumps its
+    cProfile profiles into the stats folder. The summary of the HTML pages of a file, if rendered, is
+    returned as its manuscript."""
+    results = {file.name: {"time": 0.0, "words": 0, "error": None} for file in files}
+    reports = {file.name: [] for file in files}
+    total_size = sum(file.stat().st_size for file in files) or 1
+    segmented = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for file in files:
+            parts = round(file.stat().st_size * jobs / total_size)
+            segments = []
+            if parts > 1 and not stream and list(sinks) == ["tei"]:
+                try:
+                    splitter = TEITransformer(file)
+                    segments = splitter.split_chapters(parts)
+                    # The file is parsed once: each process only parses the chunks of its segment
+                    sources = [splitter.segment_source(segment) for segment in segments]
+                except Exception as error:
+                    results[file.name]["error"] = repr(error)
+                    continue
+            if len(segments) > 1:
+                segmented[file] = {"segments": segments, "bodies": [None] * len(segments)}
+                for index, (segment, source) in enumerate(zip(segments, sources)):
+                    stats_file = stats_dir / f"{file.stem}.{index}.pstats" if stats_dir else None
+                    future = executor.submit(
+                        transform_segment, source, segment["position"], profile, stats_file
+                    )
+                    futures[future] = (file, index)
+            else:
+                stats_file = stats_dir / f"{file.stem}.pstats" if stats_dir else None
+                future = executor.submit(
+                    transform_file,
+                    file,
+                    Path(output_files) / file.name,
+                    stream,
+                    profile,
+                    stats_file,
+                    sinks,
+                    html_dir,
+                )
+                futures[future] = (file, None)
+
+        for future in as_completed(futures):
+            file, index = futures[future]
+            result = results[file.name]
+            try:
+                if index is None:
+                    elapsed, words, report, manuscript = future.result()
+                    if manuscript is not None:
+                        result["manuscript"] = manuscript
+                else:
+                    body, elapsed, words, report = future.result()
+                    segmented[file]["bodies"][index] = body
+            except Exception as error:
+                result["error"] = repr(error)
+                continue
+            result["time"] += elapsed
+            result["words"] += words
+            if report is not None:
+                reports[file.name].append(report)
+
+    for file, segmentation in segmented.items():
+        if results[file.name]["error"]:
+            continue
+        ms_name = segmentation["segments"][1]["position"]["ms"]
+        with open_atomic(Path(output_files) / file.name) as f:
+            f.write(TEITransformer.join_segments(ms_name, segmentation["bodies"]).encode("utf-8"))
+    if profile:
+        for name, result in results.items():
+            if not result["error"]:
+                result["profile"] = Profiler.merge(reports[name])
+    return results
+
+
+def write_profile(results: dict, profile_file: Path) -> None:
+    """Write the per-file and per-stage report of the profiled files, along with their totals."""
+    files = {name: result["profile"] for name, result in sorted(results.items()) if "profile" in result}
+    report = {"files": files, "total": Profiler.merge(list(files.values()))}
+    Path(profile_file).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+@click.command()
+@click.option(
+    "--input",
+    "-i",
+    "input_files",
+    required=True,
+    type=click.Path(exists=True, dir_okay=True, file_okay=True, allow_dash=True, resolve_path=True),
+    help="The path to the input files to transform, a single input file, or - for the standard input.",
+)
+@click.option(
+    "--output",
+    "-o",
+    "output_files",
+    type=click.Path(exists=True, dir_okay=True, file_okay=True, allow_dash=True, resolve_path=True),
+    help="The path to the generated output files, or - for the standard output. Required unless "
+    "checking.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Write the output while reading the input, with bounded memory.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    type=click.IntRange(min=1),
+    help="The number of processes to transform the files with.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Transform all the input files, even the ones unchanged since the last run.",
+)
+@click.option(
+    "--profile",
+    "profile_file",
+    type=click.Path(dir_okay=False, resolve_path=True),
+    help="Write the per-file and per-stage timings and counts to this JSON report.",
+)
+@click.option(
+    "--profile-stats",
+    "stats_file",
+    type=click.Path(dir_okay=False, resolve_path=True),
+    help="Dump a cProfile profile of the transformations to this pstats file.",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep running, and transform the input files again as they are saved.",
+)
+@click.option(
+    "--html",
+    "html_files",
+    type=click.Path(dir_okay=True, file_okay=False, resolve_path=True),
+    help="The path to the HTML pages written by the html sink, or kept up to date in watch mode.",
+)
+@click.option(
+    "--sink",
+    "sinks",
+    multiple=True,
+    default=["tei"],
+    type=click.Choice(list(SINKS)),
+    help="An output written for each input file (repeatable), all of them in a single pass: the TEI "
+    "file, its HTML pages, its words as JSON Lines or its verses as CSV. The TEI file by default.",
+)
+@click.option(
+    "--check",
+    is_flag=True,
+    default=False,
+    help="Only validate the input files, reporting the issues found, without writing any output.",
+)
+@click.option(
+    "--interval",
+    default=0.2,
+    type=click.FloatRange(min=0.01),
+    help="In watch mode, the time between two checks of the input files, in seconds.",
+)
+@click.option(
+    "--snapshot/--no-snapshot",
+    default=None,
+    help="Whether to refresh the corpus snapshot of the output folder after writing the TEI files, "
+    "which loads all their words in memory. On by default, except with --stream.",
+)
+def transform_files(
+    input_files: Path,
+    output_files: Path,
+    stream: bool,
+    jobs: int,
+    force: bool,
+    profile_file: Path,
+    stats_file: Path,
+    watch: bool,
+    html_files: Path,
+    interval: float,
+    sinks: tuple,
+    check: bool,
+    snapshot: Optional[bool],
+) -> None:
+    """Transform the input files into a standardized format.
+
+    A single input file, or the standard input, can be transformed into the standard output, with a
+    single sink other than html: transformations can then be chained in pipes, e.g.
+    `tei-transform -i - -o - < ms_b.xml | xmllint --format -`.
+
+    Args:
+        input_files (str): The path to the input files to transform, or to a single input file, or
+            - for the standard input (the manuscript is then named stdin).
+        output_files (str): The path to the generated output files, or - for the standard output.
+        stream (bool): Whether to transform the files in streaming mode.
+        jobs (int): The number of processes to transform the files with. Large files are split
+            at chapter boundaries across processes, unless in streaming mode.
+        force (bool): Whether to transform the files unchanged since the last run as well.
+        profile_file (str): The path to a JSON report of the timings and counts of the stages of
+            the transformation of each file, if any.
+        stats_file (str): The path to a pstats file to dump a cProfile profile of the
+            transformations to, if any.
+        watch (bool): Whether to keep running, transforming the input files again as they are
+            saved. Only the chapters which changed are cleaned up again.
+        html_files (str): The path to the HTML pages written by the html sink, or kept up to date in
+            watch mode, if any.
+        interval (float): In watch mode, the time between two checks of the input files.
+        sinks (tuple): The outputs written for each input file, among tei, html, words (JSON Lines)
+            and verses (CSV), next to each other in the output folder. When other outputs than the
+            TEI file are written, all the input files are transformed, in memory.
+        check (bool): Whether to only validate the input files, over jobs processes: they are
+            cleaned up without writing any output, and the issues found are printed with their
+            position in the input file. The command fails if any of them is an error, such as a
+            verse before any chapter, and not if they are all warnings, such as dropped text.
+        snapshot (bool): Whether to refresh the corpus snapshot of the output folder from the TEI
+            files rebuilt. It holds all the words of the corpus in memory, so it is skipped by
+            default in streaming mode, whose memory stays bounded.
+    """
+    if check:
+        if watch:
+            raise click.UsageError("--check does not watch the input files.")
+        check_files(input_files, jobs)
+        return
+    if output_files is None:
+        raise click.UsageError("Missing option '--output' / '-o'.")
+    sinks = list(dict.fromkeys(sinks))
+    tei_only = sinks == ["tei"]
+    if "html" in sinks and not html_files:
+        raise click.UsageError("--html is required to write the html sink.")
+    if not tei_only and (stream or watch):
+        raise click.UsageError("--stream and --watch only write the tei sink.")
+    if output_files == "-":
+        if input_files != "-" and Path(input_files).is_dir():
+            raise click.UsageError("The standard output only takes a single input file, or -.")
+        if len(sinks) != 1 or "html" in sinks:
+            raise click.UsageError("The standard output only takes a single sink other than html.")
+        if watch or profile_file or stats_file:
+            raise click.UsageError("--watch and --profile need an output folder.")
+        try:
+            transform_stream(input_files, sinks[0], stream)
+        except BrokenPipeError:
+            # The reader of the pipe is gone, e.g. head: leave quietly, including at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        except Exception as error:
+            raise click.ClickException(f"The transformation failed: {error!r}")
+        return
+    if not Path(output_files).is_dir():
+        raise click.BadParameter(f"{output_files!r} is not a folder.", param_hint="'--output'")
+    if input_files == "-":
+        raise click.UsageError("The standard input is only transformed into the standard output.")
+    if watch and not Path(input_files).is_dir():
+        raise click.UsageError("--watch needs a folder of input files.")
+    if watch:
+        watch_files(input_files, output_files, html_files, interval)
+        return
+    if "html" in sinks:
+        Path(html_files).mkdir(parents=True, exist_ok=True)
+    cache = BuildCache(output_files)
+    files = []
+    skipped = {}
+    if Path(input_files).is_dir():
+        input_paths = sorted(Path(input_files).glob('*.xml'))
+    else:
+        input_paths = [Path(input_files)]
+    for file in input_paths:
+        if tei_only and not force and cache.is_up_to_date(file, Path(output_files) / file.name):
+            skipped[file.name] = {"time": 0.0, "words": cache.words(file), "error": None, "skipped": True}
+        else:
+            files.append(file)
+    profile = profile_file is not None
+    with tempfile.TemporaryDirectory() as workdir:
+        stats_dir = Path(workdir) if stats_file else None
+        if not files:
+            click.echo("All the input files are unchanged since the last run")
+            results = {}
+        elif jobs > 1:
+            click.echo(f"Transforming {len(files)} input files over {jobs} processes")
+            results = run_in_pool(
+                files, Path(output_files), jobs, stream, profile, stats_dir, sinks, html_files
+            )
+        else:
+            results = {}
+            for file in files:
+                click.echo(f"Transforming the input files: {file.name}")
+                file_stats = stats_dir / f"{file.stem}.pstats" if stats_dir else None
+                try:
+                    elapsed, words, report, manuscript = transform_file(
+                        file,
+                        Path(output_files) / file.name,
+                        stream,
+                        profile,
+                        file_stats,
+                        sinks,
+                        html_files,
+                    )
+                    results[file.name] = {"time": elapsed, "words": words, "error": None}
+                    if report is not None:
+                        results[file.name]["profile"] = report
+                    if manuscript is not None:
+                        results[file.name]["manuscript"] = manuscript
+                except Exception as error:
+                    results[file.name] = {"time": 0.0, "words": 0, "error": repr(error)}
+        if stats_file:
+            profiles = sorted(str(path) for path in Path(workdir).glob("*.pstats"))
+            if profiles:
+                pstats.Stats(*profiles).dump_stats(stats_file)
+    if profile:
+        write_profile(results, profile_file)
+    if "html" in sinks:
+        manuscripts = [result["manuscript"] for result in results.values() if "manuscript" in result]
+        HTMLRenderer.render_site_index(manuscripts, html_files)
+    if "tei" in sinks:
+        for file in files:
+            if results[file.name]["error"]:
+                cache.forget(file)
+            else:
+                cache.record(file, Path(output_files) / file.name, results[file.name]["words"])
+        cache.save()
+    results.update(skipped)
+    print_summary(results)
+    failures = [name for name, result in results.items() if result["error"]]
+    if failures:
+        raise click.ClickException(f"{len(failures)} file(s) failed: {', '.join(failures)}")
+    if snapshot is None:
+        snapshot = not stream
+    if "tei" in sinks and snapshot:
+        # Save the snapshot of the corpus the downstream tools open, reading the rebuilt files only
+        try:
+            Corpus.refresh(output_files, [file.stem for file in files])
+        except ElementTree.ParseError as error:
+            raise click.ClickException(f"The corpus snapshot could not be saved: {error}")
+
+
+def watch_files(input_files: Path, output_files: Path, html_files: Path, interval: float) -> None:
+    """Transform the input files, then transform them again as they are saved, until interrupted."""
+    if html_files:
+        Path(html_files).mkdir(parents=True, exist_ok=True)
+
+    def report(file: Path, result: Optional[dict], error: Optional[Exception]) -> None:
+        if error is not None:
+            click.echo(f"{file.name}: failed ({error!r})")
+            return
+        pages = f", {len(result['pages'])} page(s) written" if result["pages"] else ""
+        click.echo(
+            f"{file.name}: {result['rebuilt']}/{result['chapters']} chapter(s) cleaned up, "
+            f"{result['words']} words in {result['time']:.3f}s{pages}"
+        )
+
+    from tei_transformer.watch import Watcher
+
+    click.echo(f"Watching {input_files} for changes, press Ctrl+C to stop")
+    try:
+        Watcher(input_files, output_files, html_files).watch(report, interval)
+    except KeyboardInterrupt:
+        pass
 
 
 @click.command()
@@ -13,22 +541,302 @@ from tei_transformer import TEITransformer
     "input_files",
     required=True,
     type=click.Path(exists=True, dir_okay=True, file_okay=False, resolve_path=True),
-    help="The path to the input files to transform.",
+    help="The path to the TEI files to render.",
 )
 @click.option(
     "--output",
     "-o",
     "output_files",
     required=True,
+    type=click.Path(dir_okay=True, file_okay=False, resolve_path=True),
+    help="The path to the generated HTML files.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=os.cpu_count() or 1,
+    type=click.IntRange(min=1),
+    help="The number of processes to render the files with, one per CPU by default.",
+)
+def render_files(input_files: Path, output_files: Path, jobs: int) -> None:
+    """Render the TEI files as HTML for proof-reading: one page per chapter, an index page per
+    manuscript and an index page listing the manuscripts.
+
+    Args:
+        input_files (str): The path to the TEI files to render.
+        output_files (str): The path to the generated HTML files.
+        jobs (int): The number of processes to render the files with.
+    """
+    Path(output_files).mkdir(parents=True, exist_ok=True)
+    files = sorted(Path(input_files).glob("*.xml"))
+    manuscripts = []
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(render_file, file, Path(output_files)): file for file in files}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                manuscript, elapsed = future.result()
+            except Exception as error:
+                results[file.name] = {"time": 0.0, "words": 0, "error": repr(error)}
+                continue
+            manuscripts.append(manuscript)
+            results[file.name] = {"time": elapsed, "words": manuscript["words"], "error": None}
+    HTMLRenderer.render_site_index(manuscripts, output_files)
+    print_summary(results)
+    failures = [name for name, result in results.items() if result["error"]]
+    if failures:
+        raise click.ClickException(f"{len(failures)} file(s) failed: {', '.join(failures)}")
+
+
+@click.command()
+@click.option(
+    "--input",
+    "-i",
+    "input_files",
+    required=True,
     type=click.Path(exists=True, dir_okay=True, file_okay=False, resolve_path=True),
-    help="The path to the generated output files.",
+    help="The path to the raw files to benchmark on.",
 )
-def transform_files(input_files: Path, output_files: Path) -> None:
-    """Transform the input files into a standardized format.
+@click.option(
+    "--source",
+    default="ms_b.xml",
+    help="The raw file replicated into the synthetic corpora.",
+)
+@click.option(
+    "--scale",
+    "scales",
+    multiple=True,
+    default=[10, 100, 1000],
+    type=click.IntRange(min=1),
+    help="The size of a synthetic corpus, in copies of the source file (repeatable).",
+)
+@click.option(
+    "--max-tree-scale",
+    default=100,
+    type=click.IntRange(min=0),
+    help="The largest synthetic corpus to run the operations which hold the whole tree on.",
+)
+@click.option(
+    "--operation",
+    "operations",
+    multiple=True,
+    default=BENCHMARK_OPERATIONS,
+    type=click.Choice(BENCHMARK_OPERATIONS),
+    help="The operation to benchmark (repeatable), all of them by default.",
+)
+@click.option("--repeat", default=3, type=click.IntRange(min=1), help="The number of runs of each case.")
+@click.option(
+    "--baseline",
+    "baseline_path",
+    type=click.Path(dir_okay=False, resolve_path=True),
+    help="The results of a previous run, to flag the regressions against.",
+)
+@click.option(
+    "--save-baseline",
+    is_flag=True,
+    default=False,
+    help="Store the results as the baseline, instead of comparing them to it.",
+)
+@click.option(
+    "--tolerance",
+    default=0.2,
+    type=click.FloatRange(min=0),
+    help="The relative slowdown or memory increase tolerated before flagging a regression.",
+)
+def run_benchmarks(
+    input_files: Path,
+    source: str,
+    scales: list,
+    max_tree_scale: int,
+    operations: list,
+    repeat: int,
+    baseline_path: Path,
+    save_baseline: bool,
+    tolerance: float,
+) -> None:
+    """Benchmark the transformer and the HTML renderer on the raw files, and on synthetic corpora
+    replicating one of them.
+
+    Args:
+        input_files (str): The path to the raw files to benchmark on.
+        source (str): The raw file replicated into the synthetic corpora.
+        scales (list): The sizes of the synthetic corpora, in copies of the source file.
+        max_tree_scale (int): The largest synthetic corpus to run the operations which hold the
+            whole tree on, the other ones only running the streaming operations.
+        operations (list): The operations to benchmark.
+        repeat (int): The number of runs of each case, the best one being kept.
+        baseline_path (str): The results of a previous run, to flag the regressions against.
+        save_baseline (bool): Whether to store the results as the baseline.
+        tolerance (float): The relative slowdown or memory increase tolerated.
+    """
+    from tei_transformer import benchmark
+
+    baseline = None
+    if baseline_path and not save_baseline:
+        # Read the baseline upfront, not to run all the cases against a wrong path
+        try:
+            baseline = benchmark.load_baseline(baseline_path)
+        except (OSError, ValueError) as error:
+            raise click.ClickException(f"The baseline {baseline_path} could not be read: {error}")
+    results = {}
+    click.echo(f"{'Case':<28} {'Time (s)':>10} {'Words':>9} {'Words/s':>10} {'Peak (MB)':>10}")
+
+    def run(name: str, operation: str, input_file: Path) -> None:
+        result = benchmark.run_isolated(operation, input_file, repeat)
+        results[name] = result
+        click.echo(
+            f"{name:<28} {result['seconds']:>10.3f} {result['words']:>9} "
+            f"{result['words_per_second']:>10.0f} {result['peak_mb']:>10.1f}"
+        )
+
+    for file in sorted(Path(input_files).glob("*.xml")):
+        for operation in operations:
+            run(f"{file.stem}:{operation}", operation, file)
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in sorted(scales):
+            corpus = benchmark.generate_corpus(
+                Path(input_files) / source, scale, Path(workdir) / f"{Path(source).stem}_x{scale}.xml"
+            )
+            for operation in operations:
+                if scale <= max_tree_scale or operation in benchmark.STREAMING_OPERATIONS:
+                    run(f"{corpus.stem}:{operation}", operation, corpus)
+            corpus.unlink()
+
+    if baseline_path and save_baseline:
+        benchmark.save_baseline(results, baseline_path)
+        click.echo(f"Baseline stored in {baseline_path}")
+    elif baseline is not None:
+        regressions = benchmark.compare(results, baseline, tolerance)
+        for regression in regressions:
+            click.echo(f"Regression: {regression}")
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} regression(s) against the baseline")
+
+
+@click.command()
+@click.option(
+    "--input",
+    "-i",
+    "input_files",
+    required=True,
+    type=click.Path(exists=True, dir_okay=True, file_okay=False, resolve_path=True),
+    help="The path to the TEI files to describe.",
+)
+@click.option(
+    "--output",
+    "-o",
+    "output_file",
+    default="-",
+    type=click.File("w", encoding="utf-8"),
+    help="The path to the report, the standard output by default.",
+)
+@click.option(
+    "--level",
+    default="manuscript",
+    type=click.Choice(list(LEVELS)),
+    help="The grouping of the words the statistics are computed over.",
+)
+@click.option(
+    "--format",
+    "report_format",
+    default="csv",
+    type=click.Choice(list(REPORT_FORMATS)),
+    help="The format of the report.",
+)
+def report_preservation(input_files: Path, output_file, level: str, report_format: str) -> None:
+    """Report the preservation of the TEI files: the shares of reconstructed words and letters,
+    the span of the lacunae and the density of uncertain letters.
 
     Args:
-        input_files (str): The path to the input files to transform.
+        input_files (str): The path to the TEI files to describe.
+        output_file (file): The file to write the report to.
+        level (str): The grouping of the words: manuscript, chapter, verse or folio.
+        report_format (str): The format of the report: csv or json.
     """
-    for file in Path(input_files).glob('*.xml'):
-        click.echo(f"Transforming the input files: {file.name}")
-        TEITransformer(file).dump(Path(output_files) / file.name)
\ No newline at end of file
+    corpus = Corpus.open(input_files)
+    REPORT_FORMATS[report_format](preservation_statistics(corpus, level), output_file)
+
+
+@click.command()
+@click.option(
+    "--input",
+    "-i",
+    "input_files",
+    required=True,
+    type=click.Path(exists=True, dir_okay=True, file_okay=False, resolve_path=True),
+    help="The path to the TEI files to serve.",
+)
+@click.option("--host", default="127.0.0.1", help="The address to listen on.")
+@click.option("--port", default=8000, type=click.IntRange(min=0, max=65535), help="The port to listen on.")
+@click.option(
+    "--cache-size",
+    default=1024,
+    type=click.IntRange(min=1),
+    help="The number of rendered responses cached at most.",
+)
+def serve_files(input_files: Path, host: str, port: int, cache_size: int) -> None:
+    """Serve the TEI files over HTTP: manuscript listings, verse lookups and synopses as JSON, and
+    the pages of the manuscripts as HTML.
+
+    Args:
+        input_files (str): The path to the TEI files to serve.
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        cache_size (int): The number of rendered responses cached at most.
+    """
+    import asyncio
+    from tei_transformer.server import CorpusServer
+
+    with CorpusServer(input_files, cache_size=cache_size) as server:
+        server.warm()
+        click.echo(f"Serving {input_files} on http://{host}:{port}/")
+        try:
+            asyncio.run(server.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+
+
+@click.command()
+@click.argument(
+    "old_files", type=click.Path(exists=True, dir_okay=True, file_okay=True, resolve_path=True)
+)
+@click.argument(
+    "new_files", type=click.Path(exists=True, dir_okay=True, file_okay=True, resolve_path=True)
+)
+@click.option(
+    "--output",
+    "-o",
+    "output_file",
+    default="-",
+    type=click.File("w", encoding="utf-8"),
+    help="The path to the report, the standard output by default.",
+)
+@click.option(
+    "--format",
+    "report_format",
+    default="text",
+    type=click.Choice(DIFF_FORMAT_NAMES),
+    help="The format of the report.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    type=click.IntRange(min=1),
+    help="The number of processes to compare the manuscripts with.",
+)
+def diff_files(old_files: Path, new_files: Path, output_file, report_format: str, jobs: int) -> None:
+    """Compare two builds of the TEI files verse by verse, whatever their indentation: report the
+    verses added, removed and modified, with the words which changed.
+
+    Args:
+        old_files (str): The path to the TEI files of the old build, or to a single TEI file.
+        new_files (str): The path to the TEI files of the new build, or to a single TEI file.
+        output_file (file): The file to write the report to.
+        report_format (str): The format of the report: text or json.
+        jobs (int): The number of processes to compare the manuscripts with.
+    """
+    from tei_transformer.diff import DIFF_FORMATS, diff_builds
+
+    DIFF_FORMATS[report_format](diff_builds(old_files, new_files, jobs), output_file)
@@ -0,0 +1,231 @@
+"""Concordance of the TEI files: substring search over the text of each manuscript, with its context.
+"""
+from array import array
+from bisect import bisect_right
+from xml.etree import ElementTree
+from tei_transformer.verse_index import VerseIndex
+from tei_transformer.word_index import iter_words
+
+
+def flatten_word(elem: ElementTree.Element) -> str:
+    """Write a <w> back as text, the reconstructed parts within brackets and the blank spaces as
+    an ellipsis, as in "ו̇[שמחה]"."""
+    pieces = [elem.text or ""]
+    for child in elem:
+        if child.tag == "g" and (child.text or "").strip():
+            pieces.append(f"[{child.text}]")
+        elif child.tag == "blank":
+            pieces.append("…")
+        pieces.append(child.tail or "")
+    return "".join("".join(pieces).split())
+
+
+def suffix_array(text: str) -> array:
+    """Sort the suffixes of a text by prefix doubling: the suffixes are ranked by their first k
+    characters, then by their first 2k characters using the ranks of the previous round, until
+    all the ranks are distinct."""
+    size = len(text)
+    alphabet = {char: rank for rank, char in enumerate(sorted(set(text)), 1)}
+    rank = [alphabet[char] for char in text]
+    suffixes = list(range(size))
+    length = 1
+    while True:
+        # Suffixes shorter than length + 1 characters come first, with a second rank of 0
+        keys = [rank[i] * (size + 1) + (rank[i + length] if i + length < size else 0) for i in range(size)]
+        suffixes.sort(key=keys.__getitem__)
+        new_rank = [0] * size
+        current = 0
+        previous = None
+        for i in suffixes:
+            if keys[i] != previous:
+                current += 1
+                previous = keys[i]
+            new_rank[i] = current
+        rank = new_rank
+        if current == size:
+            return array("i", suffixes)
+        length *= 2
+
+
+class Concordance:
+    """Flatten the <w> of each manuscript into a single text, the words separated by spaces, and
+    store it along with its suffix array and the location of each word.
+
+    The suffix arrays are stored along with the verse index, and only built again for the
+    manuscripts whose TEI file changed.
+    """
+
+    def __init__(self, tei_dir: str, index_path: str = None) -> None:
+        """Open the verse index of a folder of TEI files, and bring the concordance up to date.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            index_path (str): The path to the index, stored within the TEI folder by default.
+        """
+        self.index = VerseIndex(tei_dir, index_path)
+        self.connection = self.index.connection
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS concordance_files (
+                manuscript TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS concordance_texts (
+                manuscript TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                suffixes BLOB NOT NULL,
+                starts BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS concordance_words (
+                manuscript TEXT NOT NULL,
+                entry INTEGER NOT NULL,
+                word INTEGER NOT NULL,
+                chapter TEXT,
+                verse TEXT,
+                position INTEGER,
+                folio TEXT,
+                col TEXT,
+                line TEXT,
+                margin TEXT,
+                PRIMARY KEY (manuscript, entry)
+            );
+            """
+        )
+        self._texts = {}
+        self.update()
+
+    def close(self) -> None:
+        """Close the connection to the index."""
+        self.index.close()
+
+    def __enter__(self) -> "Concordance":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def index_manuscript(self, manuscript: str) -> None:
+        """Flatten the words of a manuscript, and store its text, suffix array and word locations."""
+        forms = []
+        starts = array("i")
+        rows = []
+        offset = 0
+        for word, elem, location in iter_words(self.index.tei_dir / f"{manuscript}.xml"):
+            form = flatten_word(elem)
+            if not form:
+                continue
+            rows.append(dict(location, manuscript=manuscript, entry=len(forms), word=word))
+            forms.append(form)
+            starts.append(offset)
+            offset += len(form) + 1
+        text = " ".join(forms)
+        self.connection.execute(
+            "INSERT INTO concordance_texts VALUES (?, ?, ?, ?)",
+            (manuscript, text, suffix_array(text).tobytes(), starts.tobytes()),
+        )
+        self.connection.executemany(
+            "INSERT INTO concordance_words VALUES (:manuscript, :entry, :word, :chapter, :verse, "
+            ":position, :folio, :col, :line, :margin)",
+            rows,
+        )
+
+    def update(self) -> list[str]:
+        """Build the concordance of the manuscripts indexed since it was last built.
+
+        Returns:
+            list[str]: The manuscripts (re)built.
+        """
+        rebuilt = self.index.update_derived(
+            "concordance_files", ["concordance_texts", "concordance_words"], self.index_manuscript
+        )
+        self._texts.clear()
+        return rebuilt
+
+    def refresh(self) -> None:
+        """Bring the verse index and the concordance up to date with the TEI files."""
+        self.index.refresh()
+        self.update()
+
+    def texts(self) -> dict:
+        """Load the text, suffix array and word offsets of each manuscript, once."""
+        if not self._texts:
+            for manuscript, text, suffixes, starts in self.connection.execute(
+                "SELECT * FROM concordance_texts ORDER BY manuscript"
+            ):
+                self._texts[manuscript] = (
+                    text, array("i", suffixes), array("i", starts)
+                )
+        return self._texts
+
+    @staticmethod
+    def bisect_suffixes(text: str, suffixes: array, query: str, low: int, after: bool = False) -> int:
+        """Find the first suffix starting with the query (or, after it, the first suffix sorted
+        after the ones starting with the query) by binary search from low."""
+        high = len(suffixes)
+        while low < high:
+            middle = (low + high) // 2
+            prefix = text[suffixes[middle]:suffixes[middle] + len(query)]
+            if prefix < query or (after and prefix == query):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def search(self, query: str, manuscripts: list[str] = None) -> list[tuple]:
+        """Find the offsets of a substring in the texts of the manuscripts, by binary search over
+        their suffix arrays.
+
+        Args:
+            query (str): The substring to search, which can span several words.
+            manuscripts (list[str]): The manuscripts to search (TEI file names without extension,
+                such as "ms_a"), all of them by default.
+
+        Returns:
+            list[tuple]: The manuscript and offset of each occurrence, in the order of the texts.
+        """
+        occurrences = []
+        for manuscript, (text, suffixes, _) in self.texts().items():
+            if manuscripts is not None and manuscript not in manuscripts:
+                continue
+            first = self.bisect_suffixes(text, suffixes, query, 0)
+            last = self.bisect_suffixes(text, suffixes, query, first, after=True)
+            occurrences.extend((manuscript, offset) for offset in sorted(suffixes[first:last]))
+        return occurrences
+
+    def concordance(self, query: str, width: int = 30, manuscripts: list[str] = None) -> list[dict]:
+        """Search a substring and return each of its occurrences in context (keyword in context).
+
+        Args:
+            query (str): The substring to search, which can span several words.
+            width (int): The number of characters of context on each side of the occurrences.
+            manuscripts (list[str]): The manuscripts to search, all of them by default.
+
+        Returns:
+            list[dict]: The left context, match and right context of each occurrence, along with
+                the manuscript, chapter, verse, folio, column, line and margin of the word where
+                it starts.
+        """
+        lines = []
+        for manuscript, offset in self.search(query, manuscripts):
+            text, _, starts = self.texts()[manuscript]
+            cursor = self.connection.execute(
+                "SELECT * FROM concordance_words WHERE manuscript = ? AND entry = ?",
+                (manuscript, bisect_right(starts, offset) - 1),
+            )
+            columns = [description[0] for description in cursor.description]
+            location = dict(zip(columns, cursor.fetchone()))
+            del location["entry"]
+            lines.append(dict(
+                location,
+                left=text[max(offset - width, 0):offset],
+                match=text[offset:offset + len(query)],
+                right=text[offset + len(query):offset + len(query) + width],
+            ))
+        return lines
+
+    @staticmethod
+    def format_line(line: dict, width: int = 30) -> str:
+        """Format an occurrence returned by concordance as a line of a keyword in context listing."""
+        reference = f"{line['manuscript']} {line['chapter']}:{line['verse']}"
+        return f"{reference:<16} {line['left']:>{width}} {line['match']} {line['right']}"
@@ -0,0 +1,548 @@
+"""Compact in-memory model of the TEI files, for analytics over the whole corpus.
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from itertools import groupby
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from xml.etree import ElementTree
+from tei_transformer.word_index import iter_words, normalize_word
+
+
+# The combining marks of the uncertain letters: dot and ring above
+UNCERTAIN_MARKS = ("\u0307", "\u030a")
+
+
+def count_letters(text: str) -> int:
+    """Count the letters of a text, leaving out vocalization, marks and punctuation."""
+    return sum(map(str.isalpha, text))
+
+
+def reconstructed_text(elem: ElementTree.Element) -> str:
+    """Gather the text of the g reconstructed elements within an element, the nested ones once."""
+    return "".join(
+        "".join(child.itertext()) if child.tag == "g" else reconstructed_text(child)
+        for child in elem
+    )
+
+
+def measure_word(elem: ElementTree.Element) -> Tuple[str, int, int, int, int]:
+    """Measure the preservation of a <w>.
+
+    Returns:
+        tuple: The form of the word, its number of letters, of reconstructed letters and of
+            uncertain letters, and the span of its blank spaces.
+    """
+    form = "".join("".join(elem.itertext()).split())
+    if not len(elem):
+        # Most words have neither reconstructed letters nor blank spaces
+        return form, count_letters(form), 0, sum(map(form.count, UNCERTAIN_MARKS)), 0
+    return (
+        form,
+        count_letters(form),
+        count_letters(reconstructed_text(elem)),
+        sum(map(form.count, UNCERTAIN_MARKS)),
+        sum(int(blank.get("span", 1)) for blank in elem.iter("blank")),
+    )
+
+
+class StringTable:
+    """Intern strings as integer ids, the id 0 standing for None."""
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self) -> None:
+        self.strings = [None]
+        self.ids = {None: 0}
+
+    @classmethod
+    def from_strings(cls, strings: list) -> "StringTable":
+        """Create a table holding some strings, the first one standing for None."""
+        table = cls()
+        table.strings = [None, *strings[1:]]
+        table.ids = dict(zip(table.strings, range(len(table.strings))))
+        return table
+
+    def intern(self, string: Optional[str]) -> int:
+        """Return the id of a string, adding it to the table if needed."""
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def __getitem__(self, string_id: int) -> Optional[str]:
+        return self.strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class Word:
+    """A view on a word of the corpus."""
+
+    __slots__ = ("corpus", "index")
+
+    def __init__(self, corpus: "Corpus", index: int) -> None:
+        self.corpus = corpus
+        self.index = index
+
+    @property
+    def form(self) -> str:
+        """The word as written, with its diacritics."""
+        return self.corpus.forms.strings[self.corpus.form_ids[self.index]]
+
+    @property
+    def key(self) -> str:
+        """The word normalized for searching, without its diacritics."""
+        return self.corpus.keys.strings[self.corpus.key_ids[self.corpus.form_ids[self.index]]]
+
+    @property
+    def manuscript(self) -> str:
+        return self.corpus.manuscripts.strings[self.corpus.manuscript_ids[self.index]]
+
+    @property
+    def chapter(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.chapter_ids[self.index]]
+
+    @property
+    def verse(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.verse_ids[self.index]]
+
+    @property
+    def folio(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.folio_ids[self.index]]
+
+    @property
+    def col(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.col_ids[self.index]]
+
+    @property
+    def line(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.line_ids[self.index]]
+
+    @property
+    def margin(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.margin_ids[self.index]]
+
+    @property
+    def reconstructed(self) -> bool:
+        return bool(self.corpus.reconstructed[self.index])
+
+    @property
+    def letters(self) -> int:
+        return self.corpus.letters[self.index]
+
+    @property
+    def reconstructed_letters(self) -> int:
+        return self.corpus.reconstructed_letters[self.index]
+
+    @property
+    def uncertain_letters(self) -> int:
+        return self.corpus.uncertain_letters[self.index]
+
+    @property
+    def blank_span(self) -> int:
+        """The number of characters left blank within the word, in lacunae."""
+        return self.corpus.blank_spans[self.index]
+
+    def __repr__(self) -> str:
+        return f"Word({self.manuscript} {self.chapter}:{self.verse} {self.form!r})"
+
+
+class Verse:
+    """A view on a verse of the corpus, and the range of its words."""
+
+    __slots__ = ("corpus", "index")
+
+    def __init__(self, corpus: "Corpus", index: int) -> None:
+        self.corpus = corpus
+        self.index = index
+
+    @property
+    def manuscript(self) -> str:
+        return self.corpus.manuscripts.strings[self.corpus.verse_manuscript_ids[self.index]]
+
+    @property
+    def chapter(self) -> Optional[str]:
+        return self.corpus.labels.strings[self.corpus.verse_chapter_ids[self.index]]
+
+    @property
+    def label(self) -> str:
+        return self.corpus.labels.strings[self.corpus.verse_label_ids[self.index]]
+
+    @property
+    def words(self) -> range:
+        """The indexes of the words of the verse in the corpus."""
+        return range(self.corpus.verse_starts[self.index], self.corpus.verse_stops[self.index])
+
+    def __iter__(self) -> Iterator[Word]:
+        return (Word(self.corpus, index) for index in self.words)
+
+    @property
+    def text(self) -> str:
+        """The words of the verse, separated by spaces, the lacunae left out."""
+        forms = self.corpus.forms.strings
+        form_ids = self.corpus.form_ids
+        return " ".join(filter(None, (forms[form_ids[index]] for index in self.words)))
+
+    def __repr__(self) -> str:
+        return f"Verse({self.manuscript} {self.chapter}:{self.label})"
+
+
+class Corpus:
+    """The words of the TEI files, stored column by column in typed arrays.
+
+    Each word is a row across the columns: the id of its form, the ids of its manuscript,
+    chapter, verse, folio, column, line and margin labels, its reconstruction flag, its number of
+    letters, of reconstructed and of uncertain letters, and the span of its blank spaces. The words
+    made of blank spaces only are kept, with an empty form. The forms and labels are interned once
+    in string tables. The verses are stored the same way, along with the range of their words.
+    Word and Verse are views on a row, created on demand.
+
+    The corpus can be saved as a binary snapshot: a JSON header followed by the string tables and
+    the columns as they are in memory. Opening a snapshot maps it in memory, and the columns are
+    then read-only views on the mapped file, so that the processes using the corpus share its pages
+    instead of parsing the TEI files again.
+    """
+
+    SNAPSHOT_NAME = ".corpus-snapshot.bin"
+    SNAPSHOT_MAGIC = b"TEICORP1"
+    STRING_TABLES = ["forms", "keys", "labels", "manuscripts"]
+    # The columns holding a row per word and per verse, the ranges of words of the verses aside
+    WORD_COLUMNS = [
+        "form_ids", "manuscript_ids", "chapter_ids", "verse_ids", "folio_ids", "col_ids", "line_ids",
+        "margin_ids", "reconstructed", "letters", "reconstructed_letters", "uncertain_letters",
+        "blank_spans",
+    ]
+    VERSE_COLUMNS = ["verse_manuscript_ids", "verse_chapter_ids", "verse_label_ids"]
+
+    def __init__(self) -> None:
+        """Create an empty corpus."""
+        # The modification time and size of the TEI files loaded, by manuscript
+        self.files = {}
+        self.forms = StringTable()
+        self.keys = StringTable()
+        self.labels = StringTable()
+        self.manuscripts = StringTable()
+        # The id of the normalized key of each form
+        self.key_ids = array("I", [0])
+        # The columns of the words
+        self.form_ids = array("I")
+        self.manuscript_ids = array("H")
+        self.chapter_ids = array("I")
+        self.verse_ids = array("I")
+        self.folio_ids = array("I")
+        self.col_ids = array("I")
+        self.line_ids = array("I")
+        self.margin_ids = array("I")
+        self.reconstructed = array("B")
+        self.letters = array("H")
+        self.reconstructed_letters = array("H")
+        self.uncertain_letters = array("H")
+        self.blank_spans = array("H")
+        # The columns of the verses
+        self.verse_manuscript_ids = array("H")
+        self.verse_chapter_ids = array("I")
+        self.verse_label_ids = array("I")
+        self.verse_starts = array("I")
+        self.verse_stops = array("I")
+
+    @classmethod
+    def load(cls, tei_dir: str) -> "Corpus":
+        """Load all the TEI files of a folder.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+        """
+        corpus = cls()
+        # The files are stated before being read, so that a file changed meanwhile is read again
+        corpus.files = cls.stat_files(tei_dir)
+        for file_path in sorted(Path(tei_dir).glob("*.xml")):
+            corpus.add_manuscript(file_path)
+        return corpus
+
+    @staticmethod
+    def stat_files(tei_dir: str) -> dict:
+        """The modification time and size of each TEI file of a folder, by manuscript."""
+        files = {}
+        for entry in sorted(os.scandir(tei_dir), key=lambda entry: entry.name):
+            if entry.name.endswith(".xml") and entry.is_file():
+                stat = entry.stat()
+                files[entry.name[:-len(".xml")]] = [stat.st_mtime_ns, stat.st_size]
+        return files
+
+    @classmethod
+    def open(cls, tei_dir: str, snapshot_path: str = None) -> "Corpus":
+        """Open the snapshot of a folder of TEI files, after saving it again from the TEI files if
+        it is missing or any of them changed since.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            snapshot_path (str): The path to the snapshot, stored within the TEI folder by default.
+        """
+        snapshot_path = Path(snapshot_path or Path(tei_dir) / cls.SNAPSHOT_NAME)
+        files = cls.stat_files(tei_dir)
+        try:
+            corpus = cls.open_snapshot(snapshot_path)
+        except (OSError, ValueError):
+            corpus = None
+        if corpus is not None and corpus.files == files:
+            return corpus
+        corpus = cls.load(tei_dir)
+        try:
+            corpus.save(snapshot_path)
+        except OSError:
+            # The TEI folder may be read-only: the corpus is used as loaded
+            pass
+        return corpus
+
+    @classmethod
+    def refresh(cls, tei_dir: str, manuscripts: list, snapshot_path: str = None) -> "Corpus":
+        """Save the snapshot of a folder of TEI files again once some of them have been rebuilt,
+        only reading the TEI files of these manuscripts: the rows of the other ones are copied from
+        the previous snapshot, along with its string tables, the strings no longer used included.
+        The whole folder is loaded instead if the previous snapshot is missing, or out of date with
+        the other TEI files.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            manuscripts (list): The names of the manuscripts rebuilt (without extension).
+            snapshot_path (str): The path to the snapshot, stored within the TEI folder by default.
+
+        Raises:
+            ElementTree.ParseError: If a TEI file to read is not well-formed.
+        """
+        snapshot_path = Path(snapshot_path or Path(tei_dir) / cls.SNAPSHOT_NAME)
+        files = cls.stat_files(tei_dir)
+        rebuilt = set(manuscripts)
+        try:
+            previous = cls.open_snapshot(snapshot_path)
+        except (OSError, ValueError):
+            previous = None
+        if previous is None or any(
+            previous.files.get(manuscript) != stat
+            for manuscript, stat in files.items()
+            if manuscript not in rebuilt
+        ):
+            corpus = cls.load(tei_dir)
+        elif previous.files == files and not rebuilt:
+            return previous
+        else:
+            corpus = cls()
+            corpus.files = files
+            for name in cls.STRING_TABLES:
+                setattr(corpus, name, StringTable.from_strings(getattr(previous, name).strings))
+            corpus.key_ids = array("I", previous.key_ids)
+            word_ranges = cls._ranges(previous.manuscript_ids)
+            verse_ranges = cls._ranges(previous.verse_manuscript_ids)
+            for manuscript in files:
+                manuscript_id = previous.manuscripts.ids.get(manuscript)
+                if manuscript in rebuilt or manuscript not in previous.files:
+                    corpus.add_manuscript(Path(tei_dir) / f"{manuscript}.xml")
+                else:
+                    corpus._copy_manuscript(
+                        previous, word_ranges.get(manuscript_id), verse_ranges.get(manuscript_id)
+                    )
+        try:
+            corpus.save(snapshot_path)
+        except OSError:
+            # The TEI folder may be read-only: the corpus is used as loaded
+            pass
+        return corpus
+
+    @staticmethod
+    def _ranges(column) -> dict:
+        """The start and stop indexes of the runs of a column of ids, by id."""
+        ranges = {}
+        start = 0
+        for value, run in groupby(column):
+            stop = start + sum(1 for _ in run)
+            ranges[value] = (start, stop)
+            start = stop
+        return ranges
+
+    def _copy_manuscript(
+        self, previous: "Corpus", word_range: Optional[tuple], verse_range: Optional[tuple]
+    ) -> None:
+        """Append the rows of the words and verses of a manuscript from another corpus sharing the
+        same string tables."""
+        if word_range is None:
+            return
+        start, stop = word_range
+        offset = len(self.form_ids) - start
+        for name in self.WORD_COLUMNS:
+            getattr(self, name).frombytes(memoryview(getattr(previous, name))[start:stop].tobytes())
+        if verse_range is None:
+            return
+        start, stop = verse_range
+        for name in self.VERSE_COLUMNS:
+            getattr(self, name).frombytes(memoryview(getattr(previous, name))[start:stop].tobytes())
+        self.verse_starts.extend(index + offset for index in previous.verse_starts[start:stop])
+        self.verse_stops.extend(index + offset for index in previous.verse_stops[start:stop])
+
+    def save(self, snapshot_path: str) -> None:
+        """Save the corpus as a binary snapshot, replacing any previous one at once.
+
+        Args:
+            snapshot_path (str): The path to the snapshot.
+        """
+        sections = []
+        for name in self.STRING_TABLES:
+            strings = getattr(self, name).strings
+            sections.append((name, "B", "\0".join(["", *strings[1:]]).encode("utf-8")))
+        for name, column in vars(self).items():
+            if isinstance(column, (array, memoryview)):
+                typecode = column.format if isinstance(column, memoryview) else column.typecode
+                sections.append((name, typecode, memoryview(column).cast("B")))
+        # The offsets of the sections are relative to the end of the header, each section being
+        # aligned on 8 bytes
+        header = {"byteorder": sys.byteorder, "files": self.files, "sections": {}}
+        offset = 0
+        for name, typecode, data in sections:
+            header["sections"][name] = [typecode, offset, len(data)]
+            offset += len(data) + -len(data) % 8
+        encoded = json.dumps(header).encode("utf-8")
+        encoded += b" " * (-(len(self.SNAPSHOT_MAGIC) + 4 + len(encoded)) % 8)
+        temporary_path = Path(f"{snapshot_path}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(self.SNAPSHOT_MAGIC)
+            f.write(len(encoded).to_bytes(4, "little"))
+            f.write(encoded)
+            for _, _, data in sections:
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        # The processes which mapped the previous snapshot keep reading it
+        os.replace(temporary_path, snapshot_path)
+
+    @classmethod
+    def open_snapshot(cls, snapshot_path: str) -> "Corpus":
+        """Open a binary snapshot of a corpus by mapping it in memory, its columns being read-only.
+
+        Args:
+            snapshot_path (str): The path to the snapshot.
+
+        Raises:
+            ValueError: If the file is not a snapshot, or was written on a machine of another
+                byte order.
+        """
+        with open(snapshot_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        magic_size = len(cls.SNAPSHOT_MAGIC)
+        if view[:magic_size] != cls.SNAPSHOT_MAGIC:
+            raise ValueError(f"{snapshot_path} is not a corpus snapshot")
+        start = magic_size + 4 + int.from_bytes(view[magic_size:magic_size + 4], "little")
+        header = json.loads(bytes(view[magic_size + 4:start]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{snapshot_path} was written with another byte order")
+        corpus = cls()
+        corpus.files = header["files"]
+        for name, (typecode, offset, size) in header["sections"].items():
+            data = view[start + offset:start + offset + size]
+            if name in cls.STRING_TABLES:
+                setattr(corpus, name, StringTable.from_strings(str(data, "utf-8").split("\0")))
+            else:
+                setattr(corpus, name, data.cast(typecode))
+        return corpus
+
+    def add_manuscript(self, file_path: str) -> None:
+        """Add the words and verses of a TEI file to the corpus, the manuscript being named after
+        the file (without extension)."""
+        manuscript_id = self.manuscripts.intern(Path(file_path).stem)
+        intern_label = self.labels.intern
+        current_position = None
+        for _, elem, location in iter_words(file_path):
+            form, letters, reconstructed_letters, uncertain_letters, blank_span = measure_word(elem)
+            if not form and not blank_span:
+                continue
+            form_id = self.forms.intern(form)
+            if form_id == len(self.key_ids):
+                self.key_ids.append(self.keys.intern(normalize_word(form)))
+            index = len(self.form_ids)
+            self.form_ids.append(form_id)
+            self.manuscript_ids.append(manuscript_id)
+            self.chapter_ids.append(intern_label(location["chapter"]))
+            self.verse_ids.append(intern_label(location["verse"]))
+            self.folio_ids.append(intern_label(location["folio"]))
+            self.col_ids.append(intern_label(location["col"]))
+            self.line_ids.append(intern_label(location["line"]))
+            self.margin_ids.append(intern_label(location["margin"]))
+            self.reconstructed.append(elem.get("reconstructed") == "1")
+            self.letters.append(letters)
+            self.reconstructed_letters.append(reconstructed_letters)
+            self.uncertain_letters.append(uncertain_letters)
+            self.blank_spans.append(blank_span)
+            position = location["position"]
+            if position is None:
+                current_position = None
+            elif position != current_position:
+                current_position = position
+                self.verse_manuscript_ids.append(manuscript_id)
+                self.verse_chapter_ids.append(intern_label(location["chapter"]))
+                self.verse_label_ids.append(intern_label(location["verse"]))
+                self.verse_starts.append(index)
+                self.verse_stops.append(index + 1)
+            else:
+                self.verse_stops[-1] = index + 1
+
+    def __len__(self) -> int:
+        return len(self.form_ids)
+
+    def __getitem__(self, index: int) -> Word:
+        if not -len(self) <= index < len(self):
+            raise IndexError("word index out of range")
+        return Word(self, index % len(self))
+
+    def __iter__(self) -> Iterator[Word]:
+        return (Word(self, index) for index in range(len(self)))
+
+    def verses(self) -> Iterator[Verse]:
+        """Iterate over the verses of the corpus, in the order of the manuscripts."""
+        return (Verse(self, index) for index in range(len(self.verse_starts)))
+
+    # The columns and string tables of the fields of the words
+    FIELDS = {
+        "form": ("form_ids", "forms"),
+        "manuscript": ("manuscript_ids", "manuscripts"),
+        "chapter": ("chapter_ids", "labels"),
+        "verse": ("verse_ids", "labels"),
+        "folio": ("folio_ids", "labels"),
+        "col": ("col_ids", "labels"),
+        "line": ("line_ids", "labels"),
+        "margin": ("margin_ids", "labels"),
+        "reconstructed": ("reconstructed", None),
+        "letters": ("letters", None),
+        "reconstructed_letters": ("reconstructed_letters", None),
+        "uncertain_letters": ("uncertain_letters", None),
+        "blank_span": ("blank_spans", None),
+    }
+
+    def rows(self, *fields: str) -> Iterator[tuple]:
+        """Iterate over some fields of all the words of the corpus, as tuples, without creating any
+        view: this is the fastest way to go through the whole corpus.
+
+        Args:
+            fields (str): The fields to return, among form, manuscript, chapter, verse, folio,
+                col, line, margin, reconstructed, letters, reconstructed_letters,
+                uncertain_letters and blank_span.
+        """
+        columns = []
+        for field in fields:
+            column, table = self.FIELDS[field]
+            if table is None:
+                columns.append(getattr(self, column))
+            else:
+                columns.append(map(getattr(self, table).strings.__getitem__, getattr(self, column)))
+        return zip(*columns)
+
+    def nbytes(self) -> int:
+        """The size of the columns of the corpus, in bytes (the string tables left aside)."""
+        return sum(
+            column.itemsize * len(column)
+            for column in vars(self).values()
+            if isinstance(column, (array, memoryview))
+        )
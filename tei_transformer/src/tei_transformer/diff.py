@@ -0,0 +1,289 @@
+"""Verse-keyed diff of two builds of the TEI files: the verses added, removed or modified, with the
+words which changed.
+"""
+import difflib
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, TextIO, Tuple
+from xml.etree import ElementTree
+from tei_transformer.synopsis import verse_keys
+
+
+def normalize_space(text: str) -> str:
+    """Collapse the runs of whitespace of a text, leaving out the indentation of the TEI file."""
+    return " ".join(text.split()) if text else ""
+
+
+def canonical(elem: ElementTree.Element) -> tuple:
+    """Describe an element, along with its tail, as nested tuples with its attributes sorted and its
+    whitespace normalized, so that the pretty-printed and the compact serializations of an element
+    are described the same."""
+    return (
+        elem.tag,
+        tuple(sorted(elem.attrib.items())),
+        normalize_space(elem.text),
+        tuple(map(canonical, elem)),
+        normalize_space(elem.tail),
+    )
+
+
+def word_text(elem: ElementTree.Element) -> str:
+    """Render a <w> as in the raw files: its reconstructed letters within brackets, and its blank
+    spaces as brackets around as many spaces."""
+    parts = [normalize_space(elem.text)]
+    for child in elem:
+        if child.tag == "blank":
+            parts.append(f"[{' ' * int(child.get('span', 1))}]")
+        elif child.tag == "g":
+            parts.append(f"[{word_text(child)}]")
+        else:
+            parts.append(word_text(child))
+        parts.append(normalize_space(child.tail))
+    return "".join(parts)
+
+
+def verse_label(chapter: Optional[str], verse: str) -> str:
+    """The label a verse is compared by: its canonical chapter:verse numbers (see
+    synopsis.verse_keys), consecutive verses as a range such as 20:20-28, so that the same verse
+    labelled differently (19cd, 19c-d) is compared with itself. A verse without any number keeps
+    its raw label."""
+    keys = list(dict.fromkeys((chapter, number) for chapter, number, _ in verse_keys(chapter, verse)))
+    if not keys:
+        return f"{chapter}:{verse}" if chapter is not None else verse
+    runs = []
+    for key_chapter, number in keys:
+        if runs and runs[-1][0] == key_chapter and runs[-1][2] == number - 1:
+            runs[-1][2] = number
+        else:
+            runs.append([key_chapter, number, number])
+    return ",".join(
+        f"{run_chapter}:{start}" if start == stop else f"{run_chapter}:{start}-{stop}"
+        for run_chapter, start, stop in runs
+    )
+
+
+def hash_items(attributes: tuple, text: str, children) -> Tuple[bytes, bytes, list]:
+    """Hash the content of a verse, or of a chapter outside its verses, given the attributes and
+    the text of its element and its children.
+
+    Returns:
+        tuple: The hash of the whole content, the hash of its layout, i.e. what is not a word
+            (lines, stichs...), and the words, as their canonical description and their text.
+    """
+    words = []
+    layout = [attributes, normalize_space(text)]
+    for child in children:
+        if child.tag == "w":
+            words.append((canonical(child), word_text(child)))
+        else:
+            layout.append(canonical(child))
+    # The representation of the tuples of strings is unambiguous, and cheap to compute
+    layout_hash = hashlib.blake2b(repr(layout).encode("utf-8"), digest_size=16)
+    digest = layout_hash.copy()
+    digest.update(repr([item for item, _ in words]).encode("utf-8"))
+    return digest.digest(), layout_hash.digest(), words
+
+
+def iter_verses(file_path: str) -> Iterator[dict]:
+    """Iterate over the verses of a TEI file, in document order, with their key, their hash and
+    their words.
+
+    The key of a verse is its canonical label (see verse_label), followed by #2, #3... for the
+    next verses of the manuscript with the same label. Its hash covers the whole <div>, whitespace
+    normalized (see canonical), while the hash of its layout only covers what is not a word:
+    lines, stichs... Each word is given as its canonical description and its text. The content of
+    a chapter outside its verses (words before the first verse, margins...) is compared as a verse
+    of its own, keyed chapter:#front and following the verses of the chapter.
+    """
+    chapter = None
+    occurrences = {}
+
+    def verse(label: str, verse_label_: str, hashes: tuple) -> dict:
+        occurrences[label] = occurrences.get(label, 0) + 1
+        digest, layout, words = hashes
+        return {
+            "key": label if occurrences[label] == 1 else f"{label}#{occurrences[label]}",
+            "chapter": chapter,
+            "verse": verse_label_,
+            "hash": digest,
+            "layout": layout,
+            "words": words,
+        }
+
+    for event, elem in ElementTree.iterparse(file_path, events=("start", "end")):
+        is_div = elem.tag == "div"
+        if event == "start":
+            if is_div and elem.get("type") == "chap":
+                chapter = normalize_space(elem.get("n"))
+            continue
+        if not is_div:
+            continue
+        if elem.get("type") == "verse":
+            label = normalize_space(elem.get("n"))
+            yield verse(
+                verse_label(chapter, label),
+                label,
+                hash_items(tuple(sorted(elem.attrib.items())), elem.text, elem),
+            )
+            elem.clear()
+        elif elem.get("type") == "chap":
+            # The verses, its only <div>, were cleared once compared, attributes included
+            front = [child for child in elem if child.tag != "div"]
+            if front or normalize_space(elem.text):
+                yield verse(f"{chapter}:#front", "#front", hash_items((), elem.text, front))
+            elem.clear()
+
+
+def diff_words(old_words: list, new_words: list) -> list[dict]:
+    """Compare the words of two versions of a verse, given as returned by iter_verses.
+
+    Returns:
+        list[dict]: The changes, as the operation (replace, delete or insert), the index of the
+            first word concerned in each version, and the text of the old and new words.
+    """
+    matcher = difflib.SequenceMatcher(
+        None, [item for item, _ in old_words], [item for item, _ in new_words], autojunk=False
+    )
+    return [
+        {
+            "op": op,
+            "old_start": old_start,
+            "new_start": new_start,
+            "old": [text for _, text in old_words[old_start:old_stop]],
+            "new": [text for _, text in new_words[new_start:new_stop]],
+        }
+        for op, old_start, old_stop, new_start, new_stop in matcher.get_opcodes()
+        if op != "equal"
+    ]
+
+
+def diff_verses(manuscript: str, old_verses: list[dict], new_verses: list[dict]) -> list[dict]:
+    """Compare two versions of the verses of a manuscript by key, in linear time, the words being
+    only compared within the modified verses.
+
+    Returns:
+        list[dict]: The verses added and modified, in the order of the new version, then the ones
+            removed, in the order of the old version. Each change holds the manuscript, the key,
+            chapter and verse, the status, and either the text of the verse (added, removed) or the
+            changes of its words and whether its layout changed (modified).
+    """
+    old_by_key = {verse["key"]: verse for verse in old_verses}
+    new_keys = set()
+    changes = []
+    for verse in new_verses:
+        new_keys.add(verse["key"])
+        old = old_by_key.get(verse["key"])
+        if old is not None and old["hash"] == verse["hash"]:
+            continue
+        change = {
+            "manuscript": manuscript,
+            "key": verse["key"],
+            "chapter": verse["chapter"],
+            "verse": verse["verse"],
+        }
+        if old is None:
+            change.update(status="added", text=" ".join(text for _, text in verse["words"]))
+        else:
+            change.update(
+                status="modified",
+                words=diff_words(old["words"], verse["words"]),
+                layout=old["layout"] != verse["layout"],
+            )
+        changes.append(change)
+    for verse in old_verses:
+        if verse["key"] not in new_keys:
+            changes.append({
+                "manuscript": manuscript,
+                "key": verse["key"],
+                "chapter": verse["chapter"],
+                "verse": verse["verse"],
+                "status": "removed",
+                "text": " ".join(text for _, text in verse["words"]),
+            })
+    return changes
+
+
+def same_content(old_file: Path, new_file: Path) -> bool:
+    """Check whether two files hold the same bytes, comparing their sizes first."""
+    if old_file.stat().st_size != new_file.stat().st_size:
+        return False
+    return old_file.read_bytes() == new_file.read_bytes()
+
+
+def diff_files(manuscript: str, old_file: Optional[Path], new_file: Optional[Path]) -> list[dict]:
+    """Compare two versions of the TEI file of a manuscript, verse by verse (see diff_verses).
+
+    A missing file has no verses, and files holding the same bytes are not parsed.
+    """
+    if old_file is not None and new_file is not None and same_content(old_file, new_file):
+        return []
+    old_verses = list(iter_verses(old_file)) if old_file is not None else []
+    new_verses = list(iter_verses(new_file)) if new_file is not None else []
+    return diff_verses(manuscript, old_verses, new_verses)
+
+
+def diff_builds(old_path: str, new_path: str, jobs: int = 1) -> list[dict]:
+    """Compare two builds of the TEI files, verse by verse.
+
+    Args:
+        old_path (str): The path to the TEI files of the old build, or to a single TEI file.
+        new_path (str): The path to the TEI files of the new build, or to a single TEI file.
+        jobs (int): The number of processes to compare the manuscripts with.
+
+    Returns:
+        list[dict]: The changes of the verses (see diff_verses), manuscript by manuscript. The
+            manuscripts are the TEI files found in either build, named after the file, and their
+            verses are all added or all removed when missing from the other build.
+    """
+    old_path, new_path = Path(old_path), Path(new_path)
+    if old_path.is_dir() or new_path.is_dir():
+        old_files = {file.stem: file for file in old_path.glob("*.xml")}
+        new_files = {file.stem: file for file in new_path.glob("*.xml")}
+    else:
+        old_files = {new_path.stem: old_path}
+        new_files = {new_path.stem: new_path}
+    manuscripts = sorted(old_files.keys() | new_files.keys())
+    arguments = (
+        manuscripts,
+        [old_files.get(manuscript) for manuscript in manuscripts],
+        [new_files.get(manuscript) for manuscript in manuscripts],
+    )
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return [change for changes in executor.map(diff_files, *arguments) for change in changes]
+    return [change for changes in map(diff_files, *arguments) for change in changes]
+
+
+def write_text(changes: list[dict], f: TextIO) -> None:
+    """Write the changes of the verses as text, one line per verse followed by its changes, then
+    their totals."""
+    for change in changes:
+        f.write(f"{change['manuscript']} {change['key']}: {change['status']}\n")
+        if change["status"] != "modified":
+            f.write(f"    {change['text']}\n")
+            continue
+        for word in change["words"]:
+            old, new = " ".join(word["old"]), " ".join(word["new"])
+            if word["op"] == "replace":
+                f.write(f"    word {word['old_start'] + 1}: {old} → {new}\n")
+            elif word["op"] == "delete":
+                f.write(f"    word {word['old_start'] + 1}: - {old}\n")
+            else:
+                f.write(f"    word {word['new_start'] + 1}: + {new}\n")
+        if change["layout"]:
+            f.write("    lines, stichs, margins or attributes changed\n")
+    totals = {status: 0 for status in ["added", "removed", "modified"]}
+    for change in changes:
+        totals[change["status"]] += 1
+    f.write(", ".join(f"{count} verse(s) {status}" for status, count in totals.items()) + "\n")
+
+
+def write_json(changes: list[dict], f: TextIO) -> None:
+    """Write the changes of the verses as a JSON list, one object per verse."""
+    json.dump(changes, f, ensure_ascii=False, indent=2)
+    f.write("\n")
+
+
+DIFF_FORMATS = {"text": write_text, "json": write_json}
@@ -0,0 +1,282 @@
+"""Render the TEI files as HTML for proof-reading, one page per chapter.
+"""
+import html
+from pathlib import Path
+from typing import Optional
+from xml.etree import ElementTree
+
+
+STYLESHEET = """\
+body { font-family: serif; margin: 2em auto; max-width: 50em; }
+nav { display: flex; gap: 1em; }
+main { font-size: 1.3em; line-height: 1.8; }
+.verse h3 { font-size: 0.7em; margin: 1em 0 0; }
+.w { margin-inline-end: 0.3em; }
+.reconstructed { color: #777; }
+.reconstructed::before { content: "["; }
+.reconstructed::after { content: "]"; }
+.blank { border-bottom: 1px dotted #000; }
+.stich { display: inline-block; width: 2em; }
+.line { color: #a33; font-size: 0.6em; vertical-align: super; margin-inline-end: 0.3em; }
+.margin { border-inline-start: 3px solid #ccd; background: #f4f4fa; margin: 0.3em 0; padding: 0 0.5em; }
+.margin::before { content: attr(title); display: block; color: #555; font-size: 0.6em; direction: ltr; }
+.add { vertical-align: super; font-size: 0.8em; }
+"""
+
+
+class HTMLRenderer:
+    """Render a TEI file as an HTML page per chapter, along with an index page listing them.
+
+    The TEI file is streamed: each page is buffered while its chapter is read, and written at once
+    when the next chapter starts, after which the elements of the chapter are discarded. Whatever
+    follows a chapter outside of any chapter stays on its page.
+    """
+
+    STYLESHEET_NAME = "style.css"
+
+    def __init__(self, file_path: str) -> None:
+        """Prepare the rendering of a TEI file.
+
+        Args:
+            file_path (str): The path to the TEI file.
+        """
+        self.file_path = Path(file_path)
+        self.manuscript = self.file_path.stem
+        self.name = self.manuscript
+        self.output_dir = None
+        self.chapters = []
+        self.verses = 0
+        self.words = 0
+        self._page = None
+        # Depth of the current element, and within the current word
+        self._depth = 0
+        self._word_depth = 0
+
+    @staticmethod
+    def page_name(index: int) -> str:
+        """Name the page of the chapter at some index in the manuscript."""
+        return f"chapter-{index + 1:03d}.html"
+
+    @staticmethod
+    def chapter_title(label: Optional[str]) -> str:
+        """Title a chapter after its label."""
+        return f"Chapter {label}" if label is not None else "Untitled chapter"
+
+    @staticmethod
+    def document(title: str, body: str, stylesheet: str) -> str:
+        """Wrap the body of a page into an HTML document."""
+        return (
+            f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{html.escape(title)}</title>\n"
+            f'<link rel="stylesheet" href="{stylesheet}">\n</head>\n<body>\n{body}</body>\n</html>\n'
+        )
+
+    @staticmethod
+    def clean(text: Optional[str]) -> str:
+        """Escape the text of an element, without the indentation of the TEI file."""
+        return html.escape("".join(text.split())) if text else ""
+
+    @classmethod
+    def render_inline(cls, elem: ElementTree.Element) -> str:
+        """Render the content of a <w>: its text, reconstructed parts, blank spaces and additions."""
+        parts = [cls.clean(elem.text)]
+        for child in elem:
+            if child.tag == "g":
+                reconstructed = cls.render_inline(child)
+                if reconstructed:
+                    parts.append(f'<span class="reconstructed">{reconstructed}</span>')
+            elif child.tag == "blank":
+                span = int(child.get("span", 1))
+                parts.append(
+                    f'<span class="blank" title="Blank space of {span} characters">'
+                    + "&#160;" * span + "</span>"
+                )
+            elif child.tag in ("stich", "stych"):
+                parts.append('<span class="stich"></span>')
+            elif child.tag == "strike":
+                parts.append(f"<s>{cls.render_inline(child)}</s>")
+            else:
+                parts.append(f'<span class="{child.tag}">{cls.render_inline(child)}</span>')
+            parts.append(cls.clean(child.tail))
+        return "".join(parts)
+
+    @staticmethod
+    def render_line(elem: ElementTree.Element) -> str:
+        """Render a line break as its number, with its folio and column as title."""
+        location = ", ".join(f"{key} {elem.get(key)}" for key in ("folio", "col") if elem.get(key))
+        return (
+            f'<span class="line" title="{html.escape(location)}">'
+            f'{html.escape(elem.get("n", ""))}</span>'
+        )
+
+    @staticmethod
+    def render_margin(elem: ElementTree.Element) -> str:
+        """Render the opening of a margin, described by its type and line."""
+        description = elem.get("type", "margin").replace("_", " ").capitalize()
+        if elem.get("line"):
+            description += f", line {elem.get('line')}"
+        return f'<aside class="margin" title="{html.escape(description)}">'
+
+    def open_page(self, label: Optional[str]) -> None:
+        """Write the page being buffered, if any, and start buffering the page of a new chapter."""
+        self.close_page(last=False)
+        self.chapters.append({"label": label, "page": self.page_name(len(self.chapters)), "verses": 0})
+        self._page = [f"<h2>{html.escape(self.chapter_title(label))}</h2>\n"]
+
+    def close_page(self, last: bool) -> None:
+        """Write the page being buffered, if any, with links to the index and the chapters around it."""
+        if self._page is None:
+            return
+        index = len(self.chapters) - 1
+        links = ['<a href="index.html">Index</a>']
+        if index > 0:
+            links.append(f'<a href="{self.page_name(index - 1)}">Previous chapter</a>')
+        if not last:
+            links.append(f'<a href="{self.page_name(index + 1)}">Next chapter</a>')
+        chapter = self.chapters[-1]
+        body = (
+            f"<nav>{''.join(links)}</nav>\n<h1>{html.escape(self.name)}</h1>\n"
+            f'<main lang="he" dir="rtl">\n{"".join(self._page)}</main>\n'
+        )
+        title = f"{self.name} – {self.chapter_title(chapter['label'])}"
+        self.save_page(chapter["page"], self.document(title, body, f"../{self.STYLESHEET_NAME}"))
+        self._page = None
+
+    def save_page(self, name: str, document: str) -> None:
+        """Write a page into the folder of the manuscript."""
+        with open(self.output_dir / name, "w", encoding="utf-8") as f:
+            f.write(document)
+
+    def write(self, text: str) -> None:
+        """Add some HTML to the page being buffered, starting an untitled one if needed."""
+        if self._page is None:
+            self.open_page(None)
+        self._page.append(text)
+
+    def render(self, output_dir: str) -> dict:
+        """Render the TEI file into a folder named after the manuscript, within the output folder.
+
+        Args:
+            output_dir (str): The path to the generated HTML files.
+
+        Returns:
+            dict: The manuscript, its name, its number of verses and words, and the label, page
+                and number of verses of each of its chapters.
+        """
+        self.open(output_dir)
+        return self.render_pages()
+
+    def open(self, output_dir: str) -> None:
+        """Create the folder of the pages of the manuscript, within the output folder."""
+        self.output_dir = Path(output_dir) / self.manuscript
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def render_pages(self) -> dict:
+        """Render the pages of the TEI file, saving each of them once complete.
+
+        Returns:
+            dict: The manuscript, its name, its number of verses and words, and the label, page
+                and number of verses of each of its chapters.
+        """
+        for event, elem in ElementTree.iterparse(self.file_path, events=("start", "end")):
+            if event == "start":
+                self.start(elem)
+                continue
+            self.end(elem)
+            if self._depth == 2:
+                # The children of the manuscript have been rendered
+                elem.clear()
+        return self.finish()
+
+    def start(self, elem: ElementTree.Element) -> None:
+        """Render the opening of a TEI element, in document order."""
+        self._depth += 1
+        if self._word_depth or elem.tag == "w":
+            # The content of the words is rendered along with them
+            self._word_depth += 1
+        elif elem.tag == "ms":
+            self.name = elem.get("name", self.manuscript)
+        elif elem.tag == "div" and elem.get("type") == "chap":
+            self.open_page(elem.get("n"))
+        elif elem.tag == "div" and elem.get("type") == "verse":
+            self.verses += 1
+            self.write(
+                f'<section class="verse" id="verse-{self.verses}">'
+                f'<h3 dir="ltr">Verse {html.escape(elem.get("n", ""))}</h3>\n'
+            )
+            self.chapters[-1]["verses"] += 1
+        elif elem.tag == "line":
+            self.write(self.render_line(elem))
+        elif elem.tag in ("stich", "stych"):
+            self.write('<span class="stich"></span>')
+        elif elem.tag == "margin":
+            self.write(self.render_margin(elem))
+
+    def end(self, elem: ElementTree.Element) -> None:
+        """Render the closing of a TEI element, in document order: a word is rendered as a whole."""
+        self._depth -= 1
+        if self._word_depth:
+            self._word_depth -= 1
+            if not self._word_depth:
+                self.words += 1
+                self.write(f'<span class="w">{self.render_inline(elem)}</span>\n')
+        elif elem.tag == "div" and elem.get("type") == "verse":
+            self.write("</section>\n")
+        elif elem.tag == "margin":
+            self.write("</aside>\n")
+
+    def finish(self) -> dict:
+        """Write the last page and the index page of the manuscript, once all of it is rendered.
+
+        Returns:
+            dict: The manuscript, its name, its number of verses and words, and the label, page
+                and number of verses of each of its chapters.
+        """
+        self.close_page(last=True)
+        self.render_index()
+        return {
+            "manuscript": self.manuscript,
+            "name": self.name,
+            "verses": self.verses,
+            "words": self.words,
+            "chapters": self.chapters,
+        }
+
+    def render_index(self) -> None:
+        """Write the index page of the manuscript, listing its chapters."""
+        items = "".join(
+            f'<li><a href="{chapter["page"]}">{html.escape(self.chapter_title(chapter["label"]))}</a>'
+            f' ({chapter["verses"]} verses)</li>\n'
+            for chapter in self.chapters
+        )
+        body = (
+            f'<nav><a href="../index.html">All manuscripts</a></nav>\n'
+            f"<h1>{html.escape(self.name)}</h1>\n<ul>\n{items}</ul>\n"
+        )
+        self.save_page("index.html", self.document(self.name, body, f"../{self.STYLESHEET_NAME}"))
+
+    @classmethod
+    def site_index(cls, manuscripts: list[dict]) -> str:
+        """Render the index page listing the rendered manuscripts, as returned by render."""
+        items = "".join(
+            f'<li><a href="{manuscript["manuscript"]}/index.html">'
+            f'{html.escape(manuscript["name"])}</a> '
+            f'({len(manuscript["chapters"])} chapters, {manuscript["verses"]} verses)</li>\n'
+            for manuscript in sorted(manuscripts, key=lambda manuscript: manuscript["manuscript"])
+        )
+        body = f"<h1>Ben Sira manuscripts</h1>\n<ul>\n{items}</ul>\n"
+        return cls.document("Ben Sira manuscripts", body, cls.STYLESHEET_NAME)
+
+    @classmethod
+    def render_site_index(cls, manuscripts: list[dict], output_dir: str) -> None:
+        """Write the index page listing the rendered manuscripts, and the stylesheet of the pages.
+
+        Args:
+            manuscripts (list[dict]): The manuscripts, as returned by render.
+            output_dir (str): The path to the generated HTML files.
+        """
+        output_dir = Path(output_dir)
+        with open(output_dir / "index.html", "w", encoding="utf-8") as f:
+            f.write(cls.site_index(manuscripts))
+        with open(output_dir / cls.STYLESHEET_NAME, "w", encoding="utf-8") as f:
+            f.write(STYLESHEET)
@@ -0,0 +1,140 @@
+"""Per-stage instrumentation of the transformer, to find out where the time goes.
+"""
+import cProfile
+import inspect
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator
+from tei_transformer import TEITransformer
+
+
+class Profiler:
+    """Count the calls and time spent in each stage of the transformation of a file.
+
+    The stages are timed by wrapping the methods of a single transformer instance, so that
+    transformers which are not profiled run exactly the same code as before. The time of a stage
+    excludes the time of the stages it calls, e.g. the tokenization of the text of an element is
+    not counted in clean_text.
+    """
+
+    # The methods timed for each stage
+    STAGES = {
+        "parse": ["parse"],
+        "tokenize": ["tokenize"],
+        "clean_text": ["clean_text"],
+        "clean_tail": ["clean_tail"],
+        "add_XML_child": ["add_XML_child"],
+        "serialize": ["serialize", "write_clean_manuscript", "_flush", "_serialize_children"],
+        "sinks": ["export"],
+    }
+
+    def __init__(self, stats_file: str = None) -> None:
+        """Prepare the profiling of a transformation.
+
+        Args:
+            stats_file (str): The path to a pstats file to dump a cProfile profile of the
+                transformation to, if any.
+        """
+        self.stats_file = stats_file
+        self.stages = {stage: {"calls": 0, "seconds": 0.0} for stage in self.STAGES}
+        self.seconds = 0.0
+        self.allocated_blocks = 0
+        self.words = 0
+        self._transformer = None
+        # The time spent in the stages called by each stage being timed
+        self._nested = []
+
+    def attach(self, transformer: TEITransformer) -> TEITransformer:
+        """Time the stages of a transformer, and return it."""
+        for stage, methods in self.STAGES.items():
+            for name in methods:
+                setattr(transformer, name, self._timed(stage, getattr(transformer, name)))
+        self._transformer = transformer
+        return transformer
+
+    def _timed(self, stage: str, method: Callable) -> Callable:
+        """Wrap a method to add its calls and time to a stage, the time of generators being spent
+        while they are iterated over."""
+        counters = self.stages[stage]
+        nested = self._nested
+
+        def step(function: Callable, *args, **kwargs):
+            nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                counters["seconds"] += elapsed - nested.pop()
+                if nested:
+                    nested[-1] += elapsed
+
+        if inspect.isgeneratorfunction(method):
+            @wraps(method)
+            def timed_generator(*args, **kwargs) -> Iterator:
+                counters["calls"] += 1
+                generator = method(*args, **kwargs)
+                while True:
+                    try:
+                        item = step(next, generator)
+                    except StopIteration:
+                        return
+                    yield item
+            return timed_generator
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            counters["calls"] += 1
+            return step(method, *args, **kwargs)
+        return timed
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        """Measure the total time and the memory blocks allocated by the transformation run within,
+        profiling it with cProfile when a stats file is set."""
+        profile = cProfile.Profile() if self.stats_file else None
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(self.stats_file)
+            self.seconds += time.perf_counter() - start
+            self.allocated_blocks += sys.getallocatedblocks() - blocks
+            if self._transformer is not None:
+                self.words = self._transformer.word_count
+
+    def report(self) -> dict:
+        """Report the total time, the number of raw elements cleaned up, of words emitted and of
+        memory blocks still allocated at the end of the transformation, and the calls and time of
+        each stage. The time outside of the stages (I/O, and parsing in streaming mode) is reported
+        as the "other" stage."""
+        stages = {stage: dict(counters) for stage, counters in self.stages.items()}
+        staged = sum(counters["seconds"] for counters in self.stages.values())
+        stages["other"] = {"calls": 0, "seconds": max(self.seconds - staged, 0.0)}
+        return {
+            "seconds": self.seconds,
+            "raw_elements": self.stages["clean_text"]["calls"],
+            "words": self.words,
+            "allocated_blocks": self.allocated_blocks,
+            "stages": stages,
+        }
+
+    @staticmethod
+    def merge(reports: list[dict]) -> dict:
+        """Add up reports, such as the ones of the segments of a file or of all the files."""
+        merged = {"seconds": 0.0, "raw_elements": 0, "words": 0, "allocated_blocks": 0, "stages": {}}
+        for report in reports:
+            for key in ["seconds", "raw_elements", "words", "allocated_blocks"]:
+                merged[key] += report[key]
+            for stage, counters in report["stages"].items():
+                total = merged["stages"].setdefault(stage, {"calls": 0, "seconds": 0.0})
+                total["calls"] += counters["calls"]
+                total["seconds"] += counters["seconds"]
+        return merged
@@ -0,0 +1,90 @@
+"""Preservation statistics of the TEI files: how much of their text is reconstructed, lost in
+lacunae or uncertain, per manuscript, chapter, verse or folio.
+"""
+import csv
+import json
+from itertools import groupby
+from typing import TextIO
+from tei_transformer.corpus import Corpus
+
+
+# The fields grouping the words at each level
+LEVELS = {
+    "manuscript": ["manuscript"],
+    "chapter": ["manuscript", "chapter"],
+    "verse": ["manuscript", "chapter", "verse"],
+    "folio": ["manuscript", "folio"],
+}
+# The columns of the corpus added up over the words of each group
+TOTALS = {
+    "reconstructed_words": "reconstructed",
+    "letters": "letters",
+    "reconstructed_letters": "reconstructed_letters",
+    "uncertain_letters": "uncertain_letters",
+    "lacuna_span": "blank_spans",
+}
+# The shares computed from the totals, as a numerator and a denominator
+RATIOS = {
+    "reconstructed_word_share": ("reconstructed_words", "words"),
+    "reconstructed_letter_share": ("reconstructed_letters", "letters"),
+    "uncertain_letter_density": ("uncertain_letters", "letters"),
+}
+
+
+def preservation_statistics(corpus: Corpus, level: str) -> list[dict]:
+    """Add up the preservation of the words of a corpus per group of words.
+
+    The words being stored in the order of the manuscripts, each group mostly spans a few runs of
+    consecutive words: the columns are added up over the slice of each run at once, rather than
+    word by word.
+
+    Args:
+        corpus (Corpus): The corpus to describe.
+        level (str): The grouping of the words: manuscript, chapter, verse or folio.
+
+    Returns:
+        list[dict]: For each group, in the order of the corpus, its labels, its number of words
+            and of reconstructed words, of letters, of reconstructed and uncertain letters, the
+            span of its lacunae and the shares of reconstructed words and letters and of uncertain
+            letters.
+    """
+    fields = LEVELS[level]
+    columns = {total: getattr(corpus, column) for total, column in TOTALS.items()}
+    groups = {}
+    start = 0
+    for ids, run in groupby(zip(*(getattr(corpus, Corpus.FIELDS[field][0]) for field in fields))):
+        stop = start + len(list(run))
+        totals = groups.setdefault(ids, dict.fromkeys(["words", *TOTALS], 0))
+        totals["words"] += stop - start
+        for total, column in columns.items():
+            totals[total] += sum(column[start:stop])
+        start = stop
+    statistics = []
+    for ids, totals in groups.items():
+        row = {
+            field: getattr(corpus, Corpus.FIELDS[field][1]).strings[label_id]
+            for field, label_id in zip(fields, ids)
+        }
+        row.update(totals)
+        for ratio, (numerator, denominator) in RATIOS.items():
+            row[ratio] = totals[numerator] / totals[denominator] if totals[denominator] else 0.0
+        statistics.append(row)
+    return statistics
+
+
+def write_csv(statistics: list[dict], f: TextIO) -> None:
+    """Write statistics as CSV, one row per group."""
+    if not statistics:
+        return
+    writer = csv.DictWriter(f, fieldnames=list(statistics[0]))
+    writer.writeheader()
+    writer.writerows(statistics)
+
+
+def write_json(statistics: list[dict], f: TextIO) -> None:
+    """Write statistics as a JSON list, one object per group."""
+    json.dump(statistics, f, ensure_ascii=False, indent=2)
+    f.write("\n")
+
+
+REPORT_FORMATS = {"csv": write_csv, "json": write_json}
@@ -0,0 +1,443 @@
+"""Local HTTP service over the TEI files: manuscript listings, verse lookups, synopses and the HTML
+pages of the manuscripts, served from a cache of rendered responses.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from tei_transformer.corpus import Corpus
+from tei_transformer.html_renderer import STYLESHEET, HTMLRenderer
+from tei_transformer.synopsis import Synopsis
+
+
+class Response(NamedTuple):
+    """A response to a request, ready to be sent."""
+
+    status: int
+    content_type: str
+    body: bytes
+    headers: tuple = ()
+
+
+STATUSES = {
+    200: "OK",
+    301: "Moved Permanently",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+# The largest request head accepted, in bytes
+MAX_HEAD_SIZE = 1 << 16
+
+
+def json_response(data, status: int = 200) -> Response:
+    """Encode some data as a JSON response."""
+    return Response(
+        status, "application/json; charset=utf-8", json.dumps(data, ensure_ascii=False).encode("utf-8")
+    )
+
+
+def error_response(status: int, message: str) -> Response:
+    """Describe an error as a JSON response."""
+    return json_response({"error": message}, status)
+
+
+class ResponseCache:
+    """Bounded cache of rendered responses, evicting the least recently used ones first.
+
+    Each response is stored along with the signature of the TEI files it was rendered from, i.e.
+    their modification time and size, and is only served while the signature is unchanged. The
+    cache can be used from several threads.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """Create an empty cache.
+
+        Args:
+            max_entries (int): The number of responses kept at most.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, signature: tuple) -> Optional[Response]:
+        """Return the response cached under a key, if rendered from files of the same signature."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, signature: tuple, response: Response) -> None:
+        """Cache a response, evicting the least recently used ones beyond the maximum."""
+        with self.lock:
+            self.entries[key] = (signature, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class PageRenderer(HTMLRenderer):
+    """Render the pages of a TEI file in memory, rather than into a folder."""
+
+    def __init__(self, file_path: str) -> None:
+        super().__init__(file_path)
+        self.pages = {}
+
+    def save_page(self, name: str, document: str) -> None:
+        """Keep a page, encoded, instead of writing it."""
+        self.pages[name] = document.encode("utf-8")
+
+
+class CorpusServer:
+    """Serve the TEI files of a folder over HTTP, as JSON and HTML:
+
+    - /manuscripts: the manuscripts, their name and number of verses;
+    - /manuscripts/<manuscript>: the chapters of a manuscript, and their page;
+    - /manuscripts/<manuscript>/chapters/<chapter>: the verses of a chapter, with their words;
+    - /verses/<chapter>/<verse>: the verse in each manuscript, with its XML fragment;
+    - /synopsis/<start>[/<stop>]: the parallel readings of a range of verses, such as 3:14;
+    - /html/: the HTML pages of the manuscripts, as rendered by tei-to-html.
+
+    The manuscripts to look into can be given as ?manuscripts=ms_a,ms_b. The responses are served
+    from a cache, and only rendered again once the TEI files they come from change: the verse
+    index, the corpus snapshot and the HTML pages of a manuscript are never rebuilt otherwise. The
+    TEI files are stated at most once per poll interval. All the requests are handled on a single
+    event loop, the responses which are not cached being rendered on a thread of their own so that
+    the other clients are still served meanwhile.
+    """
+
+    def __init__(
+        self, tei_dir: str, index_path: str = None, cache_size: int = 1024, poll_interval: float = 1.0
+    ) -> None:
+        """Open the indexes of a folder of TEI files.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            index_path (str): The path to the verse index, stored within the TEI folder by default.
+            cache_size (int): The number of responses cached at most.
+            poll_interval (float): The time the TEI files are considered unchanged for, once stated,
+                in seconds.
+        """
+        self.tei_dir = Path(tei_dir)
+        self.synopsis = Synopsis(tei_dir, index_path)
+        self.index = self.synopsis.index
+        self.cache = ResponseCache(cache_size)
+        self.poll_interval = poll_interval
+        self._corpus = None
+        # The signature, summary (as returned by HTMLRenderer.render) of each rendered manuscript
+        self._summaries = {}
+        # The modification time and size of each TEI file, and when they were stated
+        self._files = None
+        self._folder_signature = None
+        self._stated_at = 0.0
+        # The renders run one at a time, the indexes and renderers not being shared between threads
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+
+    def close(self) -> None:
+        """Wait for the render thread, and close the connection to the verse index."""
+        self.executor.shutdown()
+        self.synopsis.close()
+
+    def __enter__(self) -> "CorpusServer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def files(self) -> dict:
+        """The modification time and size of each TEI file, by manuscript, stated again once the
+        poll interval is over."""
+        now = time.monotonic()
+        if self._files is None or now - self._stated_at >= self.poll_interval:
+            files = Corpus.stat_files(self.tei_dir)
+            self._folder_signature = tuple((manuscript, *stat) for manuscript, stat in files.items())
+            self._files = files
+            self._stated_at = now
+        return self._files
+
+    def file_signature(self, manuscript: str) -> Optional[tuple]:
+        """The modification time and size of the TEI file of a manuscript, None if the folder has
+        no such file: the names holding a path, such as ../ms_a, are never looked up."""
+        if "/" in manuscript or "\\" in manuscript or manuscript in ("", ".", ".."):
+            return None
+        stat = self.files().get(manuscript)
+        return tuple(stat) if stat is not None else None
+
+    def folder_signature(self) -> tuple:
+        """The modification time and size of all the TEI files."""
+        self.files()
+        return self._folder_signature
+
+    def corpus(self) -> Corpus:
+        """The corpus, opened again from its snapshot once the TEI files change."""
+        if self._corpus is None or self._corpus.files != self.files():
+            self._corpus = Corpus.open(self.tei_dir)
+        return self._corpus
+
+    def respond(self, target: str) -> Response:
+        """Respond to a GET request, from the cache if the files it depends on are unchanged.
+
+        Args:
+            target (str): The path and query of the request, such as "/verses/3/14".
+        """
+        response, render = self.prepare(target)
+        return response if render is None else render()
+
+    async def respond_async(self, target: str) -> Response:
+        """Respond to a GET request as respond does, rendering the response on the render thread
+        unless it is cached, so that the event loop is not blocked meanwhile."""
+        response, render = self.prepare(target)
+        if render is None:
+            return response
+        return await asyncio.get_running_loop().run_in_executor(self.executor, render)
+
+    def prepare(self, target: str) -> Tuple[Optional[Response], Optional[Callable[[], Response]]]:
+        """Find the response to a GET request if it needs no rendering, i.e. it is cached or an
+        error, or else a function rendering and caching it.
+
+        Args:
+            target (str): The path and query of the request, such as "/verses/3/14".
+        """
+        url = urlsplit(target)
+        path = url.path.strip("/")
+        parts = [unquote(part) for part in path.split("/")] if path else []
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path.endswith("/") and parts:
+            parts.append("")
+        try:
+            route = self.route(parts, query)
+        except ValueError as error:
+            return error_response(400, str(error)), None
+        if route is None:
+            return error_response(404, f"Nothing at {url.path}"), None
+        signature, render = route
+        if signature is None:
+            return error_response(404, f"Nothing at {url.path}"), None
+        key = f"{url.path}?{url.query}"
+        response = self.cache.get(key, signature)
+        if response is not None:
+            return response, None
+
+        def render_and_cache() -> Response:
+            try:
+                response = render()
+            except ValueError as error:
+                return error_response(400, str(error))
+            self.cache.put(key, signature, response)
+            return response
+
+        return None, render_and_cache
+
+    def route(self, parts: list[str], query: dict) -> Optional[Tuple[Optional[tuple], Callable]]:
+        """Find the renderer of a request path, along with the signature of the files it depends on.
+
+        Returns:
+            tuple: The signature, None if the manuscript requested does not exist, and a function
+                rendering the response. None if nothing matches the path.
+        """
+        manuscripts = query["manuscripts"].split(",") if query.get("manuscripts") else None
+        if parts in ([], ["manuscripts"]):
+            return self.folder_signature(), self.render_manuscripts
+        if parts[0] == "manuscripts" and len(parts) == 2:
+            manuscript = parts[1]
+            return self.file_signature(manuscript), lambda: json_response(self.summary(manuscript))
+        if parts[0] == "manuscripts" and len(parts) == 4 and parts[2] == "chapters":
+            manuscript, chapter = parts[1], parts[3]
+            return self.file_signature(manuscript), lambda: self.render_chapter(manuscript, chapter)
+        if parts[0] == "verses" and len(parts) == 3:
+            chapter, verse = parts[1:]
+            return self.folder_signature(), lambda: json_response(
+                self.index.lookup(chapter, verse, manuscripts)
+            )
+        if parts[0] == "synopsis" and len(parts) in (2, 3):
+            start, stop = parts[1], parts[2] if len(parts) == 3 else None
+            return self.folder_signature(), lambda: json_response(
+                self.synopsis.parallel(start, stop, manuscripts)
+            )
+        if parts[0] == "html":
+            return self.route_html(parts[1:])
+        return None
+
+    def route_html(self, parts: list[str]) -> Optional[Tuple[Optional[tuple], Callable]]:
+        """Find the renderer of an HTML page, laid out as written by tei-to-html."""
+        if parts in ([], [""], ["index.html"]):
+            return self.folder_signature(), lambda: Response(
+                200, "text/html; charset=utf-8", self.site_index().encode("utf-8")
+            )
+        if parts == [HTMLRenderer.STYLESHEET_NAME]:
+            return (), lambda: Response(200, "text/css; charset=utf-8", STYLESHEET.encode("utf-8"))
+        manuscript = parts[0]
+        if len(parts) == 1:
+            # The pages link to each other relatively to the folder of the manuscript
+            return self.file_signature(manuscript), lambda: Response(
+                301, "text/plain", b"", (("Location", f"/html/{manuscript}/"),)
+            )
+        if len(parts) == 2:
+            page = parts[1] or "index.html"
+            return self.file_signature(manuscript), lambda: self.render_page(manuscript, page)
+        return None
+
+    def render_manuscripts(self) -> Response:
+        """List the manuscripts, with their name and number of verses."""
+        self.index.refresh()
+        return json_response([
+            {"manuscript": manuscript, "name": name, "verses": verses}
+            for manuscript, name, verses in self.index.connection.execute(
+                "SELECT manuscript, name, COUNT(*) FROM verses GROUP BY manuscript ORDER BY manuscript"
+            )
+        ])
+
+    def render_chapter(self, manuscript: str, chapter: str) -> Response:
+        """List the verses of a chapter of a manuscript, with their text and words."""
+        corpus = self.corpus()
+        verses = [
+            {
+                "verse": verse.label,
+                "text": verse.text,
+                "words": [
+                    {
+                        "form": word.form,
+                        "reconstructed": word.reconstructed,
+                        "folio": word.folio,
+                        "col": word.col,
+                        "line": word.line,
+                        "margin": word.margin,
+                    }
+                    for word in verse
+                ],
+            }
+            for verse in corpus.verses()
+            if verse.manuscript == manuscript and verse.chapter == chapter
+        ]
+        if not verses:
+            return error_response(404, f"No chapter {chapter} in {manuscript}")
+        return json_response({"manuscript": manuscript, "chapter": chapter, "verses": verses})
+
+    def render_html(self, manuscript: str) -> dict:
+        """Render all the pages of a manuscript at once, in a single pass over its TEI file, and
+        cache each of them.
+
+        Returns:
+            dict: The summary of the manuscript, as returned by HTMLRenderer.render.
+        """
+        signature = self.file_signature(manuscript)
+        renderer = PageRenderer(self.tei_dir / f"{manuscript}.xml")
+        summary = renderer.render_pages()
+        for page, document in renderer.pages.items():
+            response = Response(200, "text/html; charset=utf-8", document)
+            self.cache.put(f"/html/{manuscript}/{page}?", signature, response)
+        self._summaries[manuscript] = (signature, summary)
+        return summary
+
+    def summary(self, manuscript: str) -> dict:
+        """The summary of a manuscript, rendering its pages if it changed since they were."""
+        signature, summary = self._summaries.get(manuscript, (None, None))
+        if signature is None or signature != self.file_signature(manuscript):
+            summary = self.render_html(manuscript)
+        return summary
+
+    def render_page(self, manuscript: str, page: str) -> Response:
+        """Render an HTML page of a manuscript, along with all the other ones unless they are
+        cached already, such as when the page is requested under another path."""
+        key = f"/html/{manuscript}/{page}?"
+        response = self.cache.get(key, self.file_signature(manuscript))
+        if response is None:
+            self.render_html(manuscript)
+            response = self.cache.get(key, self.file_signature(manuscript))
+        return response or error_response(404, f"No page {page} in {manuscript}")
+
+    def site_index(self) -> str:
+        """Render the index page listing the manuscripts."""
+        return HTMLRenderer.site_index(
+            [self.summary(manuscript) for manuscript in self.files()]
+        )
+
+    def warm(self) -> None:
+        """Render the HTML pages of all the manuscripts ahead of the requests."""
+        for manuscript in self.files():
+            self.summary(manuscript)
+
+    @staticmethod
+    def encode_response(response: Response, keep_alive: bool, head_only: bool = False) -> bytes:
+        """Encode a response as HTTP/1.1."""
+        lines = [
+            f"HTTP/1.1 {response.status} {STATUSES[response.status]}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in response.headers)
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return head if head_only else head + response.body
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of a connection, as long as the client keeps it alive."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(" ")
+                    body_size = int(headers.get("content-length", 0))
+                except ValueError:
+                    writer.write(self.encode_response(error_response(400, "Malformed request"), False))
+                    await writer.drain()
+                    return
+                if body_size:
+                    await reader.readexactly(body_size)
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (
+                    version == "HTTP/1.1" and connection != "close"
+                )
+                if method in ("GET", "HEAD"):
+                    try:
+                        response = await self.respond_async(target)
+                    except Exception as error:
+                        response = error_response(500, repr(error))
+                else:
+                    response = error_response(405, f"Method {method} not allowed")
+                writer.write(self.encode_response(response, keep_alive, head_only=method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractServer:
+        """Start listening for connections."""
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEAD_SIZE)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """Serve the TEI files until cancelled."""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,204 @@
+"""Writers fed with the clean elements of a manuscript while the transformer walks them, so that a
+single clean-up of a raw file exports it in several formats at once (see TEITransformer.export).
+"""
+import csv
+import io
+import json
+import os
+from contextlib import ExitStack
+from pathlib import Path
+from typing import BinaryIO, TextIO, Union
+from xml.etree import ElementTree
+from tei_transformer.html_renderer import HTMLRenderer
+from tei_transformer.tei_transformer import open_atomic
+from tei_transformer.word_index import WordLocator
+
+
+class Sink:
+    """Base class of the sinks: each of them is notified of the opening and the closing of each clean
+    element, in document order, then closed once the whole manuscript has been walked."""
+
+    def start(self, elem: ElementTree.Element) -> None:
+        """Take into account the opening of a clean element."""
+
+    def end(self, elem: ElementTree.Element) -> None:
+        """Take into account the closing of a clean element, along with all of its content."""
+
+    def close(self) -> None:
+        """Complete the output, once the whole manuscript has been walked."""
+
+
+class TEISink(Sink):
+    """Write the clean manuscript as XML into a binary file, as TEITransformer.dump does."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.root = None
+
+    def start(self, elem: ElementTree.Element) -> None:
+        if self.root is None:
+            self.root = elem
+
+    def close(self) -> None:
+        ElementTree.ElementTree(self.root).write(self.f, encoding="utf-8")
+
+
+class HTMLSink(Sink):
+    """Render the pages of the manuscript, as HTMLRenderer.render does from its TEI file."""
+
+    def __init__(self, file_path: str, output_dir: str) -> None:
+        """Prepare the rendering of the manuscript.
+
+        Args:
+            file_path (str): The path to the TEI file of the manuscript, which names its pages.
+            output_dir (str): The path to the generated HTML files.
+        """
+        self.renderer = HTMLRenderer(file_path)
+        self.renderer.open(output_dir)
+        # The renderer is fed directly, there is nothing else to do on each element
+        self.start = self.renderer.start
+        self.end = self.renderer.end
+        # The summary of the rendering, for the index page listing the manuscripts
+        self.manuscript = None
+
+    def close(self) -> None:
+        self.manuscript = self.renderer.finish()
+
+
+def word_form(elem: ElementTree.Element) -> str:
+    """The text of a <w>, without the indentation of the TEI file."""
+    return "".join("".join(elem.itertext()).split())
+
+
+class WordsSink(Sink):
+    """Write the words of the manuscript as JSON Lines: one object per <w>, with its number within
+    the manuscript, its form, whether it is reconstructed, the span of its blank spaces and its
+    location (see WordLocator)."""
+
+    def __init__(self, f: TextIO, manuscript: str) -> None:
+        self.f = f
+        self.manuscript = manuscript
+        self.locator = WordLocator()
+        self.start = self.locator.start
+        # json.dumps would create an encoder for each word, given non-default options
+        self.encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    def end(self, elem: ElementTree.Element) -> None:
+        location = self.locator.end(elem)
+        if location is None:
+            return
+        blank_span = 0
+        if len(elem):
+            blank_span = sum(int(blank.get("span", 1)) for blank in elem.iter("blank"))
+        word = {
+            "manuscript": self.manuscript,
+            "word": self.locator.word,
+            "form": word_form(elem),
+            "reconstructed": elem.get("reconstructed") == "1",
+            "blank_span": blank_span,
+        }
+        word.update(location)
+        self.f.write(self.encode(word) + "\n")
+
+
+class VersesSink(Sink):
+    """Write the verses of the manuscript as CSV: one row per verse holding some words, with its
+    chapter, label and position, the location of its first word, its number of words and its text."""
+
+    FIELDS = ["manuscript", "chapter", "verse", "position", "folio", "col", "line", "words", "text"]
+
+    def __init__(self, f: TextIO, manuscript: str, header: bool = True) -> None:
+        """Prepare the table of the verses of a manuscript.
+
+        Args:
+            f (TextIO): The file to write the table to, opened with newline="".
+            manuscript (str): The name of the manuscript.
+            header (bool): Whether to write the names of the columns first.
+        """
+        self.writer = csv.writer(f)
+        if header:
+            self.writer.writerow(self.FIELDS)
+        self.manuscript = manuscript
+        self.locator = WordLocator()
+        self.start = self.locator.start
+        self.verse = None
+
+    def end(self, elem: ElementTree.Element) -> None:
+        location = self.locator.end(elem)
+        if location is not None:
+            if location["position"] is None:
+                return
+            if self.verse is None:
+                self.verse = {field: location.get(field) for field in self.FIELDS}
+                self.verse.update(manuscript=self.manuscript, words=0, text=[])
+            self.verse["words"] += 1
+            form = word_form(elem)
+            if form:
+                self.verse["text"].append(form)
+        elif elem.tag == "div" and elem.get("type") == "verse" and self.verse is not None:
+            self.verse["text"] = " ".join(self.verse["text"])
+            self.writer.writerow([self.verse[field] for field in self.FIELDS])
+            self.verse = None
+
+
+# The sinks which can be selected, and the file each of them writes within the output folder
+SINKS = {
+    "tei": "{manuscript}.xml",
+    "html": None,
+    "words": "{manuscript}.words.jsonl",
+    "verses": "{manuscript}.verses.csv",
+}
+
+
+def open_sink(
+    name: str, output: Union[str, os.PathLike, BinaryIO], manuscript: str, stack: ExitStack
+) -> Sink:
+    """Create a sink writing a manuscript in UTF-8, other than the html one.
+
+    Args:
+        name (str): The name of the sink: tei, words or verses.
+        output (str | BinaryIO): The path to the file to write, replaced only once the stack is
+            closed without error (see open_atomic), or a writable binary file object, such as
+            sys.stdout.buffer, which is left open.
+        manuscript (str): The name of the manuscript.
+        stack (ExitStack): The stack the file is opened within.
+
+    Returns:
+        Sink: The sink.
+    """
+    if isinstance(output, (str, os.PathLike)):
+        output = stack.enter_context(open_atomic(output))
+    if name == "tei":
+        return TEISink(output)
+    f = io.TextIOWrapper(output, encoding="utf-8", newline="")
+    # Flush the text layer once done, without closing the binary file below it
+    stack.callback(f.detach)
+    if name == "words":
+        return WordsSink(f, manuscript)
+    return VersesSink(f, manuscript)
+
+
+def open_sinks(
+    names: list, file_name: str, output_dir: str, html_dir: str, stack: ExitStack
+) -> list[Sink]:
+    """Create some sinks for a manuscript, opening their files within the output folder.
+
+    Args:
+        names (list): The names of the sinks, among the keys of SINKS.
+        file_name (str): The name of the raw file of the manuscript, and of its TEI file.
+        output_dir (str): The path to the generated output files.
+        html_dir (str): The path to the generated HTML files, for the html sink.
+        stack (ExitStack): The stack the files are opened within.
+
+    Returns:
+        list[Sink]: The sinks, in the order of their names.
+    """
+    manuscript = Path(file_name).stem
+    sinks = []
+    for name in names:
+        if name == "html":
+            sinks.append(HTMLSink(Path(output_dir) / file_name, html_dir))
+        else:
+            path = Path(output_dir) / SINKS[name].format(manuscript=manuscript)
+            sinks.append(open_sink(name, path, manuscript, stack))
+    return sinks
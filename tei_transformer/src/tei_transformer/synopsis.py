@@ -0,0 +1,204 @@
+"""Synopsis of the manuscripts: align their verses on the Ben Sira chapter and verse numbering.
+"""
+import re
+from itertools import groupby
+from typing import Optional, Tuple
+from xml.etree import ElementTree
+from tei_transformer import TEITransformer
+from tei_transformer.verse_index import VerseIndex
+
+
+# A verse number with its letter suffix, possibly followed by the end of a range
+VERSE_PATTERN = re.compile(r"(\d+)([a-z]*)(?:\s*[–-]\s*(\d+)([a-z]*))?")
+# A chapter number, not followed by a letter which would make it a siglum, like "2Q18"
+CHAPTER_PATTERN = re.compile(r"\s*(\d+)(?![\dA-Z])")
+REFERENCE_PATTERN = re.compile(r"\s*(\d+)\s*:\s*(\d+)([a-z]*)\s*$")
+# Ranges longer than this are most likely typos, only their bounds are kept
+MAX_RANGE = 50
+
+
+def chapter_number(chapter_label: str) -> Optional[int]:
+    """Extract the chapter number from a chapter label, None if it has none (fragments, columns)."""
+    match = CHAPTER_PATTERN.match(chapter_label or "")
+    return int(match.group(1)) if match else None
+
+
+def verse_keys(chapter_label: str, verse_label: str) -> list[Tuple[int, int, str]]:
+    """Normalize the labels of a verse into the canonical keys (chapter, verse, letters) it attests.
+
+    Ranges ("20l–28") attest every verse they span, alternative and parallel numberings ("12/13",
+    "14bc // 20") attest all the verses they mention, and combined labels ("3:14") carry their
+    own chapter. Labels without any verse number ("*", "a-b") attest nothing.
+    """
+    if ":" in verse_label:
+        chapter_label, verse_label = TEITransformer.chap_verse_normalizer(verse_label)[:2]
+    chapter = chapter_number(chapter_label)
+    if chapter is None:
+        return []
+    keys = []
+    for start, start_letters, stop, stop_letters in VERSE_PATTERN.findall(verse_label):
+        keys.append((chapter, int(start), start_letters))
+        if stop and 0 < int(stop) - int(start) <= MAX_RANGE:
+            keys.extend((chapter, verse, "") for verse in range(int(start) + 1, int(stop)))
+        if stop and int(stop) != int(start):
+            keys.append((chapter, int(stop), stop_letters))
+    return list(dict.fromkeys(keys))
+
+
+def parse_reference(reference: str) -> Tuple[int, int]:
+    """Parse a reference such as "3:14" (or "3:14a") into its chapter and verse numbers."""
+    match = REFERENCE_PATTERN.match(reference)
+    if not match:
+        raise ValueError(f"Invalid reference {reference!r}, expected chapter:verse.")
+    return int(match.group(1)), int(match.group(2))
+
+
+class Synopsis:
+    """Align the verses of all the manuscripts on canonical (chapter, verse) keys.
+
+    The alignment table, which lists the keys attested by each verse, is stored along with the
+    verse index, and only recomputed for the manuscripts whose TEI file changed.
+    """
+
+    def __init__(self, tei_dir: str, index_path: str = None) -> None:
+        """Open the verse index of a folder of TEI files, and bring the alignment table up to date.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            index_path (str): The path to the index, stored within the TEI folder by default.
+        """
+        self.index = VerseIndex(tei_dir, index_path)
+        self.connection = self.index.connection
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS aligned_files (
+                manuscript TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS alignments (
+                chapter_number INTEGER NOT NULL,
+                verse_number INTEGER NOT NULL,
+                letters TEXT NOT NULL,
+                manuscript TEXT NOT NULL,
+                position INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS alignments_by_key
+                ON alignments (chapter_number, verse_number, manuscript, position);
+            CREATE INDEX IF NOT EXISTS alignments_by_manuscript ON alignments (manuscript);
+            """
+        )
+        self.align()
+
+    def close(self) -> None:
+        """Close the connection to the index."""
+        self.index.close()
+
+    def __enter__(self) -> "Synopsis":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def align(self) -> list[str]:
+        """Recompute the alignment of the manuscripts indexed since they were last aligned.
+
+        Returns:
+            list[str]: The manuscripts (re)aligned.
+        """
+        return self.index.update_derived("aligned_files", ["alignments"], self.align_manuscript)
+
+    def align_manuscript(self, manuscript: str) -> None:
+        """Insert the canonical keys attested by each verse of a manuscript into the alignments."""
+        rows = [
+            (*key, manuscript, position)
+            for position, chapter, verse in self.connection.execute(
+                "SELECT position, chapter, verse FROM verses WHERE manuscript = ?", (manuscript,)
+            )
+            for key in verse_keys(chapter, verse)
+        ]
+        self.connection.executemany("INSERT INTO alignments VALUES (?, ?, ?, ?, ?)", rows)
+
+    def refresh(self) -> None:
+        """Bring the verse index and the alignment table up to date with the TEI files."""
+        self.index.refresh()
+        self.align()
+
+    def attestations(self, reference: str) -> list[str]:
+        """List the manuscripts attesting a verse, such as "3:14"."""
+        return [
+            manuscript
+            for (manuscript,) in self.connection.execute(
+                "SELECT DISTINCT manuscript FROM alignments "
+                "WHERE chapter_number = ? AND verse_number = ? ORDER BY manuscript",
+                parse_reference(reference),
+            )
+        ]
+
+    @staticmethod
+    def reading(fragment: str) -> list[str]:
+        """Extract the words of a verse from its XML fragment."""
+        return [
+            "".join(word.itertext()).strip()
+            for word in ElementTree.fromstring(fragment).iter("w")
+        ]
+
+    def parallel(self, start: str, stop: str = None, manuscripts: list[str] = None) -> list[dict]:
+        """Return the aligned parallel readings of a range of verses, in a single call.
+
+        Args:
+            start (str): The first verse of the range, such as "3:14".
+            stop (str): The last verse of the range, the first one by default.
+            manuscripts (list[str]): The manuscripts to compare, all of them by default.
+
+        Returns:
+            list[dict]: For each verse of the range attested by at least one manuscript, in
+                canonical order, its reference and the readings of each manuscript attesting it:
+                their chapter and verse labels, words and XML fragment.
+        """
+        self.refresh()
+        first = parse_reference(start)
+        last = parse_reference(stop or start)
+        query = (
+            "SELECT alignments.chapter_number, alignments.verse_number, verses.* "
+            "FROM alignments JOIN verses USING (manuscript, position) "
+            "WHERE (alignments.chapter_number, alignments.verse_number) >= (?, ?) "
+            "AND (alignments.chapter_number, alignments.verse_number) <= (?, ?)"
+        )
+        parameters = [*first, *last]
+        if manuscripts is not None:
+            query += f" AND manuscript IN ({', '.join('?' * len(manuscripts))})"
+            parameters.extend(manuscripts)
+        query += " ORDER BY alignments.chapter_number, alignments.verse_number, manuscript, position"
+        cursor = self.connection.execute(query, parameters)
+        columns = [description[0] for description in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor]
+
+        # Read each fragment once, opening each TEI file once
+        fragments = {}
+        for manuscript, locations in groupby(
+            sorted(rows, key=lambda row: (row["manuscript"], row["start"])),
+            key=lambda row: row["manuscript"],
+        ):
+            with open(self.index.tei_dir / f"{manuscript}.xml", "rb") as f:
+                for location in locations:
+                    f.seek(location["start"])
+                    fragments[manuscript, location["position"]] = f.read(
+                        location["stop"] - location["start"]
+                    ).decode("utf-8")
+
+        synopsis = []
+        for (chapter, verse), aligned in groupby(
+            rows, key=lambda row: (row["chapter_number"], row["verse_number"])
+        ):
+            readings = {}
+            for row in aligned:
+                fragment = fragments[row["manuscript"], row["position"]]
+                readings.setdefault(row["manuscript"], []).append({
+                    "chapter": row["chapter"],
+                    "verse": row["verse"],
+                    "words": self.reading(fragment),
+                    "fragment": fragment,
+                })
+            synopsis.append({"reference": f"{chapter}:{verse}", "readings": readings})
+        return synopsis
@@ -1,22 +1,137 @@
 """Class to normalize TEI files from raw Adobe InDesign files.
 """
 from xml.etree import ElementTree
+from xml.parsers import expat
+import io
+import os
 import re
-from typing import Tuple
-from xml.sax.saxutils import unescape
+from contextlib import contextmanager
+from functools import cached_property
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Union
+
+
+@contextmanager
+def open_atomic(path: Union[str, os.PathLike]) -> Iterator[BinaryIO]:
+    """Open a file to write in binary under a temporary name, which replaces the file at once when
+    written, so that a failure never leaves a truncated file behind, nor loses its previous version.
+    """
+    temporary_path = f"{os.fspath(path)}.tmp"
+    try:
+        with open(temporary_path, "wb") as f:
+            yield f
+    except BaseException:
+        try:
+            os.unlink(temporary_path)
+        except OSError:
+            pass
+        raise
+    os.replace(temporary_path, path)
+
+
+class Diagnostic(NamedTuple):
+    """An issue found in a raw file while cleaning it up, at the position of the raw element
+    involved when known: errors drop some content, warnings point at content left out or fixed."""
+
+    severity: str
+    code: str
+    message: str
+    line: Optional[int] = None
+    column: Optional[int] = None
+
+    def __str__(self) -> str:
+        location = f"line {self.line}, column {self.column}: " if self.line is not None else ""
+        return f"{location}{self.severity}: {self.message} [{self.code}]"
 
 
 class TEITransformer:
     """Base class to clean-up XML files to make them more compliant with TEI formatting rules."""
 
-    def __init__(self, file_path: str) -> None:
-        """Create a NormalizeTEI object object.
+    # Depth of the raw elements cleaned up as a whole in streaming mode: <Root><Article><text>
+    STREAMING_CHUNK_DEPTH = 2
+    # The raw elements whose text is kept as margin words
+    MARGIN_TAGS = ("margin", "margin_car", "margin_reconstructed", "margin_supralinear", "margin_infralinear")
+    # The raw elements whose text is kept as attributes, or only tracked as the current position
+    POSITION_TAGS = ("ms", "chap", "verse_nb", "line", "folio", "col")
+    # The raw elements holding editorial notes, such as the parallel texts, dropped on purpose
+    NOTE_TAGS = ("parallel", "vacat_car")
+
+    def __init__(self, source: Union[str, os.PathLike, bytes, BinaryIO], strict: bool = True) -> None:
+        """Create a NormalizeTEI object object. The source is only read once cleaned up.
 
         Args:
-            file_path (str): The path to the TEI file to load.
+            source (str | bytes | BinaryIO): The path to the raw file to load, its content, or a
+                readable file object over it, such as sys.stdin.buffer. A file object can only be
+                read once.
+            strict (bool): Whether to fail on the first structural error, such as a verse before
+                any chapter, rather than to drop the content involved and go on.
         """
-        self.parsed_manuscript = ElementTree.parse(file_path).getroot()
+        self.source = source
+        self.strict = strict
+        # The issues found while cleaning up, and the position of each raw element once parsed
+        self.diagnostics = []
+        self.positions = {}
         self.clean_manuscript = ElementTree.Element("root")
+        # Traversal state, shared by the in-memory and the streaming modes
+        self.current_folio = None
+        self.current_col = None
+        self.current_line = None
+        self.ms_child = None
+        self.chapter_child = None
+        self.verse_child = None
+        self.line_child = None
+        # Brackets of the current verse left open so far, and the raw element which opened the first
+        self.open_brackets = 0
+        self.bracket_opener = None
+        # Number of <w> elements emitted so far
+        self.word_count = 0
+        # Clean elements whose start tag has already been written, in streaming mode
+        self._opened = []
+
+    @cached_property
+    def parsed_manuscript(self) -> ElementTree.Element:
+        """The raw manuscript, parsed on first access."""
+        return self.parse()
+
+    def parse(self) -> ElementTree.Element:
+        """Parse the raw manuscript, recording the position of each of its elements.
+
+        The tree is built by expat directly, as ElementTree's parser does not give the positions.
+        """
+        source = self.open_source()
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                return self._parse_file(f)
+        return self._parse_file(source)
+
+    def _parse_file(self, f: BinaryIO) -> ElementTree.Element:
+        """Build the tree of a raw file with expat, recording the line and column of each element."""
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        builder = ElementTree.TreeBuilder()
+        positions = self.positions
+        start = builder.start
+
+        def start_element(tag: str, attrib: dict) -> None:
+            positions[start(tag, attrib)] = (parser.CurrentLineNumber, parser.CurrentColumnNumber + 1)
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = builder.end
+        parser.CharacterDataHandler = builder.data
+        try:
+            parser.ParseFile(f)
+        except expat.ExpatError as error:
+            parse_error = ElementTree.ParseError(str(error))
+            parse_error.code = error.code
+            parse_error.position = (error.lineno, error.offset)
+            raise parse_error from None
+        return builder.close()
+
+    def open_source(self) -> Union[str, os.PathLike, BinaryIO]:
+        """Return what to parse the raw manuscript from: its path or file object, or a file object
+        over its content."""
+        if isinstance(self.source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(self.source)
+        return self.source
 
     def create_header(self):
         """Create the header for the clean manuscript."""
@@ -78,199 +193,639 @@ class TEITransformer:
 
         return balanced and len(s) == 0
 
-    def reconstruct_word(self, word: str) -> str:
-        """Given a partially available word displayed within brackets, wrap it around g
-        reconstructed tags.
+    def reconstruct_word(self, word: str) -> ElementTree.Element:
+        """Given a partially available word displayed within brackets, create a w element where
+        the reconstructed letters are wrapped within g reconstructed elements.
         """
-        bracket_word = word
-        nbr_closed_brackets = bracket_word.count("]")
-        nbr_opened_brackets = bracket_word.count("[")
+        return self._reconstructed_word(word, word.count("["), word.count("]"))
 
-        if not "[" in word and not "]" in word:
+    @classmethod
+    def _reconstructed_word(
+        cls, word: str, nbr_opened_brackets: int, nbr_closed_brackets: int
+    ) -> ElementTree.Element:
+        """Create the w element of a reconstructed word, given its number of brackets."""
+        if not nbr_opened_brackets and not nbr_closed_brackets:
             bracket_word = f"[{word}]"  # add brackets if they are missing
         elif nbr_closed_brackets < nbr_opened_brackets:  # if there is a missing closing
-            bracket_word = f"{bracket_word}]"
+            bracket_word = f"{word}]"
         elif nbr_closed_brackets > nbr_opened_brackets:
-            bracket_word = f"[{bracket_word}"
-        elif not self.check_matched_bracket(word):
+            bracket_word = f"[{word}"
+        elif nbr_opened_brackets == 1:
+            # Avoid walking through the word in the most frequent case
+            bracket_word = word if word.index("[") < word.index("]") else f"[{word}]"
+        elif not cls.check_matched_bracket(word):
             bracket_word = f"[{word}]"  # add brackets if they are missing
+        else:
+            bracket_word = word
         # If empty brackets, add a space between them
         if bracket_word == "[]":
             bracket_word = "[ ]"
-        return bracket_word.replace("[", "<g type='reconstructed'>").replace(
-            "]", "</g>"
-        )
+        word_child = ElementTree.Element("w", {"reconstructed": "1"})
+        # Open elements, the text of the last one and the tail of the last closed one go on
+        opened = [word_child]
+        last = None
+        for piece in cls.BRACKET_PATTERN.split(bracket_word):
+            if piece == "[":
+                last = None
+                opened.append(ElementTree.SubElement(opened[-1], "g", {"type": "reconstructed"}))
+            elif piece == "]":
+                if len(opened) > 1:
+                    last = opened.pop()
+            elif piece:
+                if last is None:
+                    opened[-1].text = piece
+                else:
+                    last.tail = piece
+        return word_child
 
     @staticmethod
-    def replace_spaces(match):
-        """Given a match of regexp match, replace the match with its character length. 
+    def create_blank_space(span: int) -> ElementTree.Element:
+        """Create a w element holding a blank element, for the given number of blank spaces."""
+        word_child = ElementTree.Element("w", {"reconstructed": "0"})
+        ElementTree.SubElement(word_child, "blank", {"orient": "horizontal", "span": str(span)})
+        return word_child
+
+    # Anything but words separated by single spaces: brackets and other spacing
+    SPECIAL_PATTERN = re.compile(r"[\[\]]|[^\S ]|\s{2}")
+    # Runs of blank spaces, separators other than single spaces, and words
+    TOKEN_PATTERN = re.compile(r"\s{2,}|[^\S ]|\S+")
+    SEPARATOR_PATTERN = re.compile(r"[^\S ]|\S+")
+    BRACKET_PATTERN = re.compile(r"([\[\]])")
+
+    def track_brackets(self, txt: str, elem: ElementTree.Element) -> None:
+        """Update the balance of the brackets of the current verse with those of a tail.
+
+        A reconstruction may span several tails, so brackets are only balanced at the verse level:
+        a closing bracket with no opening one before it in the verse is reported right away.
         """
-        return f"<blank orient='horizontal' span='{len(match.group())}'/>"
+        for bracket in self.BRACKET_PATTERN.findall(txt):
+            if bracket == "[":
+                if not self.open_brackets:
+                    self.bracket_opener = elem
+                self.open_brackets += 1
+            elif self.open_brackets:
+                self.open_brackets -= 1
+            else:
+                self.report("warning", "unbalanced-brackets", f"Unopened bracket in {txt}", elem)
+
+    def close_brackets(self) -> None:
+        """Report the brackets left open at the end of the current verse, at the position of the
+        element which opened them, and start the next verse balanced."""
+        if self.open_brackets:
+            opener = self.bracket_opener
+            self.report("warning", "unbalanced-brackets", f"Unclosed bracket in {opener.tail.strip()}", opener)
+        self.open_brackets = 0
+        self.bracket_opener = None
 
-    def extract_blank_space(self, text):
-        """Extract blank spaces of missing words from the manuscript."""
-        pattern = r'\s{2,}'
-        extracted_blank_space = re.sub(pattern, self.replace_spaces, text)
-        return extracted_blank_space
+    def tokenize(self, text: str, extract_blanks: bool = True) -> list[ElementTree.Element]:
+        """Split a text into w elements in a single scan, tracking their reconstruction status.
 
-    def compute_reconstructed_words(self, text: str) -> Tuple[list, list]:
-        """Place the words contained within txt into <w> tags, and their reconstruction status
-        within type attribute."""
+        Reconstructed letters are wrapped within g reconstructed elements. When extract_blanks is
+        set (for tails), stychs (tabs) become stych elements and runs of several blank spaces
+        become blank elements.
+        """
+        words = []
+        if not self.SPECIAL_PATTERN.search(text):
+            # Plain words, by far the most frequent case
+            for word in text.split():
+                word_child = ElementTree.Element("w", {"reconstructed": "0"})
+                word_child.text = word
+                words.append(word_child)
+            return words
+        pattern = self.TOKEN_PATTERN if extract_blanks else self.SEPARATOR_PATTERN
         reconstructed = 0
-        word_content_list = []
-        reconstructed_list = []
-        for subtext in re.split(r"(<blank.*?/>)", text):
-            if subtext.startswith("<blank"):
-                word_content_list.append(subtext)
-                reconstructed_list.append(0)
+        for token in pattern.findall(text):
+            if len(token) > 1 and token[0].isspace():
+                words.append(self.create_blank_space(len(token)))
+                continue
+            if token == "[" or token == "]":
+                continue
+            nbr_opened_brackets = token.count("[")
+            if nbr_opened_brackets:
+                # Enter reconstruction mode
+                reconstructed = 1
+            if reconstructed:
+                nbr_closed_brackets = token.count("]")
+                words.append(self._reconstructed_word(token, nbr_opened_brackets, nbr_closed_brackets))
+                # Leave reconstruction mode
+                if nbr_closed_brackets:
+                    reconstructed = 0
+            elif token == "\t" and extract_blanks:
+                words.append(ElementTree.Element("stych"))
             else:
-                for word in re.split(r"(\t|\s)", subtext):
-                    if word and word not in [" ", "[", "]"]:
-                        if "[" in word:
-                            # Enter reconstruction mode
-                            reconstructed = 1
-                        # Add word to list
-                        if reconstructed:
-                            word_content_list.append(self.reconstruct_word(word))
-                        else:
-                            word_content_list.append(word)
-                        reconstructed_list.append(reconstructed)
-                        # Leave reconstruction mode
-                        if "]" in word:
-                            reconstructed = 0
-
-        return word_content_list, reconstructed_list
+                word_child = ElementTree.Element("w", {"reconstructed": "0"})
+                word_child.text = token.strip()
+                words.append(word_child)
+        return words
+
+    def report(self, severity: str, code: str, message: str, elem: ElementTree.Element) -> None:
+        """Record a diagnostic about a raw element, at its position in the raw file if known."""
+        line, column = self.positions.get(elem, (None, None))
+        self.diagnostics.append(Diagnostic(severity, code, message, line, column))
+
+    def _require(
+        self, parent: Optional[ElementTree.Element], elem: ElementTree.Element, code: str, message: str
+    ) -> Optional[ElementTree.Element]:
+        """Return the parent element of some content of a raw element, or report that the raw file
+        has not defined it yet: in strict mode, fail, otherwise return None for the content to be
+        dropped."""
+        if parent is None:
+            self.report("error", code, message, elem)
+            if self.strict:
+                raise ValueError(str(self.diagnostics[-1]))
+        return parent
+
+    def update_position(self, tag: str, txt: str) -> None:
+        """Keep track of the current folio, column and line, given the stripped text of a raw
+        element."""
+        if tag == "folio":
+            self.current_folio = txt
+        elif tag == "col":
+            self.current_col = txt
+        elif tag == "chap":
+            #TODO: put this in cleaner function
+            if "col." in txt.lower():
+                self.current_col = txt.lower().split("col.")[1].strip()
+        elif tag == "line":
+            self.current_line = txt
+
+    def clean_text(self, elem: ElementTree.Element) -> None:
+        """Clean up the text of a raw element, according to its tag.
+
+        The text of the tags which are not handled is dropped, and reported as such unless it is an
+        editorial note.
+        """
+        if not elem.text:
+            return
+        txt = elem.text.strip()
+        if not txt:
+            return
+        self.update_position(elem.tag, txt)
+        if elem.tag == "ms":
+            self.ms_child = self.add_XML_child(
+                parent=self.clean_manuscript, tag=elem.tag, attrib={"name": txt}
+            )
+        elif elem.tag == "chap":
+            self.close_brackets()
+            parent = self._require(
+                self.ms_child, elem, "orphan-chapter", f"Chapter {txt} appears before any manuscript."
+            )
+            if parent is None:
+                return
+            self.chapter_child = self.add_XML_child(
+                parent=parent,
+                tag="div",
+                attrib={
+                    "type": elem.tag,
+                    "n": self.chap_normalizer(txt),
+                },
+            )
+        elif elem.tag == "verse_nb":
+            self.close_brackets()
+            normalized_verse = self.chap_verse_normalizer(txt.strip())
+            if not normalized_verse[-1][:1].isdigit():
+                self.report(
+                    "warning", "non-numeric-verse", f"Verse label {txt} does not start with a number.", elem
+                )
+            # If chapter and verses are specified within the same XML tag
+            if len(normalized_verse) > 1:
+                parent = self._require(
+                    self.ms_child, elem, "orphan-verse", f"Verse {txt} appears before any manuscript."
+                )
+                if parent is None:
+                    return
+                self.chapter_child = self.add_XML_child(
+                    parent=parent,
+                    tag="div",
+                    attrib={"type": "chap", "n": normalized_verse[0]},
+                )
+                self.verse_child = self.add_XML_child(
+                    parent=self.chapter_child,
+                    tag="div",
+                    attrib={"type": "verse", "n": normalized_verse[1]},
+                )
+            else:
+                parent = self._require(
+                    self.chapter_child, elem, "orphan-verse", f"Verse {txt} appears before any chapter."
+                )
+                if parent is None:
+                    return
+                self.verse_child = self.add_XML_child(
+                    parent=parent,
+                    tag="div",
+                    attrib={"type": "verse", "n": normalized_verse[0]},
+                )
+        elif elem.tag == "line":
+            line_attrib = {"n": txt.strip()}
+            if self.current_folio:
+                line_attrib["folio"] = self.current_folio
+            if self.current_col:
+                line_attrib["col"] = self.current_col
+            if self.verse_child is not None:
+                self.add_XML_child(
+                    parent=self.verse_child,
+                    tag="line",
+                    attrib=line_attrib,
+                )
+            else:
+                parent = self._require(
+                    self.chapter_child, elem, "orphan-line", f"Line {txt} appears before any chapter."
+                )
+                if parent is None:
+                    return
+                self.line_child = self.add_XML_child(
+                    parent=parent,
+                    tag="line",
+                    attrib=line_attrib,
+                )
+        elif elem.tag in self.MARGIN_TAGS:
+            margin_attrib = {"type": elem.tag}
+            if self.current_folio:
+                margin_attrib["folio"] = self.current_folio
+            if self.current_line:
+                margin_attrib["line"] = self.current_line
+            parent = self._require(
+                self.chapter_child, elem, "orphan-margin", f"Margin {txt} appears before any chapter."
+            )
+            if parent is None:
+                return
+            margin_child = self.add_XML_child(
+                parent=parent,
+                tag="margin",
+                attrib=margin_attrib,
+            )
+            words = self.tokenize(txt, extract_blanks=False)
+            margin_child.extend(words)
+            self.word_count += len(words)
+        elif elem.tag not in self.POSITION_TAGS and elem.tag not in self.NOTE_TAGS:
+            self.report("warning", "dropped-text", f"The text of <{elem.tag}> is dropped: {txt}", elem)
+
+    def clean_tail(self, elem: ElementTree.Element) -> None:
+        """Split the tail of a raw element into words and add them to the current verse.
+
+        The brackets of the tail are completed by the tokenization, and counted towards the balance
+        of the current verse.
+        """
+        if not elem.tail:
+            return
+        txt = elem.tail.strip()
+        if not txt:
+            return
+        if "[" in txt or "]" in txt:
+            self.track_brackets(txt, elem)
+        for word in self.tokenize(txt):
+            if word.tag == "stych":
+                parent = self._require(self.verse_child, elem, "orphan-stych", "Stych appears before any verse.")
+                if parent is not None:
+                    parent.append(word)
+            else:
+                parent = self.verse_child
+                if parent is None:
+                    parent = self._require(
+                        self.line_child, elem, "orphan-word", f"Word {txt} appears before any verse."
+                    )
+                    if parent is None:
+                        # Report the tail once, not each of its words
+                        return
+                parent.append(word)
+                self.word_count += 1
+
+    def clean_element(self, elem: ElementTree.Element) -> None:
+        """Clean up both the text and the tail of a raw element."""
+        self.clean_text(elem)
+        self.clean_tail(elem)
 
     def create_body(self):
         """Traverse the manuscript and clean it up."""
-        current_folio = None
-        current_col = None
-        current_line = None
         for elem in self.parsed_manuscript.iter():
-            if elem.text:
-                txt = elem.text.strip()
-                if txt:
-                    if elem.tag == "ms":
-                        ms_child = self.add_XML_child(
-                            parent=self.clean_manuscript, tag=elem.tag, attrib={"name": txt}
-                        )
-
-                    elif elem.tag == "folio":
-                        current_folio = txt.strip()
-                    elif elem.tag == "col":
-                        current_col = txt.strip()
-                    elif elem.tag == "chap":
-                        #TODO: put this in cleaner function
-                        if "col." in txt.lower():
-                            current_col = txt.lower().split("col.")[1].strip()
-                        chapter_child = self.add_XML_child(
-                            parent=ms_child,
-                            tag="div",
-                            attrib={
-                                "type": elem.tag,
-                                "n": self.chap_normalizer(txt),
-                            },
-                        )
-                    elif elem.tag == "verse_nb":
-                        normalized_verse = self.chap_verse_normalizer(txt.strip())
-                        # If chapter and verses are specified within the same XML tag
-                        if len(normalized_verse) > 1:
-                            chapter_child = self.add_XML_child(
-                                parent=ms_child,
-                                tag="div",
-                                attrib={"type": "chap", "n": normalized_verse[0]},
-                            )
-                            verse_child = self.add_XML_child(
-                                parent=chapter_child,
-                                tag="div",
-                                attrib={"type": "verse", "n": normalized_verse[1]},
-                            )
-                        else:
-                            verse_child = self.add_XML_child(
-                                parent=chapter_child,
-                                tag="div",
-                                attrib={"type": "verse", "n": normalized_verse[0]},
-                            )
-                    elif elem.tag == "line":
-                        current_line = txt.strip()
-                        line_attrib = {"n": txt.strip()}
-                        if current_folio:
-                            line_attrib["folio"] = current_folio
-                        if current_col:
-                            line_attrib["col"] = current_col
-                        try:     
-                            self.add_XML_child(
-                                parent=verse_child,
-                                tag="line",
-                                attrib=line_attrib,
-                            )
-                        except UnboundLocalError:
-                            line_child = self.add_XML_child(
-                                parent=chapter_child,
-                                tag="line",
-                                attrib=line_attrib,
-                            )
-                    elif elem.tag in ["margin",
-                                      "margin_car",
-                                      "margin_reconstructed",
-                                      "margin_supralinear",
-                                      "margin_infralinear"]:
-                        margin_attrib = {"type": elem.tag}
-                        if current_folio:
-                            margin_attrib["folio"] = current_folio
-                        if current_line:
-                            margin_attrib["line"] = current_line
-                        margin_child = self.add_XML_child(
-                            parent=chapter_child,
-                            tag="margin",
-                            attrib=margin_attrib,
-                        )
-                        (
-                        word_content_list,
-                        reconstructed_list,
-                        ) = self.compute_reconstructed_words(txt)
-                        for word, reconstruct in zip(word_content_list, reconstructed_list):
-                            self.add_XML_child(
-                                parent=margin_child,
-                                tag="w",
-                                attrib={"reconstructed": str(reconstruct)},
-                                text=word,
-                            )
-                    
-            if elem.tail:
-                txt = elem.tail.strip()
-
-                if txt:
-                    txt = self.extract_blank_space(txt)
-                    (
-                        word_content_list,
-                        reconstructed_list,
-                    ) = self.compute_reconstructed_words(txt)
-                    for word, reconstruct in zip(word_content_list, reconstructed_list):
-                        if word == "\t":
-                            self.add_XML_child(parent=verse_child, tag="stych")
-                        else:
-                            try:
-                                self.add_XML_child(
-                                    parent=verse_child,
-                                    tag="w",
-                                    attrib={"reconstructed": str(reconstruct)},
-                                    text=word,
-                                )
-                            except UnboundLocalError:
-                                self.add_XML_child(
-                                    parent=line_child,
-                                    tag="w",
-                                    attrib={"reconstructed": str(reconstruct)},
-                                    text=word,
-                                )
-        return unescape(
-            ElementTree.tostring(
-                self.clean_manuscript, encoding="unicode", method="xml"
+            self.clean_element(elem)
+        return self.serialize()
+
+    def check(self) -> list[Diagnostic]:
+        """Traverse the manuscript and clean it up without serializing it, to validate the raw file.
+
+        The transformer should be created with strict set to False, for all the errors to be
+        collected rather than the first one raised.
+
+        Returns:
+            list[Diagnostic]: The issues found, in document order.
+        """
+        for elem in self.parsed_manuscript.iter():
+            self.clean_element(elem)
+        self.close_brackets()
+        return self.diagnostics
+
+    def serialize(self) -> str:
+        """Serialize the clean manuscript."""
+        return ElementTree.tostring(self.clean_manuscript, encoding="unicode", method="xml")
+
+    def write_clean_manuscript(self, f: BinaryIO) -> None:
+        """Serialize the clean manuscript right into a binary file, piece by piece, in UTF-8."""
+        ElementTree.ElementTree(self.clean_manuscript).write(f, encoding="utf-8")
+
+    def iter_body(self) -> Iterator[str]:
+        """Traverse the manuscript in streaming mode and yield the clean XML piece by piece.
+
+        The raw file is read with iterparse. Each element directly below <Article> (mostly
+        <text>) is cleaned up once it is closed and its tail is known, then dropped, and the
+        clean elements that can no longer receive children are written out and dropped as well,
+        so memory stays flat whatever the size of the input. The joined output is identical to
+        the one of create_body.
+        """
+        containers = []
+        depth = 0
+        pending_text = pending_tail = pending_chunk = None
+        for event, elem in ElementTree.iterparse(self.open_source(), events=("start", "end")):
+            # The text (or tail) of an element is only complete once the next event is seen
+            if pending_text is not None:
+                self.clean_text(pending_text)
+                pending_text = None
+            if pending_tail is not None:
+                self.clean_tail(pending_tail)
+                pending_tail = None
+            if pending_chunk is not None:
+                for raw_elem in pending_chunk.iter():
+                    self.clean_element(raw_elem)
+                containers[-1].remove(pending_chunk)
+                pending_chunk = None
+                yield from self._flush()
+
+            if event == "start":
+                if depth < self.STREAMING_CHUNK_DEPTH:
+                    containers.append(elem)
+                    pending_text = elem
+                depth += 1
+            else:
+                depth -= 1
+                if depth < self.STREAMING_CHUNK_DEPTH:
+                    containers.pop()
+                    pending_tail = elem
+                    if containers:
+                        containers[-1].remove(elem)
+                elif depth == self.STREAMING_CHUNK_DEPTH:
+                    pending_chunk = elem
+
+        if pending_tail is not None:
+            self.clean_tail(pending_tail)
+        yield from self._flush(final=True)
+
+    def _flush(self, final: bool = False) -> Iterator[str]:
+        """Serialize the clean elements that can no longer receive children, then drop them.
+
+        Elements still referenced by the traversal state, and their ancestors, are kept: only their
+        start tag is written, once they have some content.
+        """
+        if final:
+            live = ()
+        else:
+            live = tuple(
+                element for element in (self.ms_child, self.chapter_child, self.verse_child, self.line_child)
+                if element is not None
             )
+        root = self.clean_manuscript
+        chunks = []
+        if not self._opened:
+            if final:
+                chunks.append(ElementTree.tostring(root, encoding="unicode", method="xml"))
+                root.clear()
+                yield "".join(chunks)
+                return
+            if not len(root):
+                return
+            chunks.append(self._start_tag(root))
+            self._opened.append(root)
+        self._drain(root, live, chunks)
+        if final:
+            chunks.append(f"</{root.tag}>")
+            self._opened.pop()
+        if chunks:
+            yield "".join(chunks)
+
+    def _drain(self, element: ElementTree.Element, live: tuple, chunks: list) -> None:
+        """Serialize into chunks the children of an opened element, in order, up to the first one
+        which may still receive children."""
+        depth = self._opened.index(element)
+        finished = 0
+        while finished < len(element):
+            child = element[finished]
+            pinned = self._pinned(child, live)
+            if not pinned and not (len(self._opened) > depth + 1 and self._opened[depth + 1] is child):
+                finished += 1
+                continue
+            # Serialize the finished siblings all at once, it is much cheaper than one by one
+            self._serialize_children(element, finished, chunks)
+            finished = 0
+            if len(self._opened) > depth + 1:
+                self._drain(child, live, chunks)
+                if pinned:
+                    return
+                chunks.append(f"</{child.tag}>")
+                self._opened.pop()
+                del element[0]
+            else:
+                if len(child) or child.text:
+                    chunks.append(self._start_tag(child))
+                    self._opened.append(child)
+                    self._drain(child, live, chunks)
+                return
+        self._serialize_children(element, finished, chunks)
+
+    @staticmethod
+    def _serialize_children(element: ElementTree.Element, count: int, chunks: list) -> None:
+        """Serialize into chunks the first children of an element, then drop them."""
+        if not count:
+            return
+        wrapper = ElementTree.Element(element.tag)
+        wrapper.extend(element[:count])
+        markup = ElementTree.tostring(wrapper, encoding="unicode", method="xml")
+        chunks.append(markup[len(f"<{element.tag}>"): -len(f"</{element.tag}>")])
+        del element[:count]
+
+    @classmethod
+    def _pinned(cls, element: ElementTree.Element, live: tuple) -> bool:
+        """Check whether an element is, or contains, an element still referenced by the traversal."""
+        if any(element is live_element for live_element in live):
+            return True
+        # Live elements are either manuscripts, chapters, or direct children of chapters
+        if element.tag == "ms" or element.get("type") == "chap":
+            return any(cls._pinned(child, live) for child in element)
+        return False
+
+    @staticmethod
+    def _start_tag(element: ElementTree.Element) -> str:
+        """Serialize the start tag of an element, followed by its text."""
+        shallow = ElementTree.Element(element.tag, element.attrib)
+        shallow.text = element.text
+        markup = ElementTree.tostring(
+            shallow, encoding="unicode", method="xml", short_empty_elements=False
         )
+        return markup[: -len(f"</{element.tag}>")]
+
+    def raw_chunks(self) -> list:
+        """List the raw elements below <Article>, which are cleaned up as a whole (mostly <text>)."""
+        return [chunk for container in self.parsed_manuscript for chunk in container]
+
+    @staticmethod
+    def _starts_chapter(chunks: list, index: int) -> bool:
+        """Check whether the chunk at index opens a chapter which does not depend on the previous
+        one, i.e. no line nor word appears before its first verse."""
+        if chunks[index].tag != "chap" or not (chunks[index].text or "").strip():
+            return False
+        for chunk in chunks[index:]:
+            for elem in chunk.iter():
+                if elem is not chunks[index] and elem.tag in ["chap", "verse_nb"] and (elem.text or "").strip():
+                    return True
+                if elem.tag == "line" and (elem.text or "").strip():
+                    return False
+                if (elem.tail or "").strip():
+                    return False
+        return True
+
+    def split_chapters(self, parts: int) -> list[dict]:
+        """Split the manuscript at <chap> boundaries into at most parts segments of similar size,
+        which can be cleaned up independently (by create_segment) then joined (by join_segments).
+
+        Only a manuscript with a single <Article> and a single <ms> is split.
+
+        Args:
+            parts (int): The maximum number of segments.
+
+        Returns:
+            list[dict]: The segments, with the start and stop indexes of their raw chunks and the
+                position (manuscript, folio, column, line) they start at.
+        """
+        chunks = self.raw_chunks()
+        ms_indexes = [index for index, chunk in enumerate(chunks) if chunk.tag == "ms"]
+        if parts < 2 or len(self.parsed_manuscript) != 1 or len(ms_indexes) != 1:
+            return [{"start": 0, "stop": len(chunks), "position": None}]
+        sizes = [
+            sum(len(elem.text or "") + len(elem.tail or "") for elem in chunk.iter())
+            for chunk in chunks
+        ]
+        segment_size = sum(sizes) / parts
+        scanner = TEITransformer(self.source)
+        segments = [{"start": 0, "stop": len(chunks), "position": None}]
+        current_size = 0
+        for index, chunk in enumerate(chunks):
+            if (
+                current_size >= segment_size
+                and len(segments) < parts
+                and index > ms_indexes[0]
+                and self._starts_chapter(chunks, index)
+            ):
+                segments[-1]["stop"] = index
+                segments.append({
+                    "start": index,
+                    "stop": len(chunks),
+                    "position": {
+                        "ms": chunks[ms_indexes[0]].text.strip(),
+                        "folio": scanner.current_folio,
+                        "col": scanner.current_col,
+                        "line": scanner.current_line,
+                    },
+                })
+                current_size = 0
+            current_size += sizes[index]
+            for elem in chunk.iter():
+                if (elem.text or "").strip():
+                    scanner.update_position(elem.tag, elem.text.strip())
+        return segments
+
+    def segment_source(self, segment: dict) -> bytes:
+        """Serialize the raw chunks of a segment, as returned by split_chapters, into a raw file of
+        their own, so that the segment can be cleaned up elsewhere without parsing the whole
+        manuscript again: create_segment(0, None, segment["position"]) on it.
+
+        The first segment also holds the text around the chunks, which is cleaned up with it.
+        """
+        root = self.parsed_manuscript
+        container = root[0]
+        document = ElementTree.Element(root.tag, root.attrib)
+        article = ElementTree.SubElement(document, container.tag, container.attrib)
+        # The chunks are shared with the parsed manuscript, not moved out of it
+        article.extend(self.raw_chunks()[segment["start"]:segment["stop"]])
+        if segment["position"] is None:
+            document.text, article.text, article.tail = root.text, container.text, container.tail
+        return ElementTree.tostring(document, encoding="utf-8", xml_declaration=False)
+
+    def create_segment(self, start: int, stop: Optional[int], position: dict = None) -> str:
+        """Clean up a segment of the manuscript, as returned by split_chapters.
+
+        Args:
+            start (int): The index of the first raw chunk of the segment.
+            stop (int): The index following the last raw chunk of the segment, None for the last
+                raw chunk of the manuscript.
+            position (dict): The position the segment starts at, None for the first segment.
+
+        Returns:
+            str: The clean XML of the chapters of the segment.
+        """
+        chunks = self.raw_chunks()
+        if position is None:
+            for container in [self.parsed_manuscript, *self.parsed_manuscript]:
+                self.clean_element(container)
+        else:
+            self.ms_child = self.add_XML_child(
+                parent=self.clean_manuscript, tag="ms", attrib={"name": position["ms"]}
+            )
+            self.current_folio = position["folio"]
+            self.current_col = position["col"]
+            self.current_line = position["line"]
+        for chunk in chunks[start:stop]:
+            for elem in chunk.iter():
+                self.clean_element(elem)
+        chapters = []
+        self._serialize_children(self.ms_child, len(self.ms_child), chapters)
+        return "".join(chapters)
+
+    @classmethod
+    def join_segments(cls, ms_name: str, segments: list[str]) -> str:
+        """Join the clean segments of a manuscript into the body create_body would have returned."""
+        ms_child = ElementTree.Element("ms", {"name": ms_name})
+        return f"<root>{cls._start_tag(ms_child)}{''.join(segments)}</ms></root>"
+
+    def dump(self, output: Union[str, os.PathLike, BinaryIO], stream: bool = False):
+        """Parse the XML file and dump it to a XML file, encoded in UTF-8.
+
+        Args:
+            output (str | BinaryIO): The path to the XML file to write, replaced only once the file
+                is written (see open_atomic), or a writable binary file object, such as
+                sys.stdout.buffer, which is left open.
+            stream (bool): Whether to write the output while reading the input, with bounded memory.
+        """
+        if isinstance(output, (str, os.PathLike)):
+            with open_atomic(output) as f:
+                self.dump(f, stream=stream)
+            return
+        if stream:
+            for chunk in self.iter_body():
+                output.write(chunk.encode("utf-8"))
+        else:
+            for elem in self.parsed_manuscript.iter():
+                self.clean_element(elem)
+            self.write_clean_manuscript(output)
+
+    def export(self, sinks: list) -> None:
+        """Clean up the manuscript, then feed its clean elements to several sinks in a single walk,
+        so that it is parsed and tokenized once whatever the number of outputs.
+
+        Args:
+            sinks (list): The sinks, notified of the opening (start) and the closing (end) of each
+                clean element in document order, then closed (see tei_transformer.sinks).
+        """
+        for elem in self.parsed_manuscript.iter():
+            self.clean_element(elem)
+        starts = [sink.start for sink in sinks]
+        ends = [sink.end for sink in sinks]
+
+        def walk(elem: ElementTree.Element) -> None:
+            for start in starts:
+                start(elem)
+            for child in elem:
+                walk(child)
+            for end in ends:
+                end(elem)
 
-    def dump(self, filename: str):
-        """Parse the XML file and dump it to a XML file."""
-        with open(filename, "w") as f:
-            f.write(self.create_body())
+        walk(self.clean_manuscript)
+        for sink in sinks:
+            sink.close()
@@ -0,0 +1,242 @@
+"""Persistent index of the verses of the TEI files, to look a verse up without parsing the whole file.
+"""
+import sqlite3
+from pathlib import Path
+from typing import Callable
+from xml.parsers import expat
+
+
+class VerseIndex:
+    """Index the manuscript, chapter, verse, folio, column and line of each verse of the TEI files,
+    along with the byte offsets of its <div> within the file, in a SQLite database."""
+
+    INDEX_NAME = ".verse-index.sqlite"
+
+    def __init__(self, tei_dir: str, index_path: str = None) -> None:
+        """Open the index of a folder of TEI files, and bring it up to date.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            index_path (str): The path to the index, stored within the TEI folder by default.
+        """
+        self.tei_dir = Path(tei_dir)
+        self.index_path = Path(index_path) if index_path else self.tei_dir / self.INDEX_NAME
+        # The connection may be used from another thread than this one, one thread at a time, such
+        # as the render thread of the HTTP service
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                manuscript TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS verses (
+                manuscript TEXT NOT NULL,
+                name TEXT,
+                position INTEGER NOT NULL,
+                chapter TEXT,
+                verse TEXT NOT NULL,
+                folio TEXT,
+                col TEXT,
+                line TEXT,
+                start INTEGER NOT NULL,
+                stop INTEGER NOT NULL,
+                PRIMARY KEY (manuscript, position)
+            );
+            CREATE INDEX IF NOT EXISTS verses_by_reference ON verses (chapter, verse);
+            """
+        )
+        self.refresh()
+
+    def close(self) -> None:
+        """Close the connection to the index."""
+        self.connection.close()
+
+    def __enter__(self) -> "VerseIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def parse_verses(data: bytes) -> list[dict]:
+        """List the verses of a TEI file, with their position in the manuscript and the byte
+        offsets of their <div>.
+
+        The folio, column and line of a verse are the ones of the first line of the verse if it
+        starts with a line, and the ones of the last line before the verse otherwise.
+        """
+        verses = []
+        name = None
+        chapter = None
+        current_line = {}
+        verse = None
+        open_tags = []
+        parser = expat.ParserCreate()
+
+        def start_element(tag: str, attrib: dict) -> None:
+            nonlocal name, chapter, verse
+            start = parser.CurrentByteIndex
+            tag_end = data.index(b">", start) + 1
+            open_tags.append((tag, attrib, start, data[tag_end - 2:tag_end] == b"/>", tag_end))
+            if tag == "ms":
+                name = attrib.get("name")
+            elif tag == "div" and attrib.get("type") == "chap":
+                chapter = attrib.get("n")
+            elif tag == "div" and attrib.get("type") == "verse":
+                verse = {
+                    "name": name,
+                    "position": len(verses),
+                    "chapter": chapter,
+                    "verse": attrib.get("n", ""),
+                    "folio": current_line.get("folio"),
+                    "col": current_line.get("col"),
+                    "line": current_line.get("n"),
+                    "start": start,
+                    "words": 0,
+                }
+            elif tag == "line":
+                current_line.clear()
+                current_line.update(attrib)
+                if verse is not None and not verse["words"]:
+                    verse.update(folio=attrib.get("folio"), col=attrib.get("col"), line=attrib.get("n"))
+            elif tag == "w" and verse is not None:
+                verse["words"] += 1
+
+        def end_element(tag: str) -> None:
+            nonlocal verse
+            _, attrib, _, empty, tag_end = open_tags.pop()
+            if tag == "div" and attrib.get("type") == "verse" and verse is not None:
+                if empty:
+                    verse["stop"] = tag_end
+                else:
+                    verse["stop"] = data.index(b">", parser.CurrentByteIndex) + 1
+                del verse["words"]
+                verses.append(verse)
+                verse = None
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.Parse(data, True)
+        return verses
+
+    def index_file(self, file_path: Path) -> None:
+        """Index the verses of a TEI file, replacing the ones previously indexed."""
+        file_path = Path(file_path)
+        stat = file_path.stat()
+        verses = self.parse_verses(file_path.read_bytes())
+        manuscript = file_path.stem
+        with self.connection:
+            self.connection.execute("DELETE FROM verses WHERE manuscript = ?", (manuscript,))
+            self.connection.executemany(
+                "INSERT INTO verses VALUES "
+                "(:manuscript, :name, :position, :chapter, :verse, :folio, :col, :line, :start, :stop)",
+                [dict(verse, manuscript=manuscript) for verse in verses],
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                (manuscript, stat.st_mtime_ns, stat.st_size),
+            )
+
+    def refresh(self) -> list[str]:
+        """Index the TEI files which changed since they were indexed, and forget the removed ones.
+
+        Returns:
+            list[str]: The manuscripts (re)indexed.
+        """
+        indexed = {
+            manuscript: (mtime_ns, size)
+            for manuscript, mtime_ns, size in self.connection.execute("SELECT * FROM files")
+        }
+        reindexed = []
+        for file_path in sorted(self.tei_dir.glob("*.xml")):
+            stat = file_path.stat()
+            if indexed.pop(file_path.stem, None) != (stat.st_mtime_ns, stat.st_size):
+                self.index_file(file_path)
+                reindexed.append(file_path.stem)
+        with self.connection:
+            for manuscript in indexed:
+                self.connection.execute("DELETE FROM verses WHERE manuscript = ?", (manuscript,))
+                self.connection.execute("DELETE FROM files WHERE manuscript = ?", (manuscript,))
+        return reindexed
+
+    def update_derived(
+        self, files_table: str, tables: list[str], derive: Callable[[str], None]
+    ) -> list[str]:
+        """Bring an index derived from the TEI files up to date with the verse index, deriving it
+        again for the manuscripts indexed since it was derived, and forgetting the removed ones.
+
+        Args:
+            files_table (str): The table recording the files the derived index was derived from,
+                with the same columns as the files table.
+            tables (list[str]): The tables of the derived index, with a manuscript column.
+            derive (Callable[[str], None]): Insert the rows of a manuscript into the derived tables.
+
+        Returns:
+            list[str]: The manuscripts derived again.
+        """
+        stale = [
+            manuscript
+            for (manuscript,) in self.connection.execute(
+                f"SELECT files.manuscript FROM files LEFT JOIN {files_table} USING (manuscript) "
+                f"WHERE {files_table}.mtime_ns IS NOT files.mtime_ns "
+                f"OR {files_table}.size IS NOT files.size"
+            )
+        ]
+        with self.connection:
+            for table in [*tables, files_table]:
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE manuscript NOT IN (SELECT manuscript FROM files)"
+                )
+            for manuscript in stale:
+                for table in tables:
+                    self.connection.execute(f"DELETE FROM {table} WHERE manuscript = ?", (manuscript,))
+                derive(manuscript)
+                self.connection.execute(
+                    f"INSERT OR REPLACE INTO {files_table} "
+                    "SELECT manuscript, mtime_ns, size FROM files WHERE manuscript = ?",
+                    (manuscript,),
+                )
+        return stale
+
+    def locate(self, chapter: str, verse: str, manuscripts: list[str] = None) -> list[dict]:
+        """Find where a verse is attested, without reading the TEI files.
+
+        Args:
+            chapter (str): The chapter number, such as "3".
+            verse (str): The verse number, such as "14".
+            manuscripts (list[str]): The manuscripts to look into (TEI file names without
+                extension, such as "ms_a"), all of them by default.
+
+        Returns:
+            list[dict]: The manuscript, manuscript name, position, chapter, verse, folio, column,
+                line and byte offsets of each occurrence of the verse.
+        """
+        query = "SELECT * FROM verses WHERE chapter = ? AND verse = ?"
+        parameters = [str(chapter), str(verse)]
+        if manuscripts is not None:
+            query += f" AND manuscript IN ({', '.join('?' * len(manuscripts))})"
+            parameters.extend(manuscripts)
+        cursor = self.connection.execute(query + " ORDER BY manuscript, position", parameters)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def fragment(self, location: dict) -> str:
+        """Read the XML fragment of a located verse, and nothing else, from its TEI file."""
+        with open(self.tei_dir / f"{location['manuscript']}.xml", "rb") as f:
+            f.seek(location["start"])
+            return f.read(location["stop"] - location["start"]).decode("utf-8")
+
+    def lookup(self, chapter: str, verse: str, manuscripts: list[str] = None) -> list[dict]:
+        """Look a verse up, bringing the index up to date first.
+
+        Returns:
+            list[dict]: The locations of the verse, as returned by locate, along with their XML
+                fragment.
+        """
+        self.refresh()
+        return [
+            dict(location, fragment=self.fragment(location))
+            for location in self.locate(chapter, verse, manuscripts)
+        ]
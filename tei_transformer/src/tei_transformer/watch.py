@@ -0,0 +1,210 @@
+"""Watch mode: keep the TEI files, and their HTML pages, up to date with the raw files as they are
+saved, cleaning up again only the chapters which changed.
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Callable, Optional
+from xml.etree import ElementTree
+from tei_transformer import TEITransformer
+from tei_transformer.tei_transformer import open_atomic
+from tei_transformer.build_cache import BuildCache
+from tei_transformer.html_renderer import HTMLRenderer
+
+
+class IncrementalRenderer(HTMLRenderer):
+    """Render the pages of a TEI file, only writing the ones which changed, and removing the pages
+    of the chapters which no longer exist."""
+
+    def __init__(self, file_path: str) -> None:
+        super().__init__(file_path)
+        self.changed_pages = []
+
+    def save_page(self, name: str, document: str) -> None:
+        """Write a page, unless it is unchanged."""
+        page_path = self.output_dir / name
+        try:
+            if page_path.read_text(encoding="utf-8") == document:
+                return
+        except OSError:
+            pass
+        super().save_page(name, document)
+        self.changed_pages.append(name)
+
+    def render(self, output_dir: str) -> dict:
+        manuscript = super().render(output_dir)
+        pages = {chapter["page"] for chapter in manuscript["chapters"]}
+        for page_path in self.output_dir.glob("chapter-*.html"):
+            if page_path.name not in pages:
+                page_path.unlink()
+                self.changed_pages.append(page_path.name)
+        return manuscript
+
+
+class Watcher:
+    """Poll the raw files, and transform the ones saved since they were last transformed.
+
+    Each raw file is split at every chapter which can be cleaned up on its own (see
+    TEITransformer.split_chapters). A chapter is only cleaned up again when its raw content, or
+    the position (folio, column, line) it starts at, changed: the clean XML of the other chapters
+    is reused from the previous build, and all of them are joined into the TEI file.
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, html_dir: str = None) -> None:
+        """Prepare the watch of a folder of raw files.
+
+        Args:
+            input_dir (str): The path to the raw files.
+            output_dir (str): The path to the TEI files.
+            html_dir (str): The path to the HTML pages of the TEI files, if they are rendered.
+        """
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.html_dir = Path(html_dir) if html_dir else None
+        self.cache = BuildCache(output_dir)
+        # The modification time and size of each raw file when last transformed
+        self.signatures = {}
+        # The hash, clean XML and number of words of each chapter of each raw file
+        self.chapters = {}
+        # The summary of the HTML rendering of each manuscript, for the index page
+        self.manuscripts = {}
+
+    @staticmethod
+    def hash_segment(chunks: list, segment: dict) -> str:
+        """Hash the raw content of a segment along with the position it starts at."""
+        digest = hashlib.sha256(json.dumps(segment["position"], sort_keys=True).encode("utf-8"))
+        for chunk in chunks[segment["start"]:segment["stop"]]:
+            digest.update(ElementTree.tostring(chunk))
+        return digest.hexdigest()
+
+    def changed_files(self) -> list[Path]:
+        """List the raw files created or modified since they were last transformed."""
+        changed = []
+        for file in sorted(self.input_dir.glob("*.xml")):
+            try:
+                stat = file.stat()
+            except OSError:
+                # Removed since listed
+                continue
+            if self.signatures.get(file.name) != (stat.st_mtime_ns, stat.st_size):
+                changed.append(file)
+        return changed
+
+    def transform(self, file: Path) -> dict:
+        """Transform a raw file, cleaning up again only the chapters which changed.
+
+        Returns:
+            dict: The time it took, the number of words emitted, the number of chapters and of
+                chapters cleaned up again, and the HTML pages written.
+        """
+        start = time.perf_counter()
+        stat = file.stat()
+        splitter = TEITransformer(file)
+        chunks = splitter.raw_chunks()
+        segments = splitter.split_chapters(len(chunks))
+        previous = {chapter["hash"]: chapter for chapter in self.chapters.get(file.name, [])}
+        chapters = []
+        rebuilt = 0
+        for segment in segments:
+            segment_hash = self.hash_segment(chunks, segment)
+            chapter = previous.get(segment_hash)
+            if chapter is None:
+                transformer = TEITransformer(file)
+                # The raw tree is only read while cleaning up, so it is parsed once for all chapters
+                transformer.parsed_manuscript = splitter.parsed_manuscript
+                if len(segments) > 1:
+                    body = transformer.create_segment(
+                        segment["start"], segment["stop"], segment["position"]
+                    )
+                else:
+                    body = transformer.create_body()
+                chapter = {"hash": segment_hash, "body": body, "words": transformer.word_count}
+                rebuilt += 1
+            chapters.append(chapter)
+        output_file = self.output_dir / file.name
+        if len(segments) > 1:
+            body = TEITransformer.join_segments(
+                segments[1]["position"]["ms"], [chapter["body"] for chapter in chapters]
+            )
+        else:
+            body = chapters[0]["body"]
+        words = sum(chapter["words"] for chapter in chapters)
+        try:
+            unchanged = output_file.read_text(encoding="utf-8") == body
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            with open_atomic(output_file) as f:
+                f.write(body.encode("utf-8"))
+        self.cache.record(file, output_file, words)
+        self.cache.save()
+        self.chapters[file.name] = chapters
+        self.signatures[file.name] = (stat.st_mtime_ns, stat.st_size)
+        pages = []
+        if not unchanged or file.stem not in self.manuscripts:
+            pages = self.render(output_file)
+        return {
+            "time": time.perf_counter() - start,
+            "words": words,
+            "chapters": len(chapters),
+            "rebuilt": rebuilt,
+            "pages": pages,
+        }
+
+    def forget(self, file: Path) -> None:
+        """Drop what is stored about a raw file, so that it is transformed from scratch if it
+        appears again."""
+        self.signatures.pop(file.name, None)
+        self.chapters.pop(file.name, None)
+        self.cache.forget(file)
+
+    def render(self, tei_file: Path) -> list[str]:
+        """Render the HTML pages of a TEI file, if the pages are rendered, and return the ones
+        which changed, along with the index page when the chapters or verses of the manuscript
+        changed."""
+        if self.html_dir is None:
+            return []
+        renderer = IncrementalRenderer(tei_file)
+        manuscript = renderer.render(self.html_dir)
+        pages = [f"{renderer.manuscript}/{page}" for page in renderer.changed_pages]
+        if self.manuscripts.get(renderer.manuscript) != manuscript:
+            self.manuscripts[renderer.manuscript] = manuscript
+            HTMLRenderer.render_site_index(list(self.manuscripts.values()), self.html_dir)
+            pages.append("index.html")
+        return pages
+
+    def poll(self, report: Callable[[Path, Optional[dict], Optional[Exception]], None]) -> None:
+        """Transform the raw files changed since the last poll, reporting the result of each one.
+
+        A file which fails to be transformed, such as a file being saved, is tried again at the
+        next poll once modified, or once created again if it was removed meanwhile.
+        """
+        for file in self.changed_files():
+            try:
+                result = self.transform(file)
+            except Exception as error:
+                try:
+                    stat = file.stat()
+                except OSError:
+                    # The file is gone, e.g. renamed while being saved: forget it altogether
+                    self.forget(file)
+                else:
+                    self.signatures[file.name] = (stat.st_mtime_ns, stat.st_size)
+                report(file, None, error)
+            else:
+                report(file, result, None)
+
+    def watch(
+        self, report: Callable[[Path, Optional[dict], Optional[Exception]], None], interval: float = 0.2
+    ) -> None:
+        """Transform all the raw files, then poll them for changes until interrupted.
+
+        Args:
+            report (Callable): Called with each raw file transformed, and the result of its
+                transformation or the error it raised.
+            interval (float): The time between two polls, in seconds.
+        """
+        while True:
+            self.poll(report)
+            time.sleep(interval)
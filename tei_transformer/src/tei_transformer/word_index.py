@@ -0,0 +1,201 @@
+"""Inverted index of the words of the TEI files, to search a word regardless of its diacritics.
+"""
+import unicodedata
+from typing import Iterator, Optional, Tuple
+from xml.etree import ElementTree
+from tei_transformer.verse_index import VerseIndex
+
+
+def normalize_word(text: str) -> str:
+    """Normalize a word into its search key: its letters only, without any of the combining marks
+    of damaged or uncertain letters (U+0307, U+030A, U+0336), vocalization or cantillation, nor
+    punctuation and joiners."""
+    return "".join(char for char in unicodedata.normalize("NFD", text) if char.isalpha())
+
+
+class WordLocator:
+    """Keep track of the location of the <w> of a TEI file, fed with its elements in document order:
+    chapter, verse, verse position, folio, column, line and margin.
+
+    The folio, column and line of a word are the ones of the last line before it, or the ones of
+    its margin for the words written in the margin.
+    """
+
+    def __init__(self) -> None:
+        # Number of the last word within the manuscript, and of the last verse
+        self.word = -1
+        self.position = -1
+        self.chapter = None
+        self.verse = None
+        self.current_line = {}
+        self.margin = None
+
+    def start(self, elem: ElementTree.Element) -> None:
+        """Take into account the opening of an element."""
+        if elem.tag == "div" and elem.get("type") == "chap":
+            self.chapter = elem.get("n")
+        elif elem.tag == "div" and elem.get("type") == "verse":
+            self.verse = elem.get("n", "")
+            self.position += 1
+        elif elem.tag == "line":
+            self.current_line = dict(elem.attrib)
+        elif elem.tag == "margin":
+            self.margin = dict(elem.attrib)
+
+    def end(self, elem: ElementTree.Element) -> Optional[dict]:
+        """Take into account the closing of an element, and return its location if it is a <w>."""
+        if elem.tag == "w":
+            self.word += 1
+            margin = self.margin
+            location = self.current_line if margin is None else margin
+            return {
+                "chapter": self.chapter,
+                "verse": self.verse,
+                "position": self.position if self.verse is not None else None,
+                "folio": location.get("folio"),
+                "col": location.get("col"),
+                "line": location.get("n" if margin is None else "line"),
+                "margin": None if margin is None else margin.get("type"),
+            }
+        if elem.tag == "div" and elem.get("type") == "verse":
+            self.verse = None
+        elif elem.tag == "margin":
+            self.margin = None
+        return None
+
+
+def iter_words(file_path: str) -> Iterator[Tuple[int, ElementTree.Element, dict]]:
+    """Iterate over the <w> of a TEI file, along with their number within the manuscript and their
+    location, as given by WordLocator. The <w> is cleared once the iteration moves on.
+    """
+    locator = WordLocator()
+    for event, elem in ElementTree.iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            locator.start(elem)
+            continue
+        location = locator.end(elem)
+        if location is not None:
+            yield locator.word, elem, location
+            elem.clear()
+
+
+class WordIndex:
+    """Index each word of the TEI files under its normalized form, along with its manuscript,
+    chapter, verse, folio, column and line."""
+
+    def __init__(self, tei_dir: str, index_path: str = None) -> None:
+        """Open the verse index of a folder of TEI files, and bring the word index up to date.
+
+        Args:
+            tei_dir (str): The path to the TEI files.
+            index_path (str): The path to the index, stored within the TEI folder by default.
+        """
+        self.index = VerseIndex(tei_dir, index_path)
+        self.connection = self.index.connection
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS word_files (
+                manuscript TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS words (
+                key TEXT NOT NULL,
+                form TEXT NOT NULL,
+                manuscript TEXT NOT NULL,
+                word INTEGER NOT NULL,
+                chapter TEXT,
+                verse TEXT,
+                position INTEGER,
+                folio TEXT,
+                col TEXT,
+                line TEXT,
+                margin TEXT,
+                reconstructed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS words_by_key ON words (key, manuscript, word);
+            CREATE INDEX IF NOT EXISTS words_by_manuscript ON words (manuscript);
+            """
+        )
+        self.update()
+
+    def close(self) -> None:
+        """Close the connection to the index."""
+        self.index.close()
+
+    def __enter__(self) -> "WordIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def parse_words(file_path: str) -> list[dict]:
+        """List the words of a TEI file, with their position in the manuscript, leaving out the
+        blank spaces and the words without any letter."""
+        words = []
+        for word, elem, location in iter_words(file_path):
+            form = "".join("".join(elem.itertext()).split())
+            key = normalize_word(form)
+            if key:
+                words.append(dict(
+                    location,
+                    key=key,
+                    form=form,
+                    word=word,
+                    reconstructed=int(elem.get("reconstructed") == "1"),
+                ))
+        return words
+
+    def index_manuscript(self, manuscript: str) -> None:
+        """Insert the words of a manuscript into the index."""
+        self.connection.executemany(
+            "INSERT INTO words VALUES (:key, :form, :manuscript, :word, :chapter, :verse, "
+            ":position, :folio, :col, :line, :margin, :reconstructed)",
+            [
+                dict(word, manuscript=manuscript)
+                for word in self.parse_words(self.index.tei_dir / f"{manuscript}.xml")
+            ],
+        )
+
+    def update(self) -> list[str]:
+        """Index the words of the manuscripts indexed since their words were last indexed.
+
+        Returns:
+            list[str]: The manuscripts (re)indexed.
+        """
+        return self.index.update_derived("word_files", ["words"], self.index_manuscript)
+
+    def refresh(self) -> None:
+        """Bring the verse index and the word index up to date with the TEI files."""
+        self.index.refresh()
+        self.update()
+
+    def search(
+        self, query: str, manuscripts: list[str] = None, include_reconstructed: bool = True
+    ) -> list[dict]:
+        """Search a word in the index, whatever its diacritics, without reading the TEI files:
+        call refresh first to take their latest changes into account.
+
+        Args:
+            query (str): The word to search, with or without diacritics.
+            manuscripts (list[str]): The manuscripts to search (TEI file names without extension,
+                such as "ms_a"), all of them by default.
+            include_reconstructed (bool): Whether to return the words reconstructed, even
+                partially, by the editors.
+
+        Returns:
+            list[dict]: The form, manuscript, position, chapter, verse, folio, column, line,
+                margin and reconstruction of each occurrence of the word, in the order of the
+                manuscripts.
+        """
+        query_sql = "SELECT * FROM words WHERE key = ?"
+        parameters = [normalize_word(query)]
+        if manuscripts is not None:
+            query_sql += f" AND manuscript IN ({', '.join('?' * len(manuscripts))})"
+            parameters.extend(manuscripts)
+        if not include_reconstructed:
+            query_sql += " AND reconstructed = 0"
+        cursor = self.connection.execute(query_sql + " ORDER BY manuscript, word", parameters)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
@@ -0,0 +1,83 @@
+"""Tests the generation of the synthetic corpora and the detection of regressions of the benchmarks.
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer, benchmark, cli
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests that the benchmark helpers behave as expected.
+    """
+    def setUp(self) -> None:
+        """Create a temporary folder for the synthetic corpora.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def test_generate_corpus(self):
+        """Tests that a synthetic corpus replicates the articles of its source, perturbed.
+        """
+        source = TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml"
+        corpus = benchmark.generate_corpus(source, 3, self.folder / "ms_x3.xml")
+        transformer = TEITransformer(corpus)
+        transformer.create_body()
+        single = TEITransformer(source)
+        single.create_body()
+        self.assertEqual(transformer.word_count, 3 * single.word_count)
+        self.assertEqual(len(transformer.parsed_manuscript), 3 * len(single.parsed_manuscript))
+
+    def test_run_case(self):
+        """Tests that a case reports its words, time and peak memory.
+        """
+        result = benchmark.run_case("dump", TEST_FOLDER_DATA / "ms_to_clean_standard_verse.xml", 2)
+        self.assertEqual(result["words"], 5)
+        self.assertGreater(result["seconds"], 0)
+        self.assertGreater(result["peak_mb"], 0)
+
+    def test_cli_choices(self):
+        """Tests that the choices of the commands, listed without importing their modules, are the
+        ones of the modules.
+        """
+        from tei_transformer.diff import DIFF_FORMATS
+        self.assertEqual(cli.BENCHMARK_OPERATIONS, list(benchmark.OPERATIONS))
+        self.assertEqual(cli.DIFF_FORMAT_NAMES, list(DIFF_FORMATS))
+
+    def test_compare(self):
+        """Tests that only the cases slower or bigger than the baseline beyond the tolerance are
+        flagged.
+        """
+        baseline = {
+            "ms_b:dump": {"seconds": 1.0, "peak_mb": 100.0},
+            "ms_b:html": {"seconds": 1.0, "peak_mb": 100.0},
+        }
+        results = {
+            "ms_b:dump": {"seconds": 1.1, "peak_mb": 100.0},
+            "ms_b:html": {"seconds": 1.0, "peak_mb": 150.0},
+            "ms_a:dump": {"seconds": 9.0, "peak_mb": 900.0},
+        }
+        regressions = benchmark.compare(results, baseline, 0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("ms_b:html: peak_mb"))
+
+    def test_baseline(self):
+        """Tests that a baseline is loaded as saved, and that a missing or invalid one is an error
+        rather than an empty baseline.
+        """
+        baseline_path = self.folder / "baseline.json"
+        results = {"ms_b:dump": {"seconds": 1.0, "peak_mb": 100.0}}
+        benchmark.save_baseline(results, baseline_path)
+        self.assertEqual(benchmark.load_baseline(baseline_path), results)
+        with self.assertRaises(OSError):
+            benchmark.load_baseline(self.folder / "missing.json")
+        baseline_path.write_text("{", encoding="utf-8")
+        with self.assertRaises(ValueError):
+            benchmark.load_baseline(baseline_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Tests that the build cache only lets unchanged files be skipped.
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.build_cache import BuildCache
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestBuildCache(unittest.TestCase):
+    """Tests that the manifest of transformed files behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform a test manuscript into a temporary folder, and record it in the manifest.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.input_file = self.folder / "ms.xml"
+        shutil.copy(TEST_FOLDER_DATA / "ms_to_clean_standard_verse.xml", self.input_file)
+        self.output_dir = self.folder / "output"
+        self.output_dir.mkdir()
+        self.output_file = self.output_dir / "ms.xml"
+        transformer = TEITransformer(self.input_file)
+        transformer.dump(self.output_file)
+        cache = BuildCache(self.output_dir)
+        cache.record(self.input_file, self.output_file, transformer.word_count)
+        cache.save()
+
+    def test_unchanged_file_is_up_to_date(self):
+        """Tests that a file transformed during a previous run is up to date.
+        """
+        cache = BuildCache(self.output_dir)
+        self.assertTrue(cache.is_up_to_date(self.input_file, self.output_file))
+        self.assertEqual(cache.words(self.input_file), 5)
+
+    def test_modified_input_is_not_up_to_date(self):
+        """Tests that a file is transformed again once its content changed.
+        """
+        self.input_file.write_text(
+            self.input_file.read_text(encoding="utf-8").replace("נער", "נערה"), encoding="utf-8"
+        )
+        self.assertFalse(BuildCache(self.output_dir).is_up_to_date(self.input_file, self.output_file))
+
+    def test_removed_output_is_not_up_to_date(self):
+        """Tests that a file is transformed again once its output has been removed.
+        """
+        self.output_file.unlink()
+        self.assertFalse(BuildCache(self.output_dir).is_up_to_date(self.input_file, self.output_file))
+
+    def test_other_transformer_discards_manifest(self):
+        """Tests that the manifest is discarded when written by another version of the transformer.
+        """
+        manifest_path = self.output_dir / BuildCache.MANIFEST_NAME
+        manifest_path.write_text(
+            manifest_path.read_text(encoding="utf-8").replace(BuildCache.hash_transformer(), "0"),
+            encoding="utf-8",
+        )
+        self.assertFalse(BuildCache(self.output_dir).is_up_to_date(self.input_file, self.output_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests that the concordance finds substrings of the TEI files in context.
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.concordance import Concordance, suffix_array
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestConcordance(unittest.TestCase):
+    """Tests that the concordance behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform a test manuscript into a temporary TEI folder, and build its concordance.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        self.concordance = Concordance(self.tei_dir)
+        self.addCleanup(self.concordance.close)
+
+    def test_suffix_array(self):
+        """Tests that the suffixes are sorted, including repeated ones.
+        """
+        for text in ["banana", "aaaa", "כל כל ה", "a"]:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    list(suffix_array(text)), sorted(range(len(text)), key=lambda i: text[i:])
+                )
+
+    def test_flattened_text(self):
+        """Tests that the reconstructed parts are written within brackets, and the blank spaces
+        as an ellipsis.
+        """
+        text, _, _ = self.concordance.texts()["ms_m"]
+        self.assertEqual(
+            text,
+            "זה קץ כל [בני] [אד]ם̊ … [ומה] [תמאס] [ב]ת̊ו̊[רת] עליו[ן]",
+        )
+
+    def test_concordance_across_words(self):
+        """Tests that a substring spanning several words, partially reconstructed, is found in
+        context and located.
+        """
+        [line] = self.concordance.concordance("כל [בני] [אד", width=6)
+        self.assertEqual((line["left"], line["match"], line["right"]), ("זה קץ ", "כל [בני] [אד", "]ם̊ … "))
+        self.assertEqual((line["manuscript"], line["chapter"], line["verse"]), ("ms_m", "39", "4ab"))
+        self.assertEqual(line["word"], 2)
+        text, _, _ = self.concordance.texts()["ms_m"]
+        self.assertEqual(self.concordance.search("ת̊ו̊[ר"), [("ms_m", text.index("ת̊ו̊[ר"))])
+        self.assertEqual(self.concordance.search("ת̊ו̊ר"), [])
+
+    def test_concordance_is_persisted(self):
+        """Tests that the concordance is not built again for unchanged TEI files.
+        """
+        with Concordance(self.tei_dir) as concordance:
+            self.assertEqual(concordance.update(), [])
+            self.assertEqual(len(concordance.search("[")), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
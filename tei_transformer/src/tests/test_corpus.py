@@ -0,0 +1,187 @@
+"""Tests that the corpus model stores the words and verses of the TEI files.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+from unittest import mock
+from tei_transformer import TEITransformer
+from tei_transformer.corpus import Corpus, StringTable
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestCorpus(unittest.TestCase):
+    """Tests that the corpus model behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform two test manuscripts into a temporary TEI folder, and load them.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(
+            self.tei_dir / "ms_f.xml"
+        )
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        self.corpus = Corpus.load(self.tei_dir)
+
+    def test_string_table(self):
+        """Tests that the strings are interned once, None having the id 0.
+        """
+        table = StringTable()
+        self.assertEqual(table.intern(None), 0)
+        self.assertEqual(table.intern("32"), 1)
+        self.assertEqual(table.intern("33"), 2)
+        self.assertEqual(table.intern("32"), 1)
+        self.assertEqual(table[2], "33")
+        self.assertEqual(len(table), 3)
+
+    def test_words(self):
+        """Tests that the words are stored in the order of the manuscripts, with their location.
+        """
+        self.assertEqual(len(self.corpus), 35)
+        word = self.corpus[2]
+        self.assertEqual(word.form, "א‍ל")
+        self.assertEqual(word.key, "אל")
+        self.assertEqual(
+            (word.manuscript, word.chapter, word.verse, word.folio, word.col, word.line, word.margin),
+            ("ms_f", "32", "1", "TS AS 213.17 recto", None, "16", None),
+        )
+        self.assertEqual(self.corpus[-1].form, "עליון")
+        with self.assertRaises(IndexError):
+            self.corpus[35]
+        # The forms are interned once
+        self.assertEqual(self.corpus.form_ids[2], self.corpus.form_ids[6])
+
+    def test_reconstructed(self):
+        """Tests that the words with reconstructed letters are flagged.
+        """
+        self.assertEqual(
+            [word.form for word in self.corpus if word.reconstructed and word.manuscript == "ms_m"],
+            ["בני", "אדם̊", "ומה", "תמאס", "בת̊ו̊רת", "עליון"],
+        )
+
+    def test_preservation(self):
+        """Tests that the letters, reconstructed and uncertain letters and blank spaces of the words
+        are counted, the words made of blank spaces only being kept.
+        """
+        measures = [
+            (word.form, word.letters, word.reconstructed_letters, word.uncertain_letters, word.blank_span)
+            for word in self.corpus
+            if word.manuscript == "ms_m"
+        ]
+        self.assertEqual(measures[4], ("אדם̊", 3, 2, 1, 0))
+        self.assertEqual(measures[5], ("", 0, 0, 0, 2))
+        self.assertEqual(measures[8], ("בת̊ו̊רת", 5, 3, 2, 0))
+        self.assertEqual(self.corpus[24].form, "׃")
+        self.assertEqual(self.corpus[24].letters, 0)
+
+    def test_verses(self):
+        """Tests that the verses are stored along with the range of their words.
+        """
+        verses = list(self.corpus.verses())
+        self.assertEqual(
+            [(verse.manuscript, verse.chapter, verse.label, len(verse.words)) for verse in verses],
+            [("ms_f", "32", "1", 12), ("ms_f", "32", "16", 6), ("ms_f", "33", "2", 7),
+             ("ms_m", "39", "4ab", 10)],
+        )
+        self.assertEqual(verses[3].text, "זה קץ כל בני אדם̊ ומה תמאס בת̊ו̊רת עליון")
+        self.assertEqual([word.verse for word in verses[1]], ["16"] * 6)
+
+    def test_rows(self):
+        """Tests that the rows hold the fields of the words, in the order asked.
+        """
+        rows = list(self.corpus.rows("verse", "form", "reconstructed"))
+        self.assertEqual(len(rows), 35)
+        self.assertEqual(rows[-1], ("4ab", "עליון", 1))
+        self.assertEqual(
+            rows, [(word.verse, word.form, word.reconstructed) for word in self.corpus]
+        )
+
+    def test_nbytes(self):
+        """Tests that the columns take a few dozen bytes per word.
+        """
+        self.assertLess(self.corpus.nbytes(), 48 * len(self.corpus))
+
+    def test_snapshot(self):
+        """Tests that a snapshot holds the same corpus, its columns mapping the file read-only.
+        """
+        snapshot_path = self.tei_dir / "corpus.bin"
+        self.corpus.save(snapshot_path)
+        snapshot = Corpus.open_snapshot(snapshot_path)
+        self.assertIsInstance(snapshot.form_ids, memoryview)
+        self.assertTrue(snapshot.form_ids.readonly)
+        self.assertEqual(list(snapshot.rows(*Corpus.FIELDS)), list(self.corpus.rows(*Corpus.FIELDS)))
+        self.assertEqual(
+            [(verse.label, verse.text) for verse in snapshot.verses()],
+            [(verse.label, verse.text) for verse in self.corpus.verses()],
+        )
+        self.assertEqual(snapshot[2].key, "אל")
+        self.assertEqual(snapshot.forms.intern("א‍ל"), self.corpus.form_ids[2])
+        self.assertEqual(snapshot.nbytes(), self.corpus.nbytes())
+        # A snapshot saved again is identical
+        snapshot.save(self.tei_dir / "copy.bin")
+        self.assertEqual(snapshot_path.read_bytes(), (self.tei_dir / "copy.bin").read_bytes())
+
+    def test_snapshot_invalid(self):
+        """Tests that a file which is not a snapshot is rejected.
+        """
+        with self.assertRaises(ValueError):
+            Corpus.open_snapshot(self.tei_dir / "ms_m.xml")
+
+    def test_open(self):
+        """Tests that the snapshot of a folder is saved once, and saved again when a file changes.
+        """
+        snapshot_path = self.tei_dir / Corpus.SNAPSHOT_NAME
+        self.assertFalse(snapshot_path.exists())
+        self.assertIsInstance(Corpus.open(self.tei_dir).form_ids, array)
+        self.assertTrue(snapshot_path.exists())
+        corpus = Corpus.open(self.tei_dir)
+        self.assertIsInstance(corpus.form_ids, memoryview)
+        self.assertEqual(len(corpus), 35)
+        # The changes of the TEI files are noticed through their modification time and size
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_standard_verse.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        stat = (self.tei_dir / "ms_m.xml").stat()
+        os.utime(self.tei_dir / "ms_m.xml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        corpus = Corpus.open(self.tei_dir)
+        self.assertIsInstance(corpus.form_ids, array)
+        self.assertEqual(len(corpus), 25 + 5)
+        self.assertEqual(len(Corpus.open(self.tei_dir)), 25 + 5)
+
+    def test_refresh(self):
+        """Tests that refreshing the snapshot only reads the rebuilt files, and yields the corpus
+        loaded from all of them.
+        """
+        Corpus.open(self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_standard_verse.xml").dump(self.tei_dir / "ms_f.xml")
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(self.tei_dir / "ms_g.xml")
+        with mock.patch.object(
+            Corpus, "add_manuscript", autospec=True, side_effect=Corpus.add_manuscript
+        ) as add_manuscript:
+            corpus = Corpus.refresh(self.tei_dir, ["ms_f", "ms_g"])
+        self.assertEqual(
+            [Path(call.args[1]).name for call in add_manuscript.call_args_list], ["ms_f.xml", "ms_g.xml"]
+        )
+        expected = Corpus.load(self.tei_dir)
+        self.assertEqual(list(corpus.rows(*Corpus.FIELDS)), list(expected.rows(*Corpus.FIELDS)))
+        self.assertEqual(
+            [(verse.manuscript, verse.label, verse.text) for verse in corpus.verses()],
+            [(verse.manuscript, verse.label, verse.text) for verse in expected.verses()],
+        )
+        self.assertIsInstance(Corpus.open(self.tei_dir).form_ids, memoryview)
+        # Nothing is saved again when no file was rebuilt
+        snapshot_path = self.tei_dir / Corpus.SNAPSHOT_NAME
+        stat = snapshot_path.stat()
+        Corpus.refresh(self.tei_dir, [])
+        self.assertEqual(snapshot_path.stat().st_mtime_ns, stat.st_mtime_ns)
+
+
+if __name__ == "__main__":
+    unittest.main()
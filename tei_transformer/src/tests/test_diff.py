@@ -0,0 +1,139 @@
+"""Tests that the verses changed between two builds of the TEI files are found, word by word.
+"""
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from xml.etree import ElementTree
+from tei_transformer import TEITransformer
+from tei_transformer.diff import diff_builds, write_text
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestDiff(unittest.TestCase):
+    """Tests that the diff of two builds behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform two test manuscripts into an old and a new build.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+        for build in ["old", "new"]:
+            (self.folder / build).mkdir()
+            TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(
+                self.folder / build / "ms_f.xml"
+            )
+            TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+                self.folder / build / "ms_m.xml"
+            )
+
+    def edit(self, name: str, old: str, new: str) -> None:
+        """Replace some XML of a TEI file of the new build.
+        """
+        path = self.folder / "new" / name
+        content = path.read_text(encoding="utf-8")
+        self.assertIn(old, content)
+        path.write_text(content.replace(old, new, 1), encoding="utf-8")
+
+    def test_indentation(self):
+        """Tests that a build indented differently has no changes.
+        """
+        tree = ElementTree.parse(self.folder / "new" / "ms_f.xml")
+        ElementTree.indent(tree)
+        tree.write(self.folder / "new" / "ms_f.xml", encoding="utf-8")
+        self.assertNotEqual(
+            (self.folder / "new" / "ms_f.xml").read_bytes(),
+            (self.folder / "old" / "ms_f.xml").read_bytes(),
+        )
+        self.assertEqual(diff_builds(self.folder / "old", self.folder / "new"), [])
+
+    def test_words(self):
+        """Tests that the words replaced, inserted and deleted within a verse are reported.
+        """
+        self.edit("ms_f.xml", '<w reconstructed="0">לא</w>', '<w reconstructed="0">לוא</w>')
+        self.edit("ms_m.xml", '<w reconstructed="0">קץ</w>', "")
+        [ms_f, ms_m] = diff_builds(self.folder / "old", self.folder / "new")
+        self.assertEqual((ms_f["key"], ms_f["status"], ms_f["layout"]), ("33:2", "modified", False))
+        self.assertEqual(
+            ms_f["words"],
+            [{"op": "replace", "old_start": 0, "new_start": 0, "old": ["לא"], "new": ["לוא"]}],
+        )
+        self.assertEqual(
+            ms_m["words"], [{"op": "delete", "old_start": 1, "new_start": 1, "old": ["קץ"], "new": []}]
+        )
+        self.edit(
+            "ms_m.xml",
+            '<w reconstructed="0">זה</w>',
+            '<w reconstructed="1"><g type="reconstructed">זה</g></w>',
+        )
+        [ms_m] = diff_builds(self.folder / "old" / "ms_m.xml", self.folder / "new" / "ms_m.xml", jobs=2)
+        self.assertEqual(ms_m["words"][0]["new"][0], "[זה]")
+
+    def test_verses(self):
+        """Tests that the verses are compared by chapter and verse, repeated ones by occurrence, and
+        that the layout changes are reported.
+        """
+        self.edit("ms_f.xml", '<div type="verse" n="16">', '<div type="verse" n="17">')
+        self.edit("ms_f.xml", '<line n="21"', '<line n="22"')
+        self.edit(
+            "ms_m.xml",
+            "</div></div></ms>",
+            '</div><div type="verse" n="4ab"><w reconstructed="0">זה</w></div></div></ms>',
+        )
+        changes = diff_builds(self.folder / "old", self.folder / "new")
+        self.assertEqual(
+            [(change["manuscript"], change["key"], change["status"]) for change in changes],
+            [("ms_f", "32:17", "added"), ("ms_f", "33:2", "modified"), ("ms_f", "32:16", "removed"),
+             ("ms_m", "39:4#2", "added")],
+        )
+        self.assertEqual((changes[1]["words"], changes[1]["layout"]), ([], True))
+        self.assertEqual(changes[3]["text"], "זה")
+        (self.folder / "new" / "ms_m.xml").unlink()
+        self.assertEqual(
+            [change["status"] for change in diff_builds(self.folder / "old", self.folder / "new")][-1],
+            "removed",
+        )
+
+    def test_labels_and_front(self):
+        """Tests that a verse labelled differently is compared with itself, and that the content of
+        a chapter outside its verses is compared as well.
+        """
+        self.edit("ms_m.xml", '<div type="verse" n="4ab">', '<div type="verse" n="4a-b">')
+        [change] = diff_builds(self.folder / "old", self.folder / "new")
+        self.assertEqual(
+            (change["key"], change["status"], change["words"], change["layout"]),
+            ("39:4", "modified", [], True),
+        )
+        self.edit(
+            "ms_m.xml",
+            '<div type="chap" n="39">',
+            '<div type="chap" n="39"><margin type="margin"><w reconstructed="0">אב</w></margin>',
+        )
+        changes = diff_builds(self.folder / "old", self.folder / "new")
+        self.assertEqual(
+            [(change["key"], change["status"]) for change in changes],
+            [("39:4", "modified"), ("39:#front", "added")],
+        )
+        shutil.copy(self.folder / "new" / "ms_m.xml", self.folder / "old" / "ms_m.xml")
+        self.edit("ms_m.xml", '<w reconstructed="0">אב</w>', '<w reconstructed="0">אג</w>')
+        [change] = diff_builds(self.folder / "old", self.folder / "new")
+        self.assertEqual((change["key"], change["status"], change["layout"]), ("39:#front", "modified", True))
+
+    def test_text(self):
+        """Tests that the changes are written as text, with their totals.
+        """
+        self.edit("ms_f.xml", '<w reconstructed="0">לא</w>', "")
+        output = io.StringIO()
+        write_text(diff_builds(self.folder / "old", self.folder / "new"), output)
+        self.assertEqual(
+            output.getvalue(),
+            "ms_f 33:2: modified\n    word 1: - לא\n"
+            "0 verse(s) added, 0 verse(s) removed, 1 verse(s) modified\n",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
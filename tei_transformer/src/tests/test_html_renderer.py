@@ -0,0 +1,77 @@
+"""Tests that the TEI files are rendered as HTML pages, one per chapter.
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from xml.etree import ElementTree
+from tei_transformer import TEITransformer
+from tei_transformer.html_renderer import HTMLRenderer
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestHTMLRenderer(unittest.TestCase):
+    """Tests that the HTML renderer behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Create a temporary folder for the TEI and HTML files.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def render(self, test_file: str, manuscript: str) -> dict:
+        """Transform a test manuscript into TEI, and render it as HTML.
+        """
+        tei_file = self.folder / f"{manuscript}.xml"
+        TEITransformer(TEST_FOLDER_DATA / test_file).dump(tei_file)
+        return HTMLRenderer(tei_file).render(self.folder / "html")
+
+    def test_render_inline(self):
+        """Tests that the reconstructed parts and blank spaces of a word are rendered distinctly.
+        """
+        word = ElementTree.fromstring(
+            '<w reconstructed="1"><g type="reconstructed"></g>ו̇<g type="reconstructed">שמחה</g>'
+            '<blank orient="horizontal" span="2" /></w>'
+        )
+        self.assertEqual(
+            HTMLRenderer.render_inline(word),
+            'ו̇<span class="reconstructed">שמחה</span>'
+            '<span class="blank" title="Blank space of 2 characters">&#160;&#160;</span>',
+        )
+
+    def test_one_page_per_chapter(self):
+        """Tests that each chapter gets its own page, linked from the index page of the manuscript.
+        """
+        manuscript = self.render("ms_to_clean_several_folio.xml", "ms_f")
+        self.assertEqual(manuscript["name"], "Manuscript F")
+        self.assertEqual(
+            [(chapter["label"], chapter["page"], chapter["verses"]) for chapter in manuscript["chapters"]],
+            [("32", "chapter-001.html", 2), ("33", "chapter-002.html", 1)],
+        )
+        output_dir = self.folder / "html" / "ms_f"
+        index = (output_dir / "index.html").read_text(encoding="utf-8")
+        self.assertIn('<a href="chapter-002.html">Chapter 33</a>', index)
+        first_page = (output_dir / "chapter-001.html").read_text(encoding="utf-8")
+        self.assertIn('<a href="chapter-002.html">Next chapter</a>', first_page)
+        self.assertIn("Verse 16", first_page)
+        self.assertNotIn("Verse 2<", first_page)
+        last_page = (output_dir / "chapter-002.html").read_text(encoding="utf-8")
+        self.assertNotIn("Next chapter", last_page)
+        self.assertIn("Verse 2<", last_page)
+
+    def test_render_site_index(self):
+        """Tests that the site index lists the manuscripts, and comes with the stylesheet.
+        """
+        manuscript = self.render("ms_to_clean_reconstructed.xml", "ms_m")
+        HTMLRenderer.render_site_index([manuscript], self.folder / "html")
+        index = (self.folder / "html" / "index.html").read_text(encoding="utf-8")
+        self.assertIn('<a href="ms_m/index.html">Manuscript M</a> (1 chapters, 1 verses)', index)
+        self.assertTrue((self.folder / "html" / HTMLRenderer.STYLESHEET_NAME).exists())
+        page = (self.folder / "html" / "ms_m" / "chapter-001.html").read_text(encoding="utf-8")
+        self.assertIn('<span class="w"><span class="reconstructed">אד</span>ם̊</span>', page)
+
+
+if __name__ == "__main__":
+    unittest.main()
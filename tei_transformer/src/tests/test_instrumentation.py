@@ -0,0 +1,81 @@
+"""Tests that the instrumentation reports the stages of the transformation without altering it.
+"""
+import pstats
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.instrumentation import Profiler
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestProfiler(unittest.TestCase):
+    """Tests that the profiler behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Create a temporary folder for the output and profiles.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.input_file = TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml"
+
+    def test_profiled_output_is_unchanged(self):
+        """Tests that a profiled transformer produces the same output, and that the other
+        transformers are left untouched.
+        """
+        profiler = Profiler()
+        transformer = profiler.attach(TEITransformer(self.input_file))
+        with profiler.measure():
+            body = transformer.create_body()
+        self.assertEqual(body, TEITransformer(self.input_file).create_body())
+        self.assertNotIn("tokenize", vars(TEITransformer(self.input_file)))
+
+    def test_report_stages(self):
+        """Tests that the calls of each stage are counted, and that the times add up.
+        """
+        profiler = Profiler()
+        transformer = profiler.attach(TEITransformer(self.input_file))
+        with profiler.measure():
+            transformer.dump(self.folder / "ms.xml")
+        report = profiler.report()
+        self.assertEqual(report["words"], transformer.word_count)
+        self.assertEqual(report["raw_elements"], len(list(transformer.parsed_manuscript.iter())))
+        self.assertEqual(report["stages"]["parse"]["calls"], 1)
+        self.assertEqual(report["stages"]["serialize"]["calls"], 1)
+        self.assertGreater(report["stages"]["tokenize"]["calls"], 0)
+        self.assertAlmostEqual(
+            sum(stage["seconds"] for stage in report["stages"].values()), report["seconds"]
+        )
+
+    def test_streaming_stages(self):
+        """Tests that the time spent in the generators of the streaming mode is counted.
+        """
+        profiler = Profiler()
+        transformer = profiler.attach(TEITransformer(self.input_file))
+        with profiler.measure():
+            transformer.dump(self.folder / "ms.xml", stream=True)
+        report = profiler.report()
+        self.assertGreater(report["stages"]["serialize"]["calls"], 1)
+        self.assertGreater(report["stages"]["serialize"]["seconds"], 0)
+
+    def test_stats_file_and_merge(self):
+        """Tests that a cProfile profile is dumped, and that reports add up.
+        """
+        profiler = Profiler(self.folder / "ms.pstats")
+        transformer = profiler.attach(TEITransformer(self.input_file))
+        with profiler.measure():
+            transformer.create_body()
+        stats = pstats.Stats(str(self.folder / "ms.pstats"))
+        self.assertTrue(any(function == "tokenize" for _, _, function in stats.stats))
+        merged = Profiler.merge([profiler.report(), profiler.report()])
+        self.assertEqual(merged["words"], 2 * transformer.word_count)
+        self.assertEqual(
+            merged["stages"]["tokenize"]["calls"], 2 * profiler.stages["tokenize"]["calls"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests that the preservation statistics add up the reconstructed, lacunose and uncertain text.
+"""
+import csv
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.corpus import Corpus
+from tei_transformer.preservation import preservation_statistics, write_csv, write_json
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestPreservation(unittest.TestCase):
+    """Tests that the preservation statistics behave as expected.
+    """
+    def setUp(self) -> None:
+        """Transform two test manuscripts into a temporary TEI folder, and load them.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(
+            self.tei_dir / "ms_f.xml"
+        )
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        self.corpus = Corpus.load(self.tei_dir)
+
+    def test_manuscript(self):
+        """Tests the totals and shares of a manuscript.
+        """
+        ms_f, ms_m = preservation_statistics(self.corpus, "manuscript")
+        self.assertEqual(ms_m["manuscript"], "ms_m")
+        self.assertEqual(
+            [ms_m[total] for total in
+             ["words", "reconstructed_words", "letters", "reconstructed_letters",
+              "uncertain_letters", "lacuna_span"]],
+            [10, 6, 29, 16, 3, 2],
+        )
+        self.assertAlmostEqual(ms_m["reconstructed_word_share"], 0.6)
+        self.assertAlmostEqual(ms_m["reconstructed_letter_share"], 16 / 29)
+        self.assertAlmostEqual(ms_m["uncertain_letter_density"], 3 / 29)
+        self.assertEqual(ms_f["words"], 25)
+
+    def test_levels(self):
+        """Tests that the words are grouped per chapter, verse and folio, in the order of the corpus.
+        """
+        self.assertEqual(
+            [(row["manuscript"], row["chapter"]) for row in preservation_statistics(self.corpus, "chapter")],
+            [("ms_f", "32"), ("ms_f", "33"), ("ms_m", "39")],
+        )
+        verses = preservation_statistics(self.corpus, "verse")
+        self.assertEqual([row["verse"] for row in verses], ["1", "16", "2", "4ab"])
+        self.assertEqual(verses[1]["reconstructed_letters"], 12)
+        self.assertEqual(verses[1]["uncertain_letters"], 4)
+        folios = preservation_statistics(self.corpus, "folio")
+        self.assertEqual(
+            [(row["folio"], row["words"]) for row in folios],
+            [("TS AS 213.17 recto", 12), ("TS AS 213.17 verso", 13), (None, 10)],
+        )
+        # The totals do not depend on the level
+        for level in ["chapter", "verse", "folio"]:
+            self.assertEqual(
+                sum(row["lacuna_span"] for row in preservation_statistics(self.corpus, level)), 2
+            )
+
+    def test_reports(self):
+        """Tests that the statistics are written as CSV and JSON.
+        """
+        statistics = preservation_statistics(self.corpus, "chapter")
+        output = io.StringIO()
+        write_csv(statistics, output)
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]["lacuna_span"], "2")
+        output = io.StringIO()
+        write_json(statistics, output)
+        self.assertEqual(json.loads(output.getvalue()), statistics)
+
+
+if __name__ == "__main__":
+    unittest.main()
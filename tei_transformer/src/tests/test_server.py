@@ -0,0 +1,204 @@
+"""Tests that the HTTP service serves the TEI files from its cache, as long as they are unchanged.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.html_renderer import HTMLRenderer
+from tei_transformer.server import CorpusServer, Response, ResponseCache
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestServer(unittest.TestCase):
+    """Tests that the HTTP service behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform two test manuscripts into a temporary TEI folder, and serve it.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(
+            self.tei_dir / "ms_f.xml"
+        )
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        self.server = CorpusServer(self.tei_dir, poll_interval=0)
+        self.addCleanup(self.server.close)
+
+    def get_json(self, target: str):
+        """Request some JSON from the service.
+        """
+        response = self.server.respond(target)
+        self.assertEqual(response.status, 200)
+        return json.loads(response.body)
+
+    def test_response_cache(self):
+        """Tests that the least recently used responses are evicted, and the stale ones ignored.
+        """
+        cache = ResponseCache(max_entries=2)
+        for key in ["a", "b"]:
+            cache.put(key, (1,), Response(200, "text/plain", key.encode()))
+        self.assertEqual(cache.get("a", (1,)).body, b"a")
+        cache.put("c", (1,), Response(200, "text/plain", b"c"))
+        self.assertIsNone(cache.get("b", (1,)))
+        self.assertIsNone(cache.get("a", (2,)))
+        self.assertEqual(cache.get("c", (1,)).body, b"c")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_json(self):
+        """Tests the listing of the manuscripts, of their chapters, and the verse lookups.
+        """
+        self.assertEqual(
+            self.get_json("/manuscripts"),
+            [{"manuscript": "ms_f", "name": "Manuscript F", "verses": 3},
+             {"manuscript": "ms_m", "name": "Manuscript M", "verses": 1}],
+        )
+        manuscript = self.get_json("/manuscripts/ms_f")
+        self.assertEqual([chapter["label"] for chapter in manuscript["chapters"]], ["32", "33"])
+        chapter = self.get_json("/manuscripts/ms_m/chapters/39")
+        [verse] = chapter["verses"]
+        self.assertEqual(verse["verse"], "4ab")
+        self.assertEqual(verse["words"][3], {
+            "form": "בני", "reconstructed": True, "folio": None, "col": None, "line": "4", "margin": None,
+        })
+        [location] = self.get_json("/verses/32/16?manuscripts=ms_f,ms_a")
+        self.assertEqual(location["manuscript"], "ms_f")
+        self.assertTrue(location["fragment"].startswith('<div type="verse" n="16">'))
+        [synopsis] = self.get_json("/synopsis/33:2")
+        self.assertEqual(synopsis["readings"]["ms_f"][0]["words"][0], "לא")
+
+    def test_errors(self):
+        """Tests that unknown paths and manuscripts, and invalid references, are reported.
+        """
+        self.assertEqual(self.server.respond("/nothing").status, 404)
+        self.assertEqual(self.server.respond("/manuscripts/ms_z").status, 404)
+        self.assertEqual(self.server.respond("/manuscripts/ms_m/chapters/40").status, 404)
+        self.assertEqual(self.server.respond("/synopsis/33").status, 400)
+
+    def test_outside_folder(self):
+        """Tests that only the TEI files of the folder are served, whatever the encoding of the path.
+        """
+        outside = self.tei_dir / "outside"
+        outside.mkdir()
+        shutil.copy(self.tei_dir / "ms_f.xml", outside / "ms_o.xml")
+        shutil.copy(self.tei_dir / "ms_f.xml", self.tei_dir.parent / f"{self.tei_dir.name}_o.xml")
+        self.addCleanup(os.unlink, self.tei_dir.parent / f"{self.tei_dir.name}_o.xml")
+        for target in [
+            "/manuscripts/outside%2Fms_o",
+            f"/manuscripts/..%2F{self.tei_dir.name}_o",
+            "/html/outside%2Fms_o/index.html",
+            f"/html/..%2F{self.tei_dir.name}_o/",
+            "/manuscripts/outside%2Fms_o/chapters/32",
+            "/manuscripts/..",
+        ]:
+            with self.subTest(target=target):
+                self.assertEqual(self.server.respond(target).status, 404)
+
+    def test_poll_interval(self):
+        """Tests that the TEI files are only stated again once the poll interval is over.
+        """
+        server = CorpusServer(self.tei_dir, poll_interval=3600)
+        self.addCleanup(server.close)
+        self.assertEqual(server.respond("/manuscripts/ms_m/chapters/39").status, 200)
+        (self.tei_dir / "ms_m.xml").unlink()
+        self.assertEqual(server.respond("/manuscripts/ms_m/chapters/39").status, 200)
+        server.poll_interval = 0
+        self.assertEqual(server.respond("/manuscripts/ms_m/chapters/39").status, 404)
+
+    def test_render_thread(self):
+        """Tests that the responses which are not cached are rendered off the event loop, and the
+        cached ones on it.
+        """
+        threads = []
+        render_chapter = self.server.render_chapter
+
+        def record_thread(*args):
+            threads.append(threading.current_thread().name)
+            return render_chapter(*args)
+
+        self.server.render_chapter = record_thread
+
+        async def respond() -> list:
+            return [
+                await self.server.respond_async("/manuscripts/ms_m/chapters/39") for _ in range(2)
+            ]
+
+        first, second = asyncio.run(respond())
+        self.assertIs(first, second)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("render"))
+
+    def test_html(self):
+        """Tests that the HTML pages are the ones written by the HTML renderer.
+        """
+        written = HTMLRenderer(self.tei_dir / "ms_f.xml").render(self.tei_dir / "html")
+        for page in ["index.html", *(chapter["page"] for chapter in written["chapters"])]:
+            response = self.server.respond(f"/html/ms_f/{page}")
+            self.assertEqual(response.content_type, "text/html; charset=utf-8")
+            self.assertEqual(response.body, (self.tei_dir / "html" / "ms_f" / page).read_bytes())
+        self.assertEqual(
+            self.server.respond("/html/ms_f/").body, self.server.respond("/html/ms_f/index.html").body
+        )
+        redirect = self.server.respond("/html/ms_f")
+        self.assertEqual((redirect.status, redirect.headers), (301, (("Location", "/html/ms_f/"),)))
+        self.assertIn(b'href="ms_m/index.html"', self.server.respond("/html/").body)
+        self.assertEqual(self.server.respond("/html/style.css").status, 200)
+        self.assertEqual(self.server.respond("/html/ms_f/chapter-009.html").status, 404)
+
+    def test_invalidation(self):
+        """Tests that the responses are cached until the TEI file they come from changes.
+        """
+        first = self.server.respond("/manuscripts/ms_m/chapters/39")
+        self.assertIs(self.server.respond("/manuscripts/ms_m/chapters/39"), first)
+        page = self.server.respond("/html/ms_m/chapter-001.html")
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_standard_verse.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        stat = (self.tei_dir / "ms_m.xml").stat()
+        os.utime(self.tei_dir / "ms_m.xml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertEqual(self.server.respond("/manuscripts/ms_m/chapters/39").status, 404)
+        self.assertNotEqual(self.server.respond("/html/ms_m/chapter-001.html").body, page.body)
+        self.assertEqual(self.get_json("/manuscripts")[1]["name"], "Manuscript 11QPs")
+
+    def test_http(self):
+        """Tests that several requests are answered over a single connection.
+        """
+        async def exchange() -> list:
+            server = await self.server.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for request in [
+                "GET /manuscripts HTTP/1.1\r\nHost: localhost\r\n\r\n",
+                "HEAD /html/ms_f/ HTTP/1.1\r\nHost: localhost\r\n\r\n",
+                "POST /manuscripts HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}",
+            ]:
+                writer.write(request.encode())
+                head = (await reader.readuntil(b"\r\n\r\n")).decode()
+                size = int(head.split("Content-Length: ")[1].split("\r\n")[0])
+                body = await reader.readexactly(size) if not request.startswith("HEAD") else b""
+                responses.append((head.split("\r\n")[0], body))
+            self.assertEqual(await reader.read(), b"")
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+        responses = asyncio.run(exchange())
+        self.assertEqual(responses[0][0], "HTTP/1.1 200 OK")
+        self.assertEqual(json.loads(responses[0][1])[0]["manuscript"], "ms_f")
+        self.assertEqual(responses[1], ("HTTP/1.1 200 OK", b""))
+        self.assertEqual(responses[2][0], "HTTP/1.1 405 Method Not Allowed")
+
+
+if __name__ == "__main__":
+    unittest.main()
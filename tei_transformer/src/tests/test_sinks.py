@@ -0,0 +1,89 @@
+"""Tests that a single clean-up of a raw file feeds several sinks at once.
+"""
+import csv
+import filecmp
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.html_renderer import HTMLRenderer
+from tei_transformer.sinks import HTMLSink, open_sinks
+from tei_transformer.word_index import iter_words
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestSinks(unittest.TestCase):
+    """Tests that the sinks behave as expected.
+    """
+    def setUp(self) -> None:
+        """Create a temporary output folder.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+        for name in ["tei", "html", "expected"]:
+            (self.folder / name).mkdir()
+
+    def export(self, raw_name: str, names: list) -> list:
+        """Export a test manuscript to some sinks, as ms_x.
+        """
+        with ExitStack() as stack:
+            sinks = open_sinks(names, "ms_x.xml", self.folder / "tei", self.folder / "html", stack)
+            TEITransformer(TEST_FOLDER_DATA / raw_name).export(sinks)
+        return sinks
+
+    def test_tei_html(self):
+        """Tests that the TEI file and the HTML pages are the ones of dump and of the HTML renderer.
+        """
+        [_, html_sink] = self.export("ms_to_clean_several_folio.xml", ["tei", "html"])
+        expected = self.folder / "expected" / "ms_x.xml"
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(expected)
+        self.assertEqual((self.folder / "tei" / "ms_x.xml").read_text(), expected.read_text())
+        manuscript = HTMLRenderer(expected).render(self.folder / "expected" / "html")
+        self.assertIsInstance(html_sink, HTMLSink)
+        self.assertEqual(html_sink.manuscript, manuscript)
+        comparison = filecmp.dircmp(
+            self.folder / "html" / "ms_x", self.folder / "expected" / "html" / "ms_x"
+        )
+        self.assertEqual(comparison.left_only + comparison.right_only, [])
+        self.assertEqual(filecmp.cmpfiles(
+            comparison.left, comparison.right, comparison.common_files, shallow=False
+        )[0], sorted(comparison.common_files))
+
+    def test_words(self):
+        """Tests that the words are written with their location, as found in the TEI file.
+        """
+        self.export("ms_to_clean_reconstructed.xml", ["tei", "words"])
+        with open(self.folder / "tei" / "ms_x.words.jsonl", encoding="utf-8") as f:
+            words = [json.loads(line) for line in f]
+        self.assertEqual(len(words), 10)
+        self.assertEqual(
+            [{key: word.pop(key) for key in ["manuscript", "word", "form", "reconstructed", "blank_span"]}
+             for word in words[4:6]],
+            [{"manuscript": "ms_x", "word": 4, "form": "אדם̊", "reconstructed": True, "blank_span": 0},
+             {"manuscript": "ms_x", "word": 5, "form": "", "reconstructed": False, "blank_span": 2}],
+        )
+        expected = [location for _, _, location in iter_words(self.folder / "tei" / "ms_x.xml")]
+        self.assertEqual(words[4:6], expected[4:6])
+
+    def test_verses(self):
+        """Tests that the verses are written with the location of their first word and their text.
+        """
+        self.export("ms_to_clean_several_folio.xml", ["verses"])
+        with open(self.folder / "tei" / "ms_x.verses.csv", encoding="utf-8", newline="") as f:
+            verses = list(csv.DictReader(f))
+        self.assertEqual(
+            [(verse["chapter"], verse["verse"]) for verse in verses], [("32", "1"), ("32", "16"), ("33", "2")]
+        )
+        self.assertEqual(sum(int(verse["words"]) for verse in verses), 25)
+        self.assertEqual(verses[2]["folio"], "TS AS 213.17 verso")
+        self.assertTrue(verses[2]["text"].startswith("לא "))
+        self.assertFalse((self.folder / "tei" / "ms_x.xml").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
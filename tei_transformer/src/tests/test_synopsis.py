@@ -0,0 +1,97 @@
+"""Tests that the synopsis aligns the verses of the manuscripts.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.synopsis import Synopsis, verse_keys
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestVerseKeys(unittest.TestCase):
+    """Tests that the verse labels are normalized into canonical keys.
+    """
+    def test_verse_keys(self):
+        """Tests the normalization of the various verse labels found in the manuscripts.
+        """
+        cases = [
+            (("3", "14"), [(3, 14, "")]),
+            (("6", "20kl"), [(6, 20, "kl")]),
+            (("6", "20l–28"), [(6, 20, "l")] + [(6, verse, "") for verse in range(21, 29)]),
+            (("3", "[8–11]"), [(3, 8, ""), (3, 9, ""), (3, 10, ""), (3, 11, "")]),
+            (("3", "21c/20b or 22ab"), [(3, 21, "c"), (3, 20, "b"), (3, 22, "ab")]),
+            (("15 // 20", "14bc // 20"), [(15, 14, "bc"), (15, 20, "")]),
+            (("", "3:14"), [(3, 14, "")]),
+            (("2Q18 frag. 1", "3"), []),
+            (("11Q5, col. XXI", "13"), []),
+            (("3", "*"), []),
+            (("3", "a-b"), []),
+        ]
+        for labels, keys in cases:
+            with self.subTest(labels=labels):
+                self.assertEqual(verse_keys(*labels), keys)
+
+
+class TestSynopsis(unittest.TestCase):
+    """Tests that the synopsis behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform a test manuscript into a temporary TEI folder, along with a copy numbering its
+        verses with a range, and align them.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(
+            self.tei_dir / "ms_f.xml"
+        )
+        self.copy = self.tei_dir / "ms_g.xml"
+        self.copy.write_text(
+            (self.tei_dir / "ms_f.xml").read_text(encoding="utf-8").replace('n="16"', 'n="15–17"'),
+            encoding="utf-8",
+        )
+        self.synopsis = Synopsis(self.tei_dir)
+        self.addCleanup(self.synopsis.close)
+
+    def test_attestations(self):
+        """Tests that the join table lists the manuscripts attesting a verse.
+        """
+        self.assertEqual(self.synopsis.attestations("32:16"), ["ms_f", "ms_g"])
+        self.assertEqual(self.synopsis.attestations("32:17"), ["ms_g"])
+        self.assertEqual(self.synopsis.attestations("32:2"), [])
+
+    def test_parallel(self):
+        """Tests that the readings of a range of verses are aligned across the manuscripts.
+        """
+        synopsis = self.synopsis.parallel("32:15", "33:2")
+        self.assertEqual(
+            [verse["reference"] for verse in synopsis], ["32:15", "32:16", "32:17", "33:2"]
+        )
+        readings = synopsis[1]["readings"]
+        self.assertEqual(sorted(readings), ["ms_f", "ms_g"])
+        self.assertEqual(readings["ms_g"][0]["verse"], "15–17")
+        self.assertEqual(len(readings["ms_f"][0]["words"]), 6)
+        self.assertEqual(readings["ms_f"][0]["words"], readings["ms_g"][0]["words"])
+        self.assertEqual(
+            [verse["reference"] for verse in self.synopsis.parallel("32:1", "33:5", ["ms_f"])],
+            ["32:1", "32:16", "33:2"],
+        )
+
+    def test_realign_modified_file(self):
+        """Tests that a TEI file modified after it was aligned is aligned again.
+        """
+        self.copy.write_text(
+            self.copy.read_text(encoding="utf-8").replace('n="15–17"', 'n="18"'), encoding="utf-8"
+        )
+        stat = self.copy.stat()
+        os.utime(self.copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.synopsis.refresh()
+        self.assertEqual(self.synopsis.attestations("32:16"), ["ms_f"])
+        self.assertEqual(self.synopsis.attestations("32:18"), ["ms_g"])
+
+
+if __name__ == "__main__":
+    unittest.main()
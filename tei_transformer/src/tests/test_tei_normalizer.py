@@ -3,14 +3,22 @@
 RTL displays is broken on VS Code, so if you're working with VSCode, expect to be confused
 regarding the order of the hebrew letter (I am very confused as well).
 """
+import io
+import tempfile
 import unittest
 from pathlib import Path
+from xml.etree import ElementTree
 from tei_transformer import TEITransformer
 
 
 TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
 
 
+def serialize(elements: list) -> str:
+    """Serialize a list of XML elements."""
+    return "".join(ElementTree.tostring(element, encoding="unicode") for element in elements)
+
+
 class TestNormalizeTEIParser(unittest.TestCase):
     """Tests that the normalization of the TEI parser works as expected.
     """
@@ -23,23 +31,25 @@ class TestNormalizeTEIParser(unittest.TestCase):
         """Given a text with blank spaces, tests that the blank spaces are properly extracted.
         """
         text = "[    ]ב̊שער̊"
-        self.assertEqual(self.tei_transformer.extract_blank_space(text),
-                        "[<blank orient='horizontal' span='4'/>]ב̊שער̊")
+        self.assertEqual(serialize(self.tei_transformer.tokenize(text)),
+                        """<w reconstructed="0"><blank orient="horizontal" span="4" /></w>"""
+                        """<w reconstructed="0">]ב̊שער̊</w>""")
 
     def test_extract_reconstructed_text(self):
         """Given a text with blank spaces, tests that the blank spaces are properly extracted.
         """
         text = "[    ב̊שער̊]"
-        self.assertEqual(self.tei_transformer.extract_blank_space(text),
-                        "[<blank orient='horizontal' span='4'/>ב̊שער̊]")
+        self.assertEqual(serialize(self.tei_transformer.tokenize(text)),
+                        """<w reconstructed="0"><blank orient="horizontal" span="4" /></w>"""
+                        """<w reconstructed="0">ב̊שער̊]</w>""")
 
     def test_reconstruct_word(self):
         """Given that there is no bracket, tests that the word is wrapped correctly.
         """
         word = "אני"
-        expected_reconstructed_word = f"<g type='reconstructed'>אני</g>"
+        expected_reconstructed_word = """<w reconstructed="1"><g type="reconstructed">אני</g></w>"""
         self.assertEqual(
-            self.tei_transformer.reconstruct_word(word),
+            serialize([self.tei_transformer.reconstruct_word(word)]),
             expected_reconstructed_word
         )
 
@@ -52,44 +62,68 @@ class TestNormalizeTEIParser(unittest.TestCase):
     def test_reconstruct_word_bracket_left(self):
         """Given a word with a bracket on the left, tests that the word is wrapped correctly."""
         word = "[אני"
-        expected_reconstructed_word = f"<g type='reconstructed'>אני</g>"
+        expected_reconstructed_word = """<w reconstructed="1"><g type="reconstructed">אני</g></w>"""
         self.assertEqual(
-            self.tei_transformer.reconstruct_word(word),
+            serialize([self.tei_transformer.reconstruct_word(word)]),
             expected_reconstructed_word)
         
     def test_reconstruct_word_bracket_right(self):
         """Given a word with a bracket on the right, tests that the word is wrapped correctly."""
         word = "אני]"
-        expected_reconstructed_word = f"<g type='reconstructed'>אני</g>"
+        expected_reconstructed_word = """<w reconstructed="1"><g type="reconstructed">אני</g></w>"""
         self.assertEqual(
-            self.tei_transformer.reconstruct_word(word),
+            serialize([self.tei_transformer.reconstruct_word(word)]),
             expected_reconstructed_word)
         
     def test_reconstruct_word_bracket_within_reconstruct(self):
         """Given a word with several reconstructed letters, tests that the word is wrapped correctly."""
         word = "ב]ת̊ו̊[רת]"
-        expected_reconstructed_word = f"<g type='reconstructed'>ב</g>ת̊ו̊<g type='reconstructed'>רת</g>"
+        expected_reconstructed_word = """<w reconstructed="1"><g type="reconstructed">ב</g>ת̊ו̊<g type="reconstructed">רת</g></w>"""
         self.assertEqual(
-            self.tei_transformer.reconstruct_word(word),
+            serialize([self.tei_transformer.reconstruct_word(word)]),
             expected_reconstructed_word)
         
     def test_reconstruct_word_external_reconstruct(self):
         """Given a word with several reconstructed letters, tests that the word is wrapped correctly.
         """
         word = "כ]ל[ה"
-        expected_reconstructed_word = f"<g type='reconstructed'>כ</g>ל<g type='reconstructed'>ה</g>"
+        expected_reconstructed_word = """<w reconstructed="1"><g type="reconstructed">כ</g>ל<g type="reconstructed">ה</g></w>"""
         self.assertEqual(
-            self.tei_transformer.reconstruct_word(word),
+            serialize([self.tei_transformer.reconstruct_word(word)]),
             expected_reconstructed_word)
         
     def test_reconstruct_text_blank(self):
         """Given a text with an empy blank, test that the word is wrapped correctly.
         """
-        words = """<blank orient='horizontal' span='6'/>ב̊שער̊[∙]"""
-        parsed_words = self.tei_transformer.compute_reconstructed_words(words)[0]
+        words = "      ב̊שער̊[∙]"
+        parsed_words = self.tei_transformer.tokenize(words)
+        self.assertEqual(
+            serialize(parsed_words),
+            """<w reconstructed="0"><blank orient="horizontal" span="6" /></w>"""
+            """<w reconstructed="1">ב̊שער̊<g type="reconstructed">∙</g></w>"""
+        )
+
+    def test_tokenize_tail(self):
+        """Given a raw tail with stychs and reconstructed words, tests that it is split into words
+        in a single scan.
+        """
+        text = "אני\t[נער ב]טרם כ]ל[ה"
+        self.assertEqual(
+            serialize(self.tei_transformer.tokenize(text)),
+            """<w reconstructed="0">אני</w><stych />"""
+            """<w reconstructed="1"><g type="reconstructed">נער</g></w>"""
+            """<w reconstructed="1"><g type="reconstructed">ב</g>טרם</w>"""
+            """<w reconstructed="1"><g type="reconstructed">כ</g>ל<g type="reconstructed">ה</g></w>"""
+        )
+
+    def test_tokenize_plain_words(self):
+        """Given a raw tail with plain words only, tests that it is split into words, and that
+        genuine < characters remain escaped.
+        """
         self.assertEqual(
-            "".join(parsed_words),
-            "<blank orient='horizontal' span='6'/>ב̊שער̊<g type='reconstructed'>∙</g>"
+            serialize(self.tei_transformer.tokenize("אני נער <blank/>")),
+            """<w reconstructed="0">אני</w><w reconstructed="0">נער</w>"""
+            """<w reconstructed="0">&lt;blank/&gt;</w>"""
         )
 
     def test_chapter_normalizer(self):
@@ -166,7 +200,7 @@ class TestNormalizeTEIParser(unittest.TestCase):
         """Tests that creating the body of the manuscript behaves as expected when chapters and verses
         are specified within the same XML tag.
         """
-        expected_body = """<root><ms name="Manuscript C"><div type="chap" n="3"><div type="verse" n="14"><line n="1" folio="TS 12.867 recto" /><w reconstructed="0">צדקת</w><w reconstructed="0">אב</w><w reconstructed="0">אל</w><w reconstructed="0">תשכח</w><stych /><w reconstructed="0">ו̇תחת</w><line n="2" folio="TS 12.867 recto" /><w reconstructed="0">ענו̇תו</w><w reconstructed="1">תתנצ̇<g type='reconstructed'>ב:</g></w></div></div></ms></root>"""
+        expected_body = """<root><ms name="Manuscript C"><div type="chap" n="3"><div type="verse" n="14"><line n="1" folio="TS 12.867 recto" /><w reconstructed="0">צדקת</w><w reconstructed="0">אב</w><w reconstructed="0">אל</w><w reconstructed="0">תשכח</w><stych /><w reconstructed="0">ו̇תחת</w><line n="2" folio="TS 12.867 recto" /><w reconstructed="0">ענו̇תו</w><w reconstructed="1">תתנצ̇<g type="reconstructed">ב:</g></w></div></div></ms></root>"""
         manuscript = TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_combined_chapter_verse.xml")
         created_body = manuscript.create_body()
         self.assertEqual(
@@ -177,7 +211,7 @@ class TestNormalizeTEIParser(unittest.TestCase):
     def test_create_body_blank_space(self):
         """Given a manuscript with blank space, tests that the body is properly created.
         """
-        expected_body = """<root><ms name="Manuscript F"><div type="chap" n="31"><div type="folio" n="TS AS 213.17 recto"><div type="verse" n="24"><line n="5" /><w reconstructed="0"><blank orient='horizontal' span='28'/></w><w reconstructed="1">ב̊שער̊<g type='reconstructed'>∙</g></w><stych /><w reconstructed="0"><blank orient='horizontal' span='36'/></w></div></div></div></ms></root>"""
+        expected_body = """<root><ms name="Manuscript F"><div type="chap" n="31"><div type="folio" n="TS AS 213.17 recto"><div type="verse" n="24"><line n="5" /><w reconstructed="0"><blank orient="horizontal" span="28" /></w><w reconstructed="1">ב̊שער̊<g type="reconstructed">∙</g></w><stych /><w reconstructed="0"><blank orient="horizontal" span="36" /></w></div></div></div></ms></root>"""
         manuscript = TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_blank_space.xml")
         # created_body = manuscript.create_body()
         # self.assertEqual(
@@ -189,7 +223,7 @@ class TestNormalizeTEIParser(unittest.TestCase):
         """Given a manuscript with a complex reconstruction pattern, tests that the body is
         properly created.
         """
-        expected_body = """<root><ms name="Manuscript M"><div type="chap" n="39"><div type="verse" n="4ab"><line n="4" /><w reconstructed="0">זה</w><w reconstructed="0">קץ</w><w reconstructed="0">כל</w><w reconstructed="1"><g type='reconstructed'>בני</g></w><w reconstructed="1"><g type='reconstructed'>אד</g>ם̊</w><w reconstructed="0"><blank orient='horizontal' span='2'/></w><w reconstructed="1"><g type='reconstructed'>ומה</g></w><w reconstructed="1"><g type='reconstructed'>תמאס</g></w><w reconstructed="1"><g type='reconstructed'>ב</g>ת̊ו̊<g type='reconstructed'>רת</g></w><w reconstructed="1">עליו<g type='reconstructed'>ן</g></w></div></div></ms></root>"""
+        expected_body = """<root><ms name="Manuscript M"><div type="chap" n="39"><div type="verse" n="4ab"><line n="4" /><w reconstructed="0">זה</w><w reconstructed="0">קץ</w><w reconstructed="0">כל</w><w reconstructed="1"><g type="reconstructed">בני</g></w><w reconstructed="1"><g type="reconstructed">אד</g>ם̊</w><w reconstructed="0"><blank orient="horizontal" span="2" /></w><w reconstructed="1"><g type="reconstructed">ומה</g></w><w reconstructed="1"><g type="reconstructed">תמאס</g></w><w reconstructed="1"><g type="reconstructed">ב</g>ת̊ו̊<g type="reconstructed">רת</g></w><w reconstructed="1">עליו<g type="reconstructed">ן</g></w></div></div></ms></root>"""
         manuscript = TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml")
         created_body = manuscript.create_body()
         self.assertEqual(expected_body, created_body)
@@ -197,11 +231,152 @@ class TestNormalizeTEIParser(unittest.TestCase):
     def test_create_body_nested_folios(self):
         """Given a manuscript with complex nested folios, tests that the body is properly created.
         """
-        expected_body = """<root><ms name="Manuscript F"><div type="chap" n="32"><div type="verse" n="1"><line n="16" folio="TS AS 213.17 recto" /><w reconstructed="0">ראש</w><w reconstructed="0">סמוך</w><w reconstructed="0">א‍ל</w><w reconstructed="0">תותר׃</w><w reconstructed="0">ובראש</w><w reconstructed="0">עשירים</w><w reconstructed="0">א‍ל</w><w reconstructed="0">תסתורה</w><w reconstructed="0">והיה</w><w reconstructed="0">לך</w><w reconstructed="0">כאחד</w><w reconstructed="0">מהם׃</w></div><div type="verse" n="16"><line n="11" folio="TS AS 213.17 verso" /><w reconstructed="1"><g type='reconstructed'>ירא</g></w><w reconstructed="1"><g type='reconstructed'>ייי</g></w><w reconstructed="1"><g type='reconstructed'>י</g>ב̊ין</w><w reconstructed="0">משפט∙</w><w reconstructed="0">ות{ת}חבולות</w><w reconstructed="1">מנ̇ש̊ף̊<g type='reconstructed'>יוציא׃</g></w></div></div><div type="chap" n="33"><div type="verse" n="2"><line n="21" folio="TS AS 213.17 verso" /><w reconstructed="0">לא</w><w reconstructed="0">יחכם</w><w reconstructed="0">שונא</w><w reconstructed="0">תורה∙</w><w reconstructed="0">ומתמוטט</w><w reconstructed="0">כמסערה</w><w reconstructed="0">׃</w></div></div></ms></root>"""
+        expected_body = """<root><ms name="Manuscript F"><div type="chap" n="32"><div type="verse" n="1"><line n="16" folio="TS AS 213.17 recto" /><w reconstructed="0">ראש</w><w reconstructed="0">סמוך</w><w reconstructed="0">א‍ל</w><w reconstructed="0">תותר׃</w><w reconstructed="0">ובראש</w><w reconstructed="0">עשירים</w><w reconstructed="0">א‍ל</w><w reconstructed="0">תסתורה</w><w reconstructed="0">והיה</w><w reconstructed="0">לך</w><w reconstructed="0">כאחד</w><w reconstructed="0">מהם׃</w></div><div type="verse" n="16"><line n="11" folio="TS AS 213.17 verso" /><w reconstructed="1"><g type="reconstructed">ירא</g></w><w reconstructed="1"><g type="reconstructed">ייי</g></w><w reconstructed="1"><g type="reconstructed">י</g>ב̊ין</w><w reconstructed="0">משפט∙</w><w reconstructed="0">ות{ת}חבולות</w><w reconstructed="1">מנ̇ש̊ף̊<g type="reconstructed">יוציא׃</g></w></div></div><div type="chap" n="33"><div type="verse" n="2"><line n="21" folio="TS AS 213.17 verso" /><w reconstructed="0">לא</w><w reconstructed="0">יחכם</w><w reconstructed="0">שונא</w><w reconstructed="0">תורה∙</w><w reconstructed="0">ומתמוטט</w><w reconstructed="0">כמסערה</w><w reconstructed="0">׃</w></div></div></ms></root>"""
         manuscript = TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml")
         created_body = manuscript.create_body()
         self.assertEqual(expected_body, created_body)
 
+    def test_iter_body_matches_create_body(self):
+        """Tests that the streaming mode yields the same body as the in-memory mode, for every
+        test manuscript.
+        """
+        for file_path in sorted(TEST_FOLDER_DATA.glob("*.xml")):
+            with self.subTest(file_path=file_path.name):
+                expected_body = TEITransformer(file_path).create_body()
+                streamed_body = "".join(TEITransformer(file_path).iter_body())
+                self.assertEqual(expected_body, streamed_body)
+
+    def test_iter_body_flushes_finished_chapters(self):
+        """Tests that the streaming mode writes out a chapter and drops it as soon as the next
+        one starts.
+        """
+        manuscript = TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml")
+        chunks = manuscript.iter_body()
+        streamed = ""
+        while '<div type="chap" n="33">' not in streamed:
+            streamed += next(chunks)
+        self.assertIn("</div></div>", streamed)
+        self.assertEqual(len(manuscript.ms_child), 1)
+        streamed += "".join(chunks)
+        self.assertTrue(streamed.endswith("</ms></root>"))
+
+    def test_split_chapters_joined_body(self):
+        """Tests that a manuscript split at chapter boundaries, cleaned up segment by segment and
+        joined back, yields the same body as the in-memory mode.
+        """
+        file_path = TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml"
+        segments = TEITransformer(file_path).split_chapters(2)
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(segments[1]["position"]["folio"], "TS AS 213.17 verso")
+        bodies = [
+            TEITransformer(file_path).create_segment(
+                segment["start"], segment["stop"], segment["position"]
+            )
+            for segment in segments
+        ]
+        self.assertEqual(
+            TEITransformer(file_path).create_body(),
+            TEITransformer.join_segments(segments[1]["position"]["ms"], bodies)
+        )
+        splitter = TEITransformer(file_path)
+        bodies = [
+            TEITransformer(splitter.segment_source(segment)).create_segment(0, None, segment["position"])
+            for segment in splitter.split_chapters(2)
+        ]
+        self.assertEqual(
+            TEITransformer(file_path).create_body(),
+            TEITransformer.join_segments(segments[1]["position"]["ms"], bodies)
+        )
+
+    def test_sources_and_binary_output(self):
+        """Tests that a manuscript is read from its path, its bytes or a file object, and dumped in
+        UTF-8 into a binary file object, in memory as in streaming mode.
+        """
+        file_path = TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml"
+        expected = TEITransformer(file_path).create_body().encode("utf-8")
+        content = file_path.read_bytes()
+        for stream in [False, True]:
+            for source in [str(file_path), content, io.BytesIO(content)]:
+                with self.subTest(source=type(source).__name__, stream=stream):
+                    transformer = TEITransformer(source)
+                    output = io.BytesIO()
+                    transformer.dump(output, stream=stream)
+                    self.assertEqual(output.getvalue(), expected)
+                    self.assertEqual(transformer.word_count, 25)
+                    self.assertFalse(output.closed)
+
+    def test_dump_atomic(self):
+        """Tests that a failed dump leaves the previous output untouched, and no temporary file.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            output = Path(folder) / "ms_x.xml"
+            output.write_bytes(b"<root/>")
+            with self.assertRaises(ElementTree.ParseError):
+                TEITransformer(b"<Root><text>").dump(output)
+            self.assertEqual(output.read_bytes(), b"<root/>")
+            self.assertEqual([path.name for path in Path(folder).iterdir()], ["ms_x.xml"])
+
+    def test_lazy_source(self):
+        """Tests that the source is only read once cleaned up.
+        """
+        transformer = TEITransformer(TEST_FOLDER_DATA / "missing.xml")
+        self.assertEqual(transformer.word_count, 0)
+        with self.assertRaises(FileNotFoundError):
+            transformer.create_body()
+
+    def test_check_orphans(self):
+        """Tests that the content appearing before its chapter or verse fails in strict mode, and is
+        otherwise dropped and reported at its position.
+        """
+        content = (
+            "<Root><Article><text><ms>ms_x</ms>\n"
+            "<verse_nb>3</verse_nb> foo <line>2</line>\n"
+            "<chap>Chapitre 4</chap><verse_nb>1</verse_nb> bar</text></Article></Root>"
+        ).encode("utf-8")
+        with self.assertRaisesRegex(ValueError, "line 2, column 1: error: Verse 3 appears before"):
+            TEITransformer(content).create_body()
+        transformer = TEITransformer(content, strict=False)
+        self.assertEqual(
+            [(diagnostic.code, diagnostic.line, diagnostic.column) for diagnostic in transformer.check()],
+            [("orphan-verse", 2, 1), ("orphan-word", 2, 1), ("orphan-line", 2, 28)],
+        )
+        self.assertEqual(transformer.word_count, 1)
+        self.assertEqual(
+            transformer.serialize(),
+            '<root><ms name="ms_x"><div type="chap" n="4"><div type="verse" n="1">'
+            '<w reconstructed="0">bar</w></div></div></ms></root>',
+        )
+
+    def test_check_warnings(self):
+        """Tests that the unbalanced brackets, the verse labels which are not numbers and the text
+        dropped are reported, without changing the clean manuscript.
+        """
+        content = (
+            "<Root><Article><text><ms>ms_x</ms><chap>4</chap><verse_nb>a-b</verse_nb> בר]א"
+            "<supralinear>ל</supralinear><parallel>B</parallel></text></Article></Root>"
+        ).encode("utf-8")
+        transformer = TEITransformer(content, strict=False)
+        self.assertEqual(
+            [(diagnostic.severity, diagnostic.code) for diagnostic in transformer.check()],
+            [("warning", "non-numeric-verse"), ("warning", "unbalanced-brackets"),
+             ("warning", "dropped-text")],
+        )
+        self.assertEqual(transformer.serialize(), TEITransformer(content).create_body())
+        # A reconstruction may span several lines of a verse, it is only reported if left open at
+        # the end of the verse, at the position of the tail opening it
+        content = (
+            "<Root><Article><text><ms>ms_x</ms><chap>4</chap><verse_nb>1</verse_nb> [בר"
+            "<line>2</line>א] ל\n<verse_nb>2</verse_nb> [בר<line>3</line>א</text></Article></Root>"
+        ).encode("utf-8")
+        self.assertEqual(
+            [(diagnostic.code, diagnostic.message, diagnostic.line)
+             for diagnostic in TEITransformer(content, strict=False).check()],
+            [("unbalanced-brackets", "Unclosed bracket in [בר", 2)],
+        )
+        with self.assertRaises(ElementTree.ParseError) as context:
+            TEITransformer(b"<Root>\n<text></Root>").check()
+        self.assertEqual(context.exception.position[0], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
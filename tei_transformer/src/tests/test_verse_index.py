@@ -0,0 +1,60 @@
+"""Tests that the verse index finds the verses of the TEI files.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from xml.etree import ElementTree
+from tei_transformer import TEITransformer
+from tei_transformer.verse_index import VerseIndex
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestVerseIndex(unittest.TestCase):
+    """Tests that the verse index behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform a test manuscript into a temporary TEI folder, and index it.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        self.tei_file = self.tei_dir / "ms_f.xml"
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml").dump(self.tei_file)
+        self.index = VerseIndex(self.tei_dir)
+        self.addCleanup(self.index.close)
+
+    def test_lookup_verse(self):
+        """Tests that looking a verse up returns its position and its XML fragment only.
+        """
+        [verse] = self.index.lookup("32", "16", ["ms_f"])
+        self.assertEqual(verse["name"], "Manuscript F")
+        self.assertEqual(verse["folio"], "TS AS 213.17 verso")
+        self.assertEqual(verse["line"], "11")
+        fragment = ElementTree.fromstring(verse["fragment"])
+        self.assertEqual(fragment.attrib, {"type": "verse", "n": "16"})
+        self.assertEqual(len(fragment.findall("w")), 6)
+
+    def test_lookup_missing_verse(self):
+        """Tests that looking up a verse which is not attested returns nothing.
+        """
+        self.assertEqual(self.index.lookup("32", "2"), [])
+        self.assertEqual(self.index.lookup("32", "16", ["ms_a"]), [])
+
+    def test_rebuild_modified_file(self):
+        """Tests that a TEI file modified after it was indexed is indexed again.
+        """
+        self.tei_file.write_text(
+            self.tei_file.read_text(encoding="utf-8").replace('n="16"', 'n="17"'), encoding="utf-8"
+        )
+        stat = self.tei_file.stat()
+        os.utime(self.tei_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(self.index.lookup("32", "16"), [])
+        self.assertEqual(len(self.index.lookup("32", "17")), 1)
+        self.assertEqual(self.index.refresh(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
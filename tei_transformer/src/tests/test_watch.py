@@ -0,0 +1,123 @@
+"""Tests that the watch mode cleans up again only the chapters which changed.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.watch import Watcher
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestWatch(unittest.TestCase):
+    """Tests that the watch mode behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Copy a test manuscript of two chapters into a temporary raw folder, and watch it.
+        """
+        self.folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.folder)
+        for name in ["raw", "tei", "html"]:
+            (self.folder / name).mkdir()
+        self.raw_file = self.folder / "raw" / "ms_f.xml"
+        shutil.copy(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml", self.raw_file)
+        self.watcher = Watcher(self.folder / "raw", self.folder / "tei", self.folder / "html")
+        self.results = {}
+        self.errors = {}
+
+    def report(self, file: Path, result: dict, error: Exception) -> None:
+        """Keep the result of the transformation of a file.
+        """
+        if error is None:
+            self.results[file.name] = result
+        else:
+            self.errors[file.name] = error
+
+    def edit(self, old: str, new: str) -> None:
+        """Replace some text of the raw file, changing its modification time.
+        """
+        content = self.raw_file.read_text(encoding="utf-8").replace(old, new)
+        self.raw_file.write_text(content, encoding="utf-8")
+        stat = self.raw_file.stat()
+        os.utime(self.raw_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    def expected(self) -> str:
+        """Transform the raw file from scratch.
+        """
+        TEITransformer(self.raw_file).dump(self.folder / "expected.xml")
+        return (self.folder / "expected.xml").read_text()
+
+    def test_only_changed_chapters(self):
+        """Tests that the chapters are spliced into the output, only the changed one being cleaned
+        up again, and its page written again.
+        """
+        self.watcher.poll(self.report)
+        result = self.results.pop("ms_f.xml")
+        self.assertEqual((result["chapters"], result["rebuilt"], result["words"]), (2, 2, 25))
+        self.assertIn("ms_f/chapter-002.html", result["pages"])
+        self.assertIn("index.html", result["pages"])
+        self.assertEqual((self.folder / "tei" / "ms_f.xml").read_text(), self.expected())
+
+        self.watcher.poll(self.report)
+        self.assertEqual(self.results, {})
+
+        self.edit("ומתמוטט כמסערה", "ומתמוטט כסערה")
+        self.watcher.poll(self.report)
+        result = self.results.pop("ms_f.xml")
+        self.assertEqual((result["chapters"], result["rebuilt"]), (2, 1))
+        self.assertEqual(result["pages"], ["ms_f/chapter-002.html"])
+        self.assertEqual((self.folder / "tei" / "ms_f.xml").read_text(), self.expected())
+        page = (self.folder / "html" / "ms_f" / "chapter-002.html").read_text(encoding="utf-8")
+        self.assertIn("כסערה", page)
+
+    def test_position_change(self):
+        """Tests that a chapter is cleaned up again when the position it starts at changes.
+        """
+        self.watcher.poll(self.report)
+        self.edit("<line>11</line>", "<line>12</line>")
+        self.watcher.poll(self.report)
+        self.assertEqual(self.results["ms_f.xml"]["rebuilt"], 2)
+        self.assertEqual((self.folder / "tei" / "ms_f.xml").read_text(), self.expected())
+
+    def test_failure(self):
+        """Tests that a file which fails is reported, then tried again once modified.
+        """
+        self.edit("</Root>", "")
+        self.watcher.poll(self.report)
+        self.assertIn("ms_f.xml", self.errors)
+        self.watcher.poll(self.report)
+        self.assertEqual(self.results, {})
+        shutil.copy(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml", self.raw_file)
+        self.edit("", "")
+        self.watcher.poll(self.report)
+        self.assertEqual(self.results["ms_f.xml"]["words"], 25)
+
+    def test_removed_while_failing(self):
+        """Tests that a file removed before its failure is reported does not stop the watch, and is
+        transformed again from scratch once created again.
+        """
+        self.watcher.poll(self.report)
+        self.edit("</Root>", "")
+        transform = self.watcher.transform
+
+        def remove_then_fail(file: Path) -> dict:
+            file.unlink()
+            return transform(file)
+
+        self.watcher.transform = remove_then_fail
+        self.watcher.poll(self.report)
+        self.assertIn("ms_f.xml", self.errors)
+        self.assertNotIn("ms_f.xml", self.watcher.signatures)
+        self.assertNotIn("ms_f.xml", self.watcher.chapters)
+        self.watcher.transform = transform
+        shutil.copy(TEST_FOLDER_DATA / "ms_to_clean_several_folio.xml", self.raw_file)
+        self.results.clear()
+        self.watcher.poll(self.report)
+        self.assertEqual(self.results["ms_f.xml"]["rebuilt"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
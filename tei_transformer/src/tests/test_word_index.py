@@ -0,0 +1,58 @@
+"""Tests that the word index finds the words of the TEI files whatever their diacritics.
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from tei_transformer import TEITransformer
+from tei_transformer.word_index import WordIndex, normalize_word
+
+
+TEST_FOLDER_DATA = Path(__file__).resolve().parent / "test_data"
+
+
+class TestWordIndex(unittest.TestCase):
+    """Tests that the word index behaves as expected.
+    """
+    def setUp(self) -> None:
+        """Transform a test manuscript into a temporary TEI folder, and index its words.
+        """
+        self.tei_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tei_dir)
+        TEITransformer(TEST_FOLDER_DATA / "ms_to_clean_reconstructed.xml").dump(
+            self.tei_dir / "ms_m.xml"
+        )
+        self.index = WordIndex(self.tei_dir)
+        self.addCleanup(self.index.close)
+
+    def test_normalize_word(self):
+        """Tests that the marks of damaged letters, the vocalization and the punctuation are removed.
+        """
+        self.assertEqual(normalize_word("ש̇מעו"), "שמעו")
+        self.assertEqual(normalize_word("ב̶ת̊ו̊רת"), "בתורת")
+        self.assertEqual(normalize_word("לוֹ׃"), "לו")
+        self.assertEqual(normalize_word("א‍ל"), "אל")
+
+    def test_search_marked_form(self):
+        """Tests that a plain consonantal query matches the forms with uncertain letters.
+        """
+        [word] = self.index.search("בתורת")
+        self.assertEqual(word["form"], "בת̊ו̊רת")
+        self.assertEqual(
+            (word["manuscript"], word["chapter"], word["verse"], word["line"]),
+            ("ms_m", "39", "4ab", "4"),
+        )
+        self.assertEqual(word["reconstructed"], 1)
+        self.assertEqual(self.index.search("בת̊ו̊רת"), [word])
+
+    def test_search_include_reconstructed(self):
+        """Tests that the reconstructed words can be left out of the results.
+        """
+        self.assertEqual(len(self.index.search("בני")), 1)
+        self.assertEqual(self.index.search("בני", include_reconstructed=False), [])
+        self.assertEqual(len(self.index.search("כל", include_reconstructed=False)), 1)
+        self.assertEqual(self.index.search("כל", ["ms_a"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()